@@ -0,0 +1,109 @@
+"""
+Transfer size and CPU cost of response compression.
+
+Payloads are synthetic but shaped like the real ones:
+  patterns - /api/sync/patterns pull of a large pattern library (JSON)
+  history  - /api/history listing (JSON)
+  run log  - finished run log download (CSV)
+
+For each available encoding (gzip always; br / zstd when the optional
+packages are installed) it reports compressed size, ratio and the median
+compress / decompress time.
+
+Usage: python benchmarks/bench_compression.py [patterns] [log_rows]
+"""
+
+import gzip
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compression import available_encodings, compress  # noqa: E402
+
+ROUNDS = 5
+
+
+def pattern_library(count: int) -> bytes:
+    rng = random.Random(1)
+    patterns = []
+    for pid in range(1, count + 1):
+        steps = []
+        for seq in range(1, 13):
+            steps.append({
+                "id": pid * 100 + seq, "pattern_id": pid, "sequence_order": seq,
+                "action_type": rng.choice(["move", "move", "grip", "release", "wait"]),
+                "j1": round(rng.uniform(-90, 90), 1), "j2": round(rng.uniform(-45, 45), 1),
+                "j3": round(rng.uniform(-45, 45), 1), "j4": 0.0, "j5": 0.0, "j6": 0.0,
+                "gripper_angle": rng.choice([30.0, 90.0, 180.0]), "wait_time": 1.0,
+            })
+        patterns.append({"id": pid, "name": f"Pattern {pid}", "description": "Pick and place",
+                         "revision": rng.randint(0, 5), "created_at": "2026-01-01T08:00:00", "steps": steps})
+    return json.dumps(patterns).encode()
+
+
+def history_listing(count: int) -> bytes:
+    rng = random.Random(2)
+    rows = [{"id": i, "pattern_name": f"Pattern {i % 40}", "cycles_target": 10, "cycles_completed": 10,
+             "max_force_setting": 8.0, "detected_material": rng.choice(["Metal", "Wood", "Sponge/Soft"]),
+             "filename": f"run_data_{i}.csv", "status": "Completed", "created_at": "2026-01-01T08:00:00",
+             "log_available": True, "log_size_bytes": rng.randint(10_000, 900_000), "log_rows": rng.randint(100, 9000)}
+            for i in range(count)]
+    return json.dumps(rows).encode()
+
+
+def run_log(rows: int) -> bytes:
+    rng = random.Random(3)
+    lines = ["Timestamp,Cycle,Phase,Force_N,Material,Confidence,J1,J2,J3,Gripper"]
+    for i in range(rows):
+        t = i * 0.05
+        lines.append(f"{8 + int(t // 3600):02d}:{int(t // 60) % 60:02d}:{t % 60:06.3f},{i // 200 + 1},"
+                     f"{rng.choice(['Moving', 'Gripping', 'Gripping (Hold)', 'Releasing'])},"
+                     f"{rng.uniform(0, 9):.2f},Metal,92.5,{rng.uniform(-90, 90):.1f},"
+                     f"{rng.uniform(-45, 45):.1f},{rng.uniform(-45, 45):.1f},{rng.uniform(30, 180):.1f}")
+    return ("\n".join(lines) + "\n").encode()
+
+
+def decompress(data: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        return gzip.decompress(data)
+    if encoding == "br":
+        import brotli
+        return brotli.decompress(data)
+    import zstandard
+    return zstandard.ZstdDecompressor().decompress(data)
+
+
+def timed(fn, *args):
+    samples = []
+    for _ in range(ROUNDS):
+        t = time.perf_counter()
+        result = fn(*args)
+        samples.append(time.perf_counter() - t)
+    return result, statistics.median(samples) * 1000
+
+
+def main():
+    patterns = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    log_rows = int(sys.argv[2]) if len(sys.argv) > 2 else 50_000
+    payloads = {
+        f"patterns ({patterns})": pattern_library(patterns),
+        "history (1000)": history_listing(1000),
+        f"run log ({log_rows} rows)": run_log(log_rows),
+    }
+    print(f"{'payload':<24}{'encoding':<10}{'bytes':>12}{'ratio':>8}{'comp ms':>10}{'decomp ms':>11}")
+    for name, raw in payloads.items():
+        print(f"{name:<24}{'identity':<10}{len(raw):>12}{1.0:>8.1f}{'-':>10}{'-':>11}")
+        for encoding in available_encodings():
+            packed, comp_ms = timed(compress, raw, encoding)
+            _, decomp_ms = timed(decompress, packed, encoding)
+            print(f"{'':<24}{encoding:<10}{len(packed):>12}{len(raw) / len(packed):>8.1f}"
+                  f"{comp_ms:>10.1f}{decomp_ms:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Driver transport benchmark against the loopback fake controller.
+
+  sequential - one command, wait for the reply, repeat (latency bound)
+  pipelined  - the same commands sent back to back (ProtocolDriver.pipeline)
+  ticks      - control-loop traffic while streaming setpoints faster than
+               the tick rate (coalescing + one write per tick)
+
+Usage: python benchmarks/bench_driver.py [commands] [latency_ms]
+"""
+
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from robot_driver import LoopbackController, ProtocolDriver  # noqa: E402
+
+
+def main():
+    commands = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    latency = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.002
+
+    controller = LoopbackController(latency=latency).start()
+    driver = ProtocolDriver(controller.url)
+    driver.start()
+    try:
+        samples = []
+        t0 = time.perf_counter()
+        for _ in range(commands):
+            t = time.perf_counter()
+            driver.request("PING")
+            samples.append((time.perf_counter() - t) * 1000)
+        sequential_s = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        replies = driver.pipeline([("J", i % 90, 0, 0, 0, 0, 0) for i in range(commands)])
+        pipelined_s = time.perf_counter() - t0
+        assert all(r == "OK" for r in replies)
+
+        before = dict(driver.counters)
+        t0 = time.perf_counter()
+        while time.perf_counter() - t0 < 1.0:
+            driver.set_joints([(time.perf_counter() - t0) * 10] * 6)  # ~1 kHz producer
+            time.sleep(0.001)
+        ticks = driver.counters["ticks"] - before["ticks"]
+        sent = driver.counters["commands"] - before["commands"]
+        coalesced = driver.counters["coalesced"] - before["coalesced"]
+
+        print(f"link latency (one way, simulated): {latency * 1000:.1f} ms")
+        print(f"sequential : {commands / sequential_s:10.0f} cmd/s   p50 {statistics.median(samples):.2f} ms"
+              f"   p99 {sorted(samples)[int(len(samples) * 0.99) - 1]:.2f} ms")
+        print(f"pipelined  : {commands / pipelined_s:10.0f} cmd/s   ({pipelined_s * 1000:.1f} ms for {commands})")
+        print(f"ticks      : {ticks} ticks/s, {sent} frames sent, {coalesced} setpoints coalesced,"
+              f" sensor rtt {driver.rtt_ms:.2f} ms")
+    finally:
+        driver.stop()
+        controller.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Force sensor pipeline benchmark with the simulated 1 kHz load cell.
+
+  throughput - cost per sample of each filter and of the whole pipeline
+               (virtual clock, no sleeping)
+  quality    - a 0 -> 5 N grip step: residual noise (RMS after settling)
+               and rise time (10-90 %) of each filter
+  realtime   - the load cell streaming at its rate for a few seconds:
+               achieved rate, late batches and CPU used
+
+Usage: python benchmarks/bench_force_sensor.py [samples] [realtime_seconds]
+"""
+
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from force_sensor import (FILTERS, LOG_RATE_HZ, SAMPLE_RATE_HZ, TELEMETRY_RATE_HZ,  # noqa: E402
+                          ForceSensorPipeline, History, SimulatedLoadCell)
+
+
+def throughput(samples: int):
+    cell = SimulatedLoadCell(lambda: 5.0, seed=1)
+    data = list(cell.samples(samples))
+    for name in FILTERS:
+        f = ForceSensorPipeline().filters[name]
+        t0 = time.perf_counter()
+        for _, x in data:
+            f.update(x)
+        print(f"{name:<10}: {(time.perf_counter() - t0) / samples * 1e9:8.0f} ns/sample")
+
+    pipeline = ForceSensorPipeline()
+    history = History()
+    pipeline.add_output(TELEMETRY_RATE_HZ, lambda t, v: None)
+    pipeline.add_output(LOG_RATE_HZ, history.append)
+    t0 = time.perf_counter()
+    pipeline.push_many(data)
+    per_sample = (time.perf_counter() - t0) / samples
+    print(f"{'pipeline':<10}: {per_sample * 1e9:8.0f} ns/sample  ({per_sample * SAMPLE_RATE_HZ * 100:.2f} % of "
+          f"one core at {SAMPLE_RATE_HZ} Hz, ring {pipeline.capacity} samples, {history.count} log-rate points)")
+
+
+def quality():
+    step_at, duration = 0.5, 1.5
+    clock = {"t": 0.0}
+    cell = SimulatedLoadCell(lambda: 5.0 if clock["t"] >= step_at else 0.0, seed=2)
+    print(f"\n{'filter':<10} {'rms noise':>10} {'rise 10-90%':>12}")
+    for name in ("raw", *FILTERS):
+        pipeline = ForceSensorPipeline(primary=name)
+        errors, t10, t90 = [], None, None
+        for k in range(int(duration * SAMPLE_RATE_HZ)):
+            t = clock["t"] = k / SAMPLE_RATE_HZ
+            pipeline.push(cell.reading(cell.read_force()), t)
+            y = pipeline.filtered[(pipeline.count - 1) % pipeline.capacity]
+            if t >= step_at:
+                if t10 is None and y >= 0.5:
+                    t10 = t
+                if t90 is None and y >= 4.5:
+                    t90 = t
+                if t >= step_at + 0.5:  # Settled
+                    errors.append((y - 5.0) ** 2)
+        rms = math.sqrt(sum(errors) / len(errors))
+        rise = f"{(t90 - t10) * 1000:.0f} ms" if t10 is not None and t90 is not None else "-"
+        print(f"{name:<10} {rms:>8.3f} N {rise:>12}")
+
+
+def realtime(seconds: float):
+    pipeline = ForceSensorPipeline()
+    cell = SimulatedLoadCell(lambda: 5.0)
+    cpu0, t0 = time.process_time(), time.perf_counter()
+    cell.start(pipeline)
+    time.sleep(seconds)
+    cell.stop()
+    wall, cpu = time.perf_counter() - t0, time.process_time() - cpu0
+    print(f"\nrealtime  : {pipeline.count / wall:.0f} samples/s over {wall:.1f} s, {cell.late} late batches, "
+          f"CPU {cpu / wall * 100:.1f} %")
+
+
+def main():
+    samples = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 3.0
+    throughput(samples)
+    quality()
+    realtime(seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Cold-start benchmark for the backend.
+
+Each round starts a fresh interpreter in a scratch directory (copy of the
+database, empty logs/) and measures:
+  import   - `import simulation`
+  startup  - application startup handlers
+  first /  - first request for the control panel
+  first /data, first /api/patterns
+
+Usage: python benchmarks/bench_startup.py [rounds]
+"""
+
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+MOCK_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r"""
+import json, time
+t0 = time.perf_counter()
+import simulation
+t1 = time.perf_counter()
+from fastapi.testclient import TestClient  # Harness only, excluded from the timings
+result = {"import": t1 - t0}
+t_client = time.perf_counter()
+with TestClient(simulation.app) as client:
+    t2 = time.perf_counter()
+    result["startup"] = t2 - t_client
+    for path in ("/", "/data", "/api/patterns"):
+        t = time.perf_counter()
+        client.get(path, headers={"accept-encoding": "gzip"})
+        result["first " + path] = time.perf_counter() - t
+    result["ready"] = time.perf_counter() - t0 - (t_client - t1)
+print("RESULT " + json.dumps(result))
+"""
+
+
+def run_once() -> dict:
+    with tempfile.TemporaryDirectory() as scratch:
+        shutil.copy(os.path.join(MOCK_DIR, "robot_arm_system.db"), scratch)
+        env = {**os.environ, "PYTHONPATH": MOCK_DIR, "PYTHONWARNINGS": "ignore"}
+        out = subprocess.run([sys.executable, "-c", PROBE], cwd=scratch, env=env,
+                             capture_output=True, text=True, check=True).stdout
+        line = next(l for l in out.splitlines() if l.startswith("RESULT "))
+        return json.loads(line[len("RESULT "):])
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    samples = [run_once() for _ in range(rounds)]
+    print(f"{'metric':<20}{'median ms':>12}{'max ms':>12}")
+    for key in samples[0]:
+        values = [s[key] * 1000 for s in samples]
+        print(f"{key:<20}{statistics.median(values):>12.1f}{max(values):>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Coalescing mailbox for manual control (joint sliders and the gripper).
+
+Request handlers only drop the latest target into the mailbox and return.
+A control thread picks it up once per tick and moves toward it through a
+motion.TargetTracker (velocity / acceleration / jerk limited), so a burst of
+slider events becomes one smooth motion instead of a series of jumps. Targets
+replaced before the control loop saw them are counted as superseded.
+"""
+
+import threading
+import time
+from typing import Callable, Dict, Optional, Sequence
+
+from motion import TICK_INTERVAL, TargetTracker, joints_from
+
+GRIPPER_MAX_RATE = 360.0   # deg/s the jaws may open or close under manual control
+
+
+class CommandMailbox:
+    """
+    read_joints()                 -> current joint positions (tracker start point)
+    read_gripper()                -> current gripper angle
+    apply_joints(setpoint)        called every tick while the arm is moving
+    apply_gripper(angle, command) called every tick while the jaws move or a new command arrives
+    is_blocked()                  True while another executor (auto-run, sequence) owns the arm
+    """
+
+    def __init__(self, read_joints: Callable[[], Sequence[float]], read_gripper: Callable[[], float],
+                 apply_joints: Callable[[Sequence[float]], None],
+                 apply_gripper: Callable[[int, Dict], None],
+                 is_blocked: Callable[[], bool], tick: float = TICK_INTERVAL):
+        self.read_joints = read_joints
+        self.read_gripper = read_gripper
+        self.apply_joints = apply_joints
+        self.apply_gripper = apply_gripper
+        self.is_blocked = is_blocked
+        self.tick = tick
+        self._lock = threading.Lock()
+        self._joint_target: Optional[Dict] = None   # Newest posted, not yet taken by the loop
+        self._gripper_command: Optional[Dict] = None
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self.tracker: Optional[TargetTracker] = None
+        self.target = None                          # Joint target being tracked
+        self.gripper: Optional[Dict] = None         # Gripper command being applied
+        self.gripper_angle: Optional[float] = None
+        self.counters = {"joint_commands": 0, "gripper_commands": 0, "superseded": 0,
+                         "retargeted": 0, "ticks_active": 0}
+
+    # --- Producers (request handlers) ---
+    def post_joints(self, targets: Dict):
+        """Partial joint target (missing joints keep their current target)"""
+        with self._lock:
+            self.counters["joint_commands"] += 1
+            if self._joint_target is not None:
+                self.counters["superseded"] += 1
+                targets = {**self._joint_target, **{k: v for k, v in targets.items() if v is not None}}
+            self._joint_target = targets
+
+    def post_gripper(self, command: Dict):
+        """{"angle", "max_force", "switch_on"}"""
+        with self._lock:
+            self.counters["gripper_commands"] += 1
+            if self._gripper_command is not None:
+                self.counters["superseded"] += 1
+            self._gripper_command = command
+
+    # --- Control loop ---
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="manual-control", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join(timeout=1)
+
+    def stats(self) -> Dict:
+        return {**self.counters, "moving": self.target is not None,
+                "pending": self._joint_target is not None or self._gripper_command is not None}
+
+    def _run(self):
+        next_tick = time.monotonic()
+        while self._running:
+            try:
+                self.step()
+            except Exception as e:
+                print(f"⚠️ Manual control tick failed: {e}")
+            next_tick += self.tick
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_tick = time.monotonic()
+
+    def step(self):
+        """One control tick"""
+        with self._lock:
+            joint_target, self._joint_target = self._joint_target, None
+            gripper_command, self._gripper_command = self._gripper_command, None
+
+        if self.is_blocked():
+            # Another executor owns the arm: drop manual targets, restart from rest afterwards
+            self.target = self.tracker = self.gripper = self.gripper_angle = None
+            return
+
+        if joint_target is not None:
+            if self.tracker is None:
+                self.tracker = TargetTracker(self.read_joints(), tick=self.tick)
+            elif self.target is not None and not self.tracker.settled:
+                self.counters["retargeted"] += 1
+            self.target = joints_from(joint_target, self.target or self.tracker.output)
+
+        if self.target is not None:
+            self.apply_joints(self.tracker.step(self.target))
+            self.counters["ticks_active"] += 1
+            if self.tracker.settled:
+                self.target = None  # Reached; the tracker keeps its state for the next command
+
+        if gripper_command is not None:
+            self.gripper = gripper_command
+            if self.gripper_angle is None:
+                self.gripper_angle = float(self.read_gripper())
+        if self.gripper is not None:
+            goal = float(self.gripper["angle"])
+            limit = GRIPPER_MAX_RATE * self.tick
+            self.gripper_angle += max(-limit, min(limit, goal - self.gripper_angle))
+            self.apply_gripper(int(round(self.gripper_angle)), self.gripper)
+            if self.gripper_angle == goal:
+                self.gripper = None
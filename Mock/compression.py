@@ -0,0 +1,182 @@
+"""
+Negotiated response compression (zstd / brotli / gzip).
+
+gzip is always available; brotli and zstd are used when the optional
+`brotli` / `zstandard` packages are installed. Small responses are sent as-is,
+and responses that already carry a Content-Encoding (precompressed assets,
+archived logs) are passed through untouched.
+"""
+
+import gzip
+import zlib
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # Optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # Optional dependency
+    zstandard = None
+
+MIN_SIZE = 1024
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "image/svg+xml")
+
+# Levels picked for shop-floor Wi-Fi: most of the size win for little CPU
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+ZSTD_LEVEL = 3
+
+
+def available_encodings() -> List[str]:
+    """Server preference order"""
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings.append("gzip")
+    return encodings
+
+
+def negotiate(accept_encoding: str, offered: Optional[List[str]] = None) -> Optional[str]:
+    """Pick the best encoding the client accepts (q > 0), or None for identity"""
+    offered = offered or available_encodings()
+    accepted: Dict[str, float] = {}
+    for part in (accept_encoding or "").split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[token] = q
+    wildcard = accepted.get("*", 0.0)
+    candidates = [(accepted.get(enc, wildcard), -i, enc) for i, enc in enumerate(offered)]
+    q, _, enc = max(candidates)
+    return enc if q > 0 else None
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """One-shot compression of a complete payload"""
+    if encoding == "gzip":
+        return gzip.compress(data, GZIP_LEVEL, mtime=0)
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+def streaming_compressor(encoding: str) -> Tuple[Callable[[bytes], bytes], Callable[[], bytes]]:
+    """Return (feed, finish) functions for incremental compression"""
+    if encoding == "gzip":
+        c = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        return c.compress, c.flush
+    if encoding == "br":
+        c = brotli.Compressor(quality=BROTLI_QUALITY)
+        return c.process, c.finish
+    if encoding == "zstd":
+        c = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+        return c.compress, c.flush
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware: buffers the start of each response until MIN_SIZE bytes
+    are seen, then either sends it uncompressed (small / not compressible) or
+    switches to streaming compression for the rest of the body.
+    """
+
+    def __init__(self, app, minimum_size: int = MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = {k.decode().lower(): v.decode() for k, v in scope.get("headers", [])}
+        encoding = negotiate(headers.get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await _CompressingResponder(self.app, encoding, self.minimum_size)(scope, receive, send)
+
+
+class _CompressingResponder:
+    def __init__(self, app, encoding: str, minimum_size: int):
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start_message = None
+        self.buffer = b""
+        self.mode = "pending"  # pending -> passthrough | compress
+        self.feed = self.finish = None
+
+    async def __call__(self, scope, receive, send):
+        self.send = send
+        await self.app(scope, receive, self.handle)
+
+    def _eligible(self) -> bool:
+        headers = {k.decode().lower(): v.decode() for k, v in self.start_message["headers"]}
+        if "content-encoding" in headers or self.start_message["status"] < 200 or self.start_message["status"] in (204, 304):
+            return False
+        content_type = headers.get("content-type", "")
+        return any(content_type.startswith(t) for t in COMPRESSIBLE_TYPES)
+
+    async def _start(self, compress_body: bool):
+        message = self.start_message
+        if compress_body:
+            self.mode = "compress"
+            self.feed, self.finish = streaming_compressor(self.encoding)
+            headers = [(k, v) for k, v in message["headers"] if k.lower() not in (b"content-length", b"etag", b"vary")]
+            vary = [v.decode() for k, v in message["headers"] if k.lower() == b"vary"]
+            if not any("accept-encoding" in v.lower() for v in vary):
+                vary.append("Accept-Encoding")
+            headers.append((b"content-encoding", self.encoding.encode()))
+            headers.append((b"vary", ", ".join(vary).encode()))
+            message = {**message, "headers": headers}
+        else:
+            self.mode = "passthrough"
+        await self.send(message)
+
+    async def handle(self, message):
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            return
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more = message.get("more_body", False)
+
+        if self.mode == "pending":
+            self.buffer += body
+            if more and len(self.buffer) < self.minimum_size:
+                return  # Keep buffering until we know whether it is worth it
+            if len(self.buffer) < self.minimum_size or not self._eligible():
+                await self._start(False)
+                await self.send({"type": "http.response.body", "body": self.buffer, "more_body": more})
+                self.buffer = b""
+                return
+            await self._start(True)
+            body, self.buffer = self.buffer, b""
+
+        if self.mode == "passthrough":
+            await self.send(message)
+            return
+
+        chunk = self.feed(body)
+        if not more:
+            chunk += self.finish()
+        await self.send({"type": "http.response.body", "body": chunk, "more_body": more})
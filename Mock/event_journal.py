@@ -0,0 +1,286 @@
+"""
+Append-only binary journal of what the robot was told and what it did.
+
+Events (commands with their origin, run step transitions, state changes) are
+written as length-prefixed binary records into size-rotated segment files:
+
+    header  <IIqqB  payload length, CRC32 of payload, monotonic ns, wall ns, kind
+    payload compact JSON
+
+record() only appends to an in-memory queue, so callers (the control loop,
+request handlers) never wait for the disk; a writer thread drains the queue
+in batches. The same thread samples the shared state and writes only the
+fields that changed, plus a full snapshot every SNAPSHOT_INTERVAL seconds and
+at the start of every segment. Wall timestamps are derived from the
+monotonic clock (anchored once), so they never jump backwards.
+
+Each segment has a sidecar index of (wall ns, offset) of its snapshots, and
+segment files are named by their first timestamp: "state at time T" is a
+bisect over segments, a bisect over the index and a scan of at most
+SNAPSHOT_INTERVAL seconds of records. A torn record at the end of a segment
+(crash mid-write) fails its CRC and ends the scan of that segment; a new
+segment is started on every start.
+"""
+
+import bisect
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+JOURNAL_DIR = os.environ.get("ROBOT_JOURNAL_DIR", "journal")
+SEGMENT_BYTES = 16 * 1024 * 1024
+MAX_SEGMENTS = 64                # Oldest segments are deleted beyond this (about 1 GB)
+SNAPSHOT_INTERVAL = 10.0         # seconds between full state snapshots
+SAMPLE_INTERVAL = 0.1            # seconds between state samples (and queue drains)
+MAX_QUEUED = 100_000             # Events beyond this are dropped (and counted), never waited for
+REORDER_WINDOW_NS = 500_000_000  # Records may be written up to this much out of timestamp order
+
+KINDS = {"snapshot": 1, "state": 2, "command": 3, "step": 4, "event": 5}
+KIND_NAMES = {code: name for name, code in KINDS.items()}
+
+_HEADER = struct.Struct("<IIqqB")
+_INDEX = struct.Struct("<qQ")    # wall ns, offset of a snapshot record
+
+# Who sent the request being handled (set per request by RequestOriginMiddleware)
+request_origin: ContextVar[Dict[str, Any]] = ContextVar("request_origin", default={})
+
+
+class RequestOriginMiddleware:
+    """Pure ASGI: remembers the client address and X-Operator header for journaled commands"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            origin = {"client": scope["client"][0] if scope.get("client") else None}
+            for name, value in scope["headers"]:
+                if name == b"x-operator":
+                    origin["operator"] = value.decode(errors="replace")[:64]
+            request_origin.set(origin)
+        await self.app(scope, receive, send)
+
+
+def _round_state(state: Dict[str, Any]) -> Dict[str, Any]:
+    # Sensor noise below 0.01 is not a state change
+    return {k: round(v, 2) if isinstance(v, float) else v for k, v in state.items()}
+
+
+def _segment_start(name: str) -> int:
+    return int(name.split(".")[0])
+
+
+class EventJournal:
+    def __init__(self, directory: str = JOURNAL_DIR, read_state: Optional[Callable[[], Dict[str, Any]]] = None,
+                 segment_bytes: int = SEGMENT_BYTES, max_segments: int = MAX_SEGMENTS,
+                 snapshot_interval: float = SNAPSHOT_INTERVAL, sample_interval: float = SAMPLE_INTERVAL):
+        self.directory = directory
+        self.read_state = read_state
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self.snapshot_interval_ns = int(snapshot_interval * 1e9)
+        self.sample_interval = sample_interval
+        self.dropped = 0
+        self.written = 0
+        self._queue: deque = deque()
+        self._anchor = time.time_ns() - time.monotonic_ns()
+        self._segment = None
+        self._index = None
+        self._segment_size = 0
+        self._last_snapshot_ns = 0
+        self._last_state: Dict[str, Any] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # --- Writing ---
+    def record(self, kind: str, **data):
+        """Queue an event (never blocks; drops and counts when the writer is far behind)"""
+        if len(self._queue) >= MAX_QUEUED:
+            self.dropped += 1
+            return
+        self._queue.append((time.monotonic_ns(), KINDS[kind], data))
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="event-journal", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def _run(self):
+        try:
+            while not self._stop.wait(self.sample_interval):
+                self._write_pending()
+            self._write_pending()
+        finally:
+            self._close_segment()
+
+    def _write_pending(self):
+        now = time.monotonic_ns()
+        batch = []
+        while self._queue:
+            batch.append(self._queue.popleft())
+        if self.read_state is not None:
+            state = _round_state(self.read_state())
+            if self._segment is None or now - self._last_snapshot_ns >= self.snapshot_interval_ns:
+                batch.append((now, KINDS["snapshot"], state))
+            else:
+                changed = {k: v for k, v in state.items() if self._last_state.get(k) != v}
+                if changed:
+                    batch.append((now, KINDS["state"], changed))
+            self._last_state = state
+        batch.sort(key=lambda item: item[0])
+        for mono_ns, kind, data in batch:
+            self._write(mono_ns, kind, data)
+        if self._segment is not None:
+            self._segment.flush()
+            self._index.flush()
+
+    def _write(self, mono_ns: int, kind: int, data: Dict[str, Any]):
+        if self._segment is None or self._segment_size >= self.segment_bytes:
+            self._rotate(mono_ns)
+            if kind != KINDS["snapshot"] and self.read_state is not None:
+                # Every segment starts with a snapshot, so it can be read on its own
+                self._last_state = _round_state(self.read_state())
+                self._write(mono_ns, KINDS["snapshot"], self._last_state)
+        payload = json.dumps(data, separators=(",", ":"), default=str).encode()
+        wall_ns = mono_ns + self._anchor
+        if kind == KINDS["snapshot"]:
+            self._index.write(_INDEX.pack(wall_ns, self._segment_size))
+            self._last_snapshot_ns = mono_ns
+        self._segment.write(_HEADER.pack(len(payload), zlib.crc32(payload), mono_ns, wall_ns, kind) + payload)
+        self._segment_size += _HEADER.size + len(payload)
+        self.written += 1
+
+    def _rotate(self, mono_ns: int):
+        self._close_segment()
+        wall_ns = mono_ns + self._anchor
+        name = f"{wall_ns:020d}"
+        while os.path.exists(os.path.join(self.directory, name + ".seg")):
+            wall_ns += 1  # Same nanosecond as an existing segment (clock anchored differently)
+            name = f"{wall_ns:020d}"
+        self._segment = open(os.path.join(self.directory, name + ".seg"), "ab")
+        self._index = open(os.path.join(self.directory, name + ".idx"), "ab")
+        self._segment_size = 0
+        for old in self.segments()[:-self.max_segments]:
+            for ext in (".seg", ".idx"):
+                try:
+                    os.remove(os.path.join(self.directory, old + ext))
+                except FileNotFoundError:
+                    pass
+
+    def _close_segment(self):
+        if self._segment is not None:
+            self._segment.close()
+            self._index.close()
+            self._segment = self._index = None
+
+    # --- Reading (works from any process: only reads the files) ---
+    def segments(self) -> List[str]:
+        """Segment base names, oldest first"""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name[:-4] for name in os.listdir(self.directory) if name.endswith(".seg"))
+
+    def _snapshot_offset(self, segment: str, wall_ns: int) -> Tuple[int, Optional[int]]:
+        """(offset, snapshot wall ns) of the last snapshot at or before wall_ns in a segment"""
+        try:
+            with open(os.path.join(self.directory, segment + ".idx"), "rb") as f:
+                raw = f.read()
+        except FileNotFoundError:
+            return 0, None
+        entries = [_INDEX.unpack_from(raw, i) for i in range(0, len(raw) - _INDEX.size + 1, _INDEX.size)]
+        i = bisect.bisect_right([t for t, _ in entries], wall_ns) - 1
+        return (entries[i][1], entries[i][0]) if i >= 0 else (0, None)
+
+    def _scan(self, segment: str, offset: int = 0) -> Iterator[Tuple[int, int, Dict[str, Any]]]:
+        """(wall ns, kind, data) from offset to the end of the segment (or the first damaged record)"""
+        try:
+            f = open(os.path.join(self.directory, segment + ".seg"), "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            f.seek(offset)
+            while True:
+                header = f.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    return
+                length, crc, _, wall_ns, kind = _HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    return  # Torn write at the tail
+                yield wall_ns, kind, json.loads(payload)
+
+    def _segments_from(self, wall_ns: Optional[int]) -> List[str]:
+        """Segments that can hold records at or after wall_ns"""
+        segments = self.segments()
+        if wall_ns is None:
+            return segments
+        i = bisect.bisect_right([_segment_start(s) for s in segments], wall_ns) - 1
+        return segments[max(i, 0):]
+
+    def events(self, start: Optional[float] = None, end: Optional[float] = None,
+               kinds: Optional[List[str]] = None, limit: int = 1000) -> List[Dict[str, Any]]:
+        """Events between two wall-clock times (epoch seconds), oldest first"""
+        start_ns = None if start is None else int(start * 1e9)
+        end_ns = None if end is None else int(end * 1e9)
+        wanted = {KINDS[k] for k in kinds} if kinds else None
+        out: List[Dict[str, Any]] = []
+        for segment in self._segments_from(start_ns):
+            if end_ns is not None and _segment_start(segment) > end_ns + REORDER_WINDOW_NS:
+                break
+            offset = self._snapshot_offset(segment, start_ns)[0] if start_ns is not None else 0
+            for wall_ns, kind, data in self._scan(segment, offset):
+                if start_ns is not None and wall_ns < start_ns:
+                    continue
+                if end_ns is not None and wall_ns > end_ns:
+                    if wall_ns > end_ns + REORDER_WINDOW_NS:
+                        break
+                    continue
+                if wanted is None or kind in wanted:
+                    out.append({"t": wall_ns / 1e9, "kind": KIND_NAMES.get(kind, str(kind)), "data": data})
+                    if len(out) >= limit:
+                        return out
+        return out
+
+    def state_at(self, t: float) -> Optional[Dict[str, Any]]:
+        """State at wall-clock time t: the last snapshot before t plus the changes up to t"""
+        wall_ns = int(t * 1e9)
+        segments = self.segments()
+        i = bisect.bisect_right([_segment_start(s) for s in segments], wall_ns) - 1
+        if i < 0:
+            return None
+        segment = segments[i]
+        offset, snapshot_ns = self._snapshot_offset(segment, wall_ns)
+        state: Optional[Dict[str, Any]] = None
+        for record_ns, kind, data in self._scan(segment, offset):
+            if record_ns > wall_ns + REORDER_WINDOW_NS:
+                break
+            if record_ns > wall_ns:
+                continue
+            if kind == KINDS["snapshot"]:
+                state = dict(data)
+                snapshot_ns = record_ns
+            elif kind == KINDS["state"] and state is not None:
+                state.update(data)
+        if state is None:
+            return None
+        return {"t": t, "state": state, "snapshot_t": snapshot_ns / 1e9 if snapshot_ns else None}
+
+    def stats(self) -> Dict[str, Any]:
+        segments = self.segments()
+        size = sum(os.path.getsize(os.path.join(self.directory, s + ".seg")) for s in segments)
+        return {"segments": len(segments), "bytes": size, "written": self.written,
+                "queued": len(self._queue), "dropped": self.dropped,
+                "since": _segment_start(segments[0]) / 1e9 if segments else None}
@@ -0,0 +1,274 @@
+"""
+High-rate force sensor pipeline.
+
+A load cell delivers noisy samples at up to 1 kHz, far faster than anyone
+polls /data. ForceSensorPipeline ingests them into preallocated ring buffers
+(raw and filtered, 2 s by default; nothing is allocated per sample) and runs
+streaming filters on every sample, each O(1):
+
+  average  - moving average over a fixed window (running sum)
+  lowpass  - first-order IIR low-pass (exponential smoothing at a cutoff)
+  kalman   - scalar Kalman filter with a random-walk force model
+
+One of them is the primary output, decimated to slower consumers (telemetry
+into the shared state, the log-rate history) by keeping every n-th filtered
+sample. The low-pass cutoff defaults below the telemetry Nyquist rate, so
+decimation does not alias the noise into the dashboard.
+
+SimulatedLoadCell produces such a stream from the simulated force (Gaussian
+noise plus occasional spikes) for the simulator and for benchmarking
+(benchmarks/bench_force_sensor.py). Plain Python arithmetic over array
+buffers: about a microsecond per sample and filter.
+"""
+
+import math
+import random
+import threading
+import time
+from array import array
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+SAMPLE_RATE_HZ = 1000
+BUFFER_SECONDS = 2.0
+TELEMETRY_RATE_HZ = 25        # One value per control tick (motion.TICK_INTERVAL)
+LOG_RATE_HZ = 100
+HISTORY_SECONDS = 60.0        # Log-rate samples kept for GET /api/sensor/force
+FILTERS = ("average", "lowpass", "kalman")
+
+
+class MovingAverage:
+    """Mean of the last `window` samples: add the new one, subtract the one leaving"""
+
+    def __init__(self, window: int = 20):
+        self.window = max(1, int(window))
+        self.reset()
+
+    def reset(self, value: float = 0.0):
+        self._ring = array("d", [value]) * self.window
+        self._index = 0
+        self._sum = value * self.window
+        self._since_resum = 0
+        self.value = value
+
+    def update(self, x: float) -> float:
+        ring, i = self._ring, self._index
+        self._sum += x - ring[i]
+        ring[i] = x
+        self._index = i + 1 if i + 1 < self.window else 0
+        self._since_resum += 1
+        if self._since_resum >= 1_000_000:
+            # Re-add from scratch now and then so rounding errors of the running sum cannot build up
+            self._sum, self._since_resum = math.fsum(ring), 0
+        self.value = self._sum / self.window
+        return self.value
+
+
+class LowPass:
+    """First-order low-pass (RC) filter at `cutoff_hz` for samples at `rate_hz`"""
+
+    def __init__(self, cutoff_hz: float = 10.0, rate_hz: float = SAMPLE_RATE_HZ):
+        dt = 1.0 / rate_hz
+        rc = 1.0 / (2 * math.pi * cutoff_hz)
+        self.alpha = dt / (rc + dt)
+        self.cutoff_hz = cutoff_hz
+        self.reset()
+
+    def reset(self, value: float = 0.0):
+        self.value = value
+
+    def update(self, x: float) -> float:
+        self.value += self.alpha * (x - self.value)
+        return self.value
+
+
+class Kalman:
+    """
+    Scalar Kalman filter: the force is a random walk (process variance per
+    sample) observed with white measurement noise. Adapts its gain: fast
+    after a reset, smoother once the estimate has settled.
+    """
+
+    def __init__(self, process_var: float = 1e-3, measurement_var: float = 0.0225):
+        self.q = process_var
+        self.r = measurement_var
+        self.reset()
+
+    def reset(self, value: float = 0.0, variance: float = 1.0):
+        self.value = value
+        self.p = variance
+
+    def update(self, x: float) -> float:
+        p = self.p + self.q
+        k = p / (p + self.r)
+        self.value += k * (x - self.value)
+        self.p = (1.0 - k) * p
+        return self.value
+
+
+class Decimator:
+    """Passes every `factor`-th sample to `sink(t, value)`"""
+
+    def __init__(self, rate_in: float, rate_out: float, sink: Callable[[float, float], None]):
+        self.factor = max(1, round(rate_in / rate_out))
+        self.sink = sink
+        self._count = 0
+
+    def update(self, t: float, value: float):
+        self._count += 1
+        if self._count >= self.factor:
+            self._count = 0
+            self.sink(t, value)
+
+
+class ForceSensorPipeline:
+    """
+    Ring buffers + filters + decimated outputs for one force sensor.
+    push() is called by a single producer (the sensor thread); readers get
+    copies (latest, recent, history), never references into the buffers.
+    """
+
+    def __init__(self, rate_hz: float = SAMPLE_RATE_HZ, primary: str = "lowpass",
+                 buffer_seconds: float = BUFFER_SECONDS, cutoff_hz: Optional[float] = None,
+                 average_window: int = 20, measurement_var: float = 0.0225, process_var: float = 1e-3):
+        if primary not in FILTERS and primary != "raw":
+            raise ValueError(f"Unknown filter '{primary}' (one of {', '.join(FILTERS)}, raw)")
+        self.rate_hz = rate_hz
+        self.primary = primary
+        self.capacity = max(1, int(rate_hz * buffer_seconds))
+        self.t = array("d", bytes(8 * self.capacity))
+        self.raw = array("d", bytes(8 * self.capacity))
+        self.filtered = array("d", bytes(8 * self.capacity))
+        self.count = 0  # Samples ever pushed; the next one goes to count % capacity
+        self.filters = {
+            "average": MovingAverage(average_window),
+            "lowpass": LowPass(cutoff_hz or TELEMETRY_RATE_HZ * 0.4, rate_hz),
+            "kalman": Kalman(process_var, measurement_var),
+        }
+        self.outputs: List[Decimator] = []
+
+    def add_output(self, rate_hz: float, sink: Callable[[float, float], None]) -> Decimator:
+        """Deliver the primary filter output at `rate_hz` (e.g. telemetry, logging)"""
+        decimator = Decimator(self.rate_hz, rate_hz, sink)
+        self.outputs.append(decimator)
+        return decimator
+
+    def reset(self, value: float = 0.0):
+        for f in self.filters.values():
+            f.reset(value)
+
+    def push(self, x: float, t: Optional[float] = None):
+        t = time.time() if t is None else t
+        if self.count == 0:
+            self.reset(x)  # Start the filters at the first reading instead of ramping up from 0
+        out = x
+        for name, f in self.filters.items():
+            y = f.update(x)
+            if name == self.primary:
+                out = y
+        i = self.count % self.capacity
+        self.t[i], self.raw[i], self.filtered[i] = t, x, out
+        self.count += 1
+        for decimator in self.outputs:
+            decimator.update(t, out)
+
+    def push_many(self, samples: Iterator[Tuple[float, float]]):
+        """(t, value) pairs, oldest first (a driver delivering a burst)"""
+        for t, x in samples:
+            self.push(x, t)
+
+    def latest(self) -> Dict:
+        """Last raw sample and the current output of every filter"""
+        if not self.count:
+            return {"t": None, "raw": None, **{name: None for name in self.filters}}
+        i = (self.count - 1) % self.capacity
+        return {"t": self.t[i], "raw": self.raw[i], **{name: f.value for name, f in self.filters.items()}}
+
+    def recent(self, n: int) -> List[Tuple[float, float, float]]:
+        """Up to the last n samples as (t, raw, filtered), oldest first"""
+        n = max(0, min(n, self.count, self.capacity))
+        start = self.count - n
+        return [(self.t[k % self.capacity], self.raw[k % self.capacity], self.filtered[k % self.capacity])
+                for k in range(start, self.count)]
+
+
+class History:
+    """Fixed-size ring of (t, value) pairs fed by a decimated output"""
+
+    def __init__(self, rate_hz: float = LOG_RATE_HZ, seconds: float = HISTORY_SECONDS):
+        self.capacity = max(1, int(rate_hz * seconds))
+        self.t = array("d", bytes(8 * self.capacity))
+        self.value = array("d", bytes(8 * self.capacity))
+        self.count = 0
+
+    def append(self, t: float, value: float):
+        i = self.count % self.capacity
+        self.t[i], self.value[i] = t, value
+        self.count += 1
+
+    def since(self, t0: float) -> List[Tuple[float, float]]:
+        n = min(self.count, self.capacity)
+        out = [(self.t[k % self.capacity], self.value[k % self.capacity]) for k in range(self.count - n, self.count)]
+        return [(t, v) for t, v in out if t >= t0]
+
+
+class SimulatedLoadCell:
+    """
+    Load cell readings of a force given by `read_force()` (N): Gaussian noise,
+    and a short spike with probability `spike_rate` per sample (a knock on
+    the gripper).
+    """
+
+    def __init__(self, read_force: Callable[[], float], rate_hz: float = SAMPLE_RATE_HZ,
+                 noise_n: float = 0.15, spike_rate: float = 0.001, spike_n: float = 2.0, seed: Optional[int] = None):
+        self.read_force = read_force
+        self.rate_hz = rate_hz
+        self.noise_n = noise_n
+        self.spike_rate = spike_rate
+        self.spike_n = spike_n
+        self.rng = random.Random(seed)
+        self.late = 0          # Batches that started behind schedule
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def reading(self, truth: float) -> float:
+        x = truth + self.rng.gauss(0.0, self.noise_n)
+        if self.rng.random() < self.spike_rate:
+            x += self.rng.uniform(-self.spike_n, self.spike_n)
+        return x
+
+    def samples(self, count: int, t0: float = 0.0) -> Iterator[Tuple[float, float]]:
+        """`count` (t, reading) pairs on a virtual clock (no sleeping), for benchmarks"""
+        dt = 1.0 / self.rate_hz
+        for k in range(count):
+            yield t0 + k * dt, self.reading(self.read_force())
+
+    def start(self, pipeline: ForceSensorPipeline, batch_s: float = 0.01):
+        """Stream in real time: every `batch_s`, push the samples that fell due since the last batch"""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(pipeline, batch_s), name="force-sensor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=1)
+
+    def _run(self, pipeline: ForceSensorPipeline, batch_s: float):
+        dt = 1.0 / self.rate_hz
+        # Samples fall due on the monotonic clock (immune to wall-clock steps); wall time only stamps them
+        start, wall_start = time.monotonic(), time.time()
+        produced = 0
+        next_batch = start
+        while not self._stop.is_set():
+            due = int((time.monotonic() - start) * self.rate_hz)
+            truth = self.read_force()  # The simulated force changes per control tick, not per sample
+            for k in range(produced, due):
+                pipeline.push(self.reading(truth), wall_start + k * dt)
+            produced = due
+            next_batch += batch_s
+            delay = next_batch - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                self.late += 1
+                next_batch = time.monotonic()
@@ -2,11 +2,57 @@
 Generate ER Diagram XML for Draw.io from SQLite database
 Usage: python generate_er_diagram.py
 Output: er_diagram.xml (can be imported to draw.io)
+
+Index advisor: python generate_er_diagram.py --advise [--rows 20000] [--repeat 20]
+Runs EXPLAIN QUERY PLAN over the backend's queries, flags full scans and
+sorts, prints the index DDL that removes them and benchmarks the queries
+before / after on a synthetic copy of the schema.
 """
 
+import argparse
+import os
+import random
 import sqlite3
+import statistics
+import tempfile
+import time
 import xml.etree.ElementTree as ET
-from typing import List, Tuple, Dict
+from typing import List, NamedTuple, Optional, Tuple, Dict
+
+
+class BackendQuery(NamedTuple):
+    """A query simulation.py issues; :params are named after columns of `table`"""
+    label: str
+    table: str
+    sql: str
+    where: Tuple[str, ...] = ()   # Filtered columns (equality first)
+    order: Tuple[str, ...] = ()   # ORDER BY columns
+
+
+# Keep in step with the statements in simulation.py (hot paths: API requests and run start)
+BACKEND_QUERIES = [
+    BackendQuery("Steps of a pattern (pattern.steps)", "patternsteps",
+                 "SELECT * FROM patternsteps WHERE pattern_id = :pattern_id", ("pattern_id",)),
+    BackendQuery("Steps of changed patterns (sync push)", "patternsteps",
+                 "SELECT * FROM patternsteps WHERE pattern_id IN (:pattern_id) ORDER BY pattern_id, sequence_order",
+                 ("pattern_id",), ("pattern_id", "sequence_order")),
+    BackendQuery("All steps (sync pull)", "patternsteps",
+                 "SELECT * FROM patternsteps ORDER BY pattern_id, sequence_order", (), ("pattern_id", "sequence_order")),
+    BackendQuery("Pattern by name (sync push)", "teachingpatterns",
+                 "SELECT * FROM teachingpatterns WHERE name = :name", ("name",)),
+    BackendQuery("Run history (/api/history)", "runhistory",
+                 "SELECT * FROM runhistory ORDER BY created_at DESC", (), ("created_at",)),
+    BackendQuery("Runs of a pattern (analytics)", "runhistory",
+                 "SELECT * FROM runhistory WHERE pattern_id = :pattern_id ORDER BY created_at DESC LIMIT 50",
+                 ("pattern_id",), ("created_at",)),
+    BackendQuery("Interrupted runs (/auto-run/interrupted)", "runhistory",
+                 "SELECT * FROM runhistory WHERE status = :status ORDER BY created_at DESC",
+                 ("status",), ("created_at",)),
+    BackendQuery("Log catalog (/api/logs)", "logfile",
+                 "SELECT * FROM logfile ORDER BY created_at DESC", (), ("created_at",)),
+]
+# An index is only recommended if some query it serves gets at least this much faster
+MIN_SPEEDUP = 1.5
 
 class ERDiagramGenerator:
     def __init__(self, db_path: str = "robot_arm_system.db"):
@@ -45,6 +91,50 @@ class ERDiagramGenerator:
             })
         return fks
     
+    def get_indexes(self, table_name: str) -> List[Tuple[str, ...]]:
+        """Column lists of the table's indexes (including unique constraints)"""
+        self.cursor.execute(f"PRAGMA index_list({table_name})")
+        names = [row[1] for row in self.cursor.fetchall()]
+        indexes = []
+        for name in names:
+            self.cursor.execute(f"PRAGMA index_info({name})")
+            indexes.append(tuple(row[2] for row in self.cursor.fetchall()))
+        return indexes
+
+    def explain(self, sql: str, params: Optional[Dict] = None) -> List[str]:
+        """EXPLAIN QUERY PLAN detail lines"""
+        self.cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params or {})
+        return [row[3] for row in self.cursor.fetchall()]
+
+    def check_query(self, query: BackendQuery) -> Dict:
+        """Plan of one backend query and what is wrong with it"""
+        if query.table not in self.get_tables():
+            return {"query": query, "plan": [], "problems": [f"table {query.table} does not exist"], "columns": ()}
+        params = {name: None for name in query.where}
+        plan = self.explain(query.sql, params)
+        problems = []
+        if query.where and f"SCAN {query.table}" in plan:
+            problems.append("full table scan")
+        if query.order and any(line.startswith("USE TEMP B-TREE") for line in plan):
+            problems.append("sorts the result (temp b-tree)")
+        columns = tuple(dict.fromkeys(query.where + query.order)) if problems else ()
+        return {"query": query, "plan": plan, "problems": problems, "columns": columns}
+
+    def advise_indexes(self, queries: List[BackendQuery] = BACKEND_QUERIES) -> Tuple[List[Dict], List[Tuple[str, str, Tuple[str, ...]]]]:
+        """
+        (findings, recommended indexes). Recommendations are (name, table, columns);
+        an index whose columns are a prefix of another one's on the same table is
+        served by the longer one and not recommended separately.
+        """
+        findings = [self.check_query(q) for q in queries]
+        wanted = {(f["query"].table, f["columns"]) for f in findings if f["columns"]}
+        recommended = []
+        for table, columns in sorted(wanted):
+            if any(t == table and c != columns and c[:len(columns)] == columns for t, c in wanted):
+                continue
+            recommended.append((f"ix_{table}_{'_'.join(columns)}", table, columns))
+        return findings, recommended
+
     def generate_drawio_xml(self) -> str:
         """Generate Draw.io compatible XML"""
         tables = self.get_tables()
@@ -267,5 +357,159 @@ def create_summary_document():
     
     print(f"✅ Schema documentation created: DATABASE_SCHEMA.md")
 
+def index_ddl(recommended: List[Tuple[str, str, Tuple[str, ...]]]) -> List[str]:
+    return [f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)});"
+            for name, table, columns in recommended]
+
+def build_synthetic_db(source: str, path: str, rows: int = 20000, fanout: int = 8, seed: int = 0):
+    """
+    Copy the tables and indexes of `source` (without data) into `path` and fill
+    them with random rows: `rows` per table, `rows * fanout` for tables with a
+    foreign key (pattern steps). Text columns get `rows // 10` distinct values.
+    """
+    rng = random.Random(seed)
+    src = sqlite3.connect(source)
+    schema = src.execute(
+        "SELECT type, name, tbl_name, sql FROM sqlite_master WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' "
+        "ORDER BY type DESC").fetchall()  # Tables before indexes
+    virtual = [name for kind, name, _, sql in schema if kind == "table" and sql.upper().startswith("CREATE VIRTUAL")]
+    tables = [(name, sql) for kind, name, _, sql in schema
+              if kind == "table" and not any(name == v or name.startswith(v + "_") for v in virtual)]
+    indexes = [sql for kind, _, table, sql in schema if kind == "index" and table in dict(tables)]
+
+    if os.path.exists(path):
+        os.remove(path)
+    dst = sqlite3.connect(path)
+    for name, sql in tables:
+        dst.execute(sql)
+        columns = src.execute(f"PRAGMA table_info({name})").fetchall()
+        has_fk = bool(src.execute(f"PRAGMA foreign_key_list({name})").fetchall())
+        count = rows * fanout if has_fk else rows
+        distinct = max(1, rows // 10)
+        unique = {src.execute(f"PRAGMA index_info({index[1]})").fetchone()[2]
+                  for index in src.execute(f"PRAGMA index_list({name})").fetchall() if index[2]}
+
+        def value(column, i):
+            _, col, col_type, _, _, pk = column
+            col_type = (col_type or "").upper()
+            if pk and "INT" in col_type:
+                return None  # rowid
+            if pk or col in unique:
+                return f"{col}_{i}"
+            if col.endswith("_id") or col_type.startswith("INT") and col.endswith("order"):
+                return rng.randrange(1, rows + 1)
+            if "INT" in col_type or "BOOL" in col_type:
+                return rng.randrange(0, 100)
+            if "FLOAT" in col_type or "REAL" in col_type:
+                return rng.uniform(-180, 180)
+            if "DATE" in col_type:
+                return f"2025-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d} {rng.randrange(24):02d}:00:00"
+            return f"{col}_{rng.randrange(distinct)}"
+
+        placeholders = ", ".join("?" * len(columns))
+        dst.executemany(f"INSERT INTO {name} VALUES ({placeholders})",
+                        ([value(c, i) for c in columns] for i in range(count)))
+    for sql in indexes:
+        dst.execute(sql)
+    dst.commit()
+    dst.execute("ANALYZE")
+    dst.close()
+    src.close()
+
+def sample_params(conn: sqlite3.Connection, query: BackendQuery) -> Dict:
+    """Parameter values taken from an existing row, so lookups find something"""
+    if not query.where:
+        return {}
+    row = conn.execute(f"SELECT {', '.join(query.where)} FROM {query.table} ORDER BY random() LIMIT 1").fetchone()
+    return dict(zip(query.where, row or [None] * len(query.where)))
+
+def benchmark(path: str, queries: List[BackendQuery], repeat: int = 20) -> Dict[str, float]:
+    """Median milliseconds per query (all rows fetched)"""
+    conn = sqlite3.connect(path)
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    results = {}
+    for query in queries:
+        if query.table not in tables:
+            continue
+        times = []
+        for _ in range(repeat):
+            params = sample_params(conn, query)
+            start = time.perf_counter()
+            conn.execute(query.sql, params).fetchall()
+            times.append((time.perf_counter() - start) * 1000)
+        results[query.label] = statistics.median(times)
+    conn.close()
+    return results
+
+def run_index_advisor(db_path: str = "robot_arm_system.db", rows: int = 20000, fanout: int = 8, repeat: int = 20):
+    """Print full scans found in the backend's queries, the index DDL and a before/after benchmark"""
+    print("\n" + "="*60)
+    print(f"Index advisor ({db_path})")
+    print("="*60)
+    gen = ERDiagramGenerator(db_path)
+    findings, _ = gen.advise_indexes()
+    for f in findings:
+        marker = "⚠️ " if f["problems"] else "✅"
+        print(f"{marker} {f['query'].label}: {'; '.join(f['problems']) or 'uses an index'}")
+        for line in f["plan"]:
+            print(f"      {line}")
+    gen.conn.close()
+
+    # Removed again on every exit path, including errors part-way through
+    with tempfile.TemporaryDirectory(prefix="index_advisor_") as workdir:
+        synthetic = os.path.join(workdir, "synthetic.db")
+        print(f"\n🧪 Synthetic database: {rows} rows per table, {rows * fanout} pattern steps")
+        build_synthetic_db(db_path, synthetic, rows, fanout)
+        # Recommend from the synthetic copy (planner statistics from ANALYZE), then prove the plans change
+        synth = ERDiagramGenerator(synthetic)
+        findings, recommended = synth.advise_indexes()
+        flagged = [f["query"] for f in findings if f["columns"]]
+        if not recommended:
+            print("✅ No missing indexes")
+            synth.conn.close()
+            return []
+
+        before = benchmark(synthetic, flagged, repeat)
+        for sql in index_ddl(recommended):
+            synth.cursor.execute(sql)
+        synth.conn.commit()
+        synth.cursor.execute("ANALYZE")
+        still_flagged = {f["query"].label for f in (synth.check_query(q) for q in flagged) if f["problems"]}
+        synth.conn.close()
+        after = benchmark(synthetic, flagged, repeat)
+        speedup = {q.label: before[q.label] / after[q.label] if after[q.label] else float("inf") for q in flagged}
+
+        print(f"\n⏱️  Median of {repeat} runs (ms):")
+        print(f"   {'Query':<45} {'before':>10} {'after':>10} {'speedup':>8}")
+        for query in flagged:
+            note = "  (still flagged)" if query.label in still_flagged else ""
+            print(f"   {query.label:<45} {before[query.label]:>10.2f} {after[query.label]:>10.2f} "
+                  f"{speedup[query.label]:>7.1f}x{note}")
+
+        # Reading every row stays a full read: an index that only replaces the sort is not worth its upkeep
+        worth = []
+        for name, table, columns in recommended:
+            served = [q.label for q in flagged
+                      if q.table == table and columns[:len(q.where + q.order)] == tuple(dict.fromkeys(q.where + q.order))]
+            if max((speedup[label] for label in served), default=0) >= MIN_SPEEDUP:
+                worth.append((name, table, columns))
+            else:
+                print(f"   ↳ {name} skipped: less than {MIN_SPEEDUP}x faster")
+        ddl = index_ddl(worth)
+        print("\n📝 Recommended indexes:")
+        for sql in ddl or ["(none)"]:
+            print(f"   {sql}")
+        return ddl
+
 if __name__ == "__main__":
-    generate_all_diagrams()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--advise", action="store_true", help="Run the index advisor instead of generating diagrams")
+    parser.add_argument("--db", default="robot_arm_system.db")
+    parser.add_argument("--rows", type=int, default=20000, help="Synthetic rows per table")
+    parser.add_argument("--fanout", type=int, default=8, help="Child rows per parent (pattern steps per pattern)")
+    parser.add_argument("--repeat", type=int, default=20, help="Benchmark runs per query")
+    args = parser.parse_args()
+    if args.advise:
+        run_index_advisor(args.db, args.rows, args.fanout, args.repeat)
+    else:
+        generate_all_diagrams()
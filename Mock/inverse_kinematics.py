@@ -0,0 +1,167 @@
+"""
+Inverse kinematics for Cartesian (tool-tip) targets.
+
+move_cartesian steps are resolved to joint angles once, when a pattern or
+sequence is compiled, so executing them costs the same as move_joints. The
+solver is damped least squares on a numerical Jacobian (one batched FK call
+per iteration), seeded from the previous joint target so consecutive steps
+stay on the same arm configuration. Solutions are memoized on the quantized
+target and seed, so re-analysing or re-running a pattern does not solve again.
+Requires numpy (optional dependency of the backend).
+"""
+
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from kinematics import frames
+from motion import JOINT_LIMITS, JOINT_NAMES, POSE_NAMES, Joints
+
+POSITION_TOLERANCE = 0.1      # mm
+ORIENTATION_TOLERANCE = 0.1   # degrees
+ORIENTATION_WEIGHT = 100.0    # mm of position error worth one radian of orientation error
+MAX_ITERATIONS = 500           # Convergence is slow near the wrist singularity (J5 ~ 0)
+MAX_STEP = 10.0               # degrees per iteration per joint
+DAMPING = 0.5
+JACOBIAN_STEP = 1e-3          # degrees
+TARGET_RESOLUTION = 0.1       # mm / degrees, cache key quantization of the target
+SEED_RESOLUTION = 1.0         # degrees, cache key quantization of the seed
+# Extra starting points tried in order when the seed does not converge
+FALLBACK_SEEDS = ((0, 0, 0, 0, 0, 0), (0, 45, 45, 0, 45, 0), (0, -45, -45, 0, -45, 0),
+                  (0, 45, -45, 0, 0, 0), (0, -45, 45, 0, 0, 0), (90, 0, 0, 90, 0, 0), (-90, 0, 0, -90, 0, 0),
+                  (0, 30, 30, 90, 30, 0), (0, -30, -30, -90, -30, 0), (0, 30, 30, -90, 30, 0),
+                  (0, -30, -30, 90, -30, 0))
+
+_LO, _HI = np.asarray(JOINT_LIMITS).T
+
+
+class IKError(ValueError):
+    """Target is out of reach (or only reachable outside the joint limits)"""
+
+
+def rotation_from_rpy(roll: float, pitch: float, yaw: float) -> np.ndarray:
+    """Z-Y-X rotation matrix, the inverse of kinematics.tool_pose's roll/pitch/yaw"""
+    r, p, y = np.radians([roll, pitch, yaw])
+    cr, sr, cp, sp, cy, sy = np.cos(r), np.sin(r), np.cos(p), np.sin(p), np.cos(y), np.sin(y)
+    return np.array([
+        [cy * cp, cy * sp * sr - sy * cr, cy * sp * cr + sy * sr],
+        [sy * cp, sy * sp * sr + cy * cr, sy * sp * cr - cy * sr],
+        [-sp, cp * sr, cp * cr],
+    ])
+
+
+def _rotation_vectors(rel: np.ndarray) -> np.ndarray:
+    """Axis * angle (radians) of a batch of rotation matrices, (N, 3, 3) -> (N, 3)"""
+    skew = 0.5 * np.stack([rel[:, 2, 1] - rel[:, 1, 2], rel[:, 0, 2] - rel[:, 2, 0],
+                           rel[:, 1, 0] - rel[:, 0, 1]], axis=1)
+    angle = np.arccos(np.clip((np.trace(rel, axis1=1, axis2=2) - 1.0) / 2.0, -1.0, 1.0))
+    sin = np.linalg.norm(skew, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        vec = np.where((sin > 1e-9)[:, None], skew * (angle / sin)[:, None], skew)
+    # Half-turns have no skew part: take the axis from the largest column of (R + I)
+    flipped = (angle > np.pi - 1e-3) & (sin <= 1e-3)
+    for i in np.flatnonzero(flipped):
+        cols = rel[i] + np.eye(3)
+        axis = cols[:, np.argmax(np.linalg.norm(cols, axis=0))]
+        vec[i] = axis / np.linalg.norm(axis) * angle[i]
+    return vec
+
+
+def _error(tips: np.ndarray, position: np.ndarray, rotation: Optional[np.ndarray]) -> np.ndarray:
+    """Task-space error for a batch of tool frames: (N, 3), or (N, 6) with the weighted rotation error"""
+    pos_err = position - tips[:, :3, 3] * 1000.0
+    if rotation is None:
+        return pos_err
+    rot_err = _rotation_vectors(rotation @ np.transpose(tips[:, :3, :3], (0, 2, 1)))
+    return np.concatenate([pos_err, rot_err * ORIENTATION_WEIGHT], axis=1)
+
+
+def _converge(seed: np.ndarray, position: np.ndarray, rotation: Optional[np.ndarray]) -> Optional[np.ndarray]:
+    q = np.clip(seed.astype(float), _LO, _HI)
+    probes = np.eye(6) * JACOBIAN_STEP
+    for _ in range(MAX_ITERATIONS):
+        # Current pose and the six perturbed poses in one FK call
+        tips = frames(np.vstack([q, q + probes]))[:, -1]
+        errors = _error(tips, position, rotation)
+        err = errors[0]
+        pos_ok = np.linalg.norm(err[:3]) <= POSITION_TOLERANCE
+        rot_ok = rotation is None or np.degrees(np.linalg.norm(err[3:]) / ORIENTATION_WEIGHT) <= ORIENTATION_TOLERANCE
+        if pos_ok and rot_ok:
+            return q
+        jac = (err[None, :] - errors[1:]).T / JACOBIAN_STEP      # d(pose)/d(joint), (rows, 6)
+        dq = jac.T @ np.linalg.solve(jac @ jac.T + DAMPING ** 2 * np.eye(len(err)), err)
+        dq = np.clip(dq, -MAX_STEP, MAX_STEP)
+        q_next = np.clip(q + dq, _LO, _HI)
+        if np.max(np.abs(q_next - q)) < 1e-7:
+            return None  # Stuck against a limit or singular
+        q = q_next
+    return None
+
+
+def solve(target: Sequence[Optional[float]], seed: Sequence[float]) -> Joints:
+    """
+    Joint angles that put the tool tip at `target` (x, y, z mm, roll, pitch,
+    yaw degrees; orientation is free unless all three angles are given).
+    Tries `seed` first, then FALLBACK_SEEDS. Raises IKError.
+    """
+    position = np.asarray(target[:3], dtype=float)
+    rpy = list(target[3:6]) if len(target) >= 6 else []
+    rotation = rotation_from_rpy(*rpy) if len(rpy) == 3 and all(v is not None for v in rpy) else None
+    for start in (seed, *FALLBACK_SEEDS):
+        q = _converge(np.asarray(start, dtype=float), position, rotation)
+        if q is not None:
+            return tuple(round(float(v), 4) for v in q)
+    raise IKError("Cartesian target out of reach")
+
+
+@lru_cache(maxsize=4096)
+def _solve_quantized(target: Tuple[Optional[int], ...], seed: Tuple[int, ...]) -> Optional[Joints]:
+    try:
+        return solve([None if v is None else v * TARGET_RESOLUTION for v in target],
+                     [v * SEED_RESOLUTION for v in seed])
+    except IKError:
+        return None  # Cached too: an unreachable target is the slowest one to solve
+
+
+def solve_cached(target: Sequence[Optional[float]], seed: Sequence[float]) -> Joints:
+    """solve() memoized on the target (0.1 mm / 0.1 degree) and seed (1 degree)"""
+    key = tuple(None if v is None else int(round(float(v) / TARGET_RESOLUTION)) for v in target)
+    joints = _solve_quantized(key, tuple(int(round(float(v) / SEED_RESOLUTION)) for v in seed))
+    if joints is None:
+        raise IKError("Cartesian target out of reach")
+    return joints
+
+
+def cartesian_target(step: Dict) -> Tuple[Optional[float], ...]:
+    """(x, y, z, roll, pitch, yaw) of a move_cartesian step dict"""
+    return tuple(None if step.get(name) is None else float(step[name]) for name in POSE_NAMES)
+
+
+def resolve_cartesian(steps: Sequence[Dict], start: Sequence[float]) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Batch-solve the move_cartesian steps of an ordered step list. Each target is
+    seeded from the joint target before it (`start` for the first move).
+    Returns (steps with j1..j6 filled in, issues); unreachable steps keep the
+    previous joint target and are reported as errors.
+    """
+    resolved: List[Dict] = []
+    issues: List[Dict] = []
+    seed = tuple(float(v) for v in start)
+    for i, step in enumerate(steps):
+        action = step.get("action_type")
+        if action == "move_cartesian":
+            target = cartesian_target(step)
+            if any(v is None for v in target[:3]):
+                issues.append({"severity": "error", "step": i, "message": "move_cartesian needs x, y and z"})
+            else:
+                try:
+                    seed = solve_cached(target, seed)
+                except IKError as e:
+                    pose = ", ".join(f"{v:g}" for v in target[:3])
+                    issues.append({"severity": "error", "step": i, "message": f"{e}: ({pose}) mm"})
+            step = {**step, **dict(zip(JOINT_NAMES, seed))}
+        elif action == "move_joints":
+            seed = tuple(float(step.get(name) or 0.0) for name in JOINT_NAMES)
+        resolved.append(step)
+    return resolved, issues
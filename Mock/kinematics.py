@@ -0,0 +1,117 @@
+"""
+Forward kinematics of the arm (Denavit-Hartenberg, standard convention).
+
+Vectorized over poses: pass an (N, 6) array of joint angles in degrees and
+get every frame for all N poses from a handful of batched matrix products,
+so a whole trajectory is converted in one call. The DH table can be replaced
+with a JSON file named by ROBOT_DH_PARAMS (a list of six
+[a_m, alpha_deg, d_m, theta_offset_deg] rows) to match the real arm.
+Requires numpy (optional dependency of the backend).
+"""
+
+import json
+import os
+from functools import lru_cache
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+from motion import POSE_NAMES
+
+# (a [m], alpha [deg], d [m], theta offset [deg]) per joint. With all joints
+# at 0 the arm stands straight up; the wrist is spherical (joints 4-6 share
+# one point), so the last row is the tool length to the gripper tip.
+DH_PARAMS: Tuple[Tuple[float, float, float, float], ...] = (
+    (0.000, 90.0, 0.100, 0.0),    # J1 base yaw, shoulder 10 cm above the mount
+    (0.120, 0.0, 0.000, 90.0),    # J2 shoulder, 12 cm upper arm
+    (0.000, 90.0, 0.000, 90.0),   # J3 elbow
+    (0.000, -90.0, 0.120, 0.0),   # J4 forearm roll, 12 cm forearm
+    (0.000, 90.0, 0.000, 0.0),    # J5 wrist pitch
+    (0.000, 0.0, 0.080, 0.0),     # J6 tool roll, 8 cm to the gripper tip
+)
+
+POSE_CACHE_RESOLUTION = 0.01   # degrees; joints are rounded to this for the single-pose cache
+
+
+def load_dh_params(path: Optional[str] = None) -> Tuple[Tuple[float, float, float, float], ...]:
+    """DH table from a JSON file, or the built-in one when no path is given"""
+    if not path:
+        return DH_PARAMS
+    with open(path) as f:
+        rows = json.load(f)
+    if len(rows) != len(DH_PARAMS) or any(len(row) != 4 for row in rows):
+        raise ValueError(f"{path}: expected {len(DH_PARAMS)} rows of [a, alpha, d, theta_offset]")
+    return tuple(tuple(float(v) for v in row) for row in rows)
+
+
+DH = load_dh_params(os.environ.get("ROBOT_DH_PARAMS"))
+# Only a DH table measured on the real arm makes geometric checks (collision, floor) trustworthy
+GEOMETRY_CALIBRATED = bool(os.environ.get("ROBOT_DH_PARAMS"))
+
+
+def _as_poses(joints) -> np.ndarray:
+    q = np.asarray(joints, dtype=float)
+    return q.reshape(-1, len(DH_PARAMS))
+
+
+def frames(joints, dh: Optional[Sequence[Sequence[float]]] = None) -> np.ndarray:
+    """
+    Homogeneous transforms of every frame: shape (N, len(dh) + 1, 4, 4).
+    Frame 0 is the base; frame i follows joint i.
+    """
+    dh = DH if dh is None else dh
+    q = _as_poses(joints)
+    n = q.shape[0]
+    a, alpha, d, offset = (np.asarray(col, dtype=float) for col in zip(*dh))
+    theta = np.radians(q + offset)                      # (N, J)
+    ct, st = np.cos(theta), np.sin(theta)
+    ca, sa = np.cos(np.radians(alpha)), np.sin(np.radians(alpha))
+
+    # Per-joint DH matrices for all poses at once: (N, J, 4, 4)
+    link = np.zeros((n, len(dh), 4, 4))
+    link[..., 0, 0] = ct
+    link[..., 0, 1] = -st * ca
+    link[..., 0, 2] = st * sa
+    link[..., 0, 3] = a * ct
+    link[..., 1, 0] = st
+    link[..., 1, 1] = ct * ca
+    link[..., 1, 2] = -ct * sa
+    link[..., 1, 3] = a * st
+    link[..., 2, 1] = sa
+    link[..., 2, 2] = ca
+    link[..., 2, 3] = d
+    link[..., 3, 3] = 1.0
+
+    out = np.empty((n, len(dh) + 1, 4, 4))
+    out[:, 0] = np.eye(4)
+    for j in range(len(dh)):
+        out[:, j + 1] = out[:, j] @ link[:, j]
+    return out
+
+
+def frame_origins(joints, dh: Optional[Sequence[Sequence[float]]] = None) -> np.ndarray:
+    """Origin of every frame in base coordinates: shape (N, len(dh) + 1, 3), metres"""
+    return frames(joints, dh)[..., :3, 3]
+
+
+def tool_pose(joints, dh: Optional[Sequence[Sequence[float]]] = None) -> np.ndarray:
+    """Tool-tip pose for every row of joints: shape (N, 6), columns as POSE_NAMES"""
+    tip = frames(joints, dh)[:, -1]
+    rot = tip[:, :3, :3]
+    out = np.empty((tip.shape[0], 6))
+    out[:, :3] = tip[:, :3, 3] * 1000.0
+    out[:, 3] = np.degrees(np.arctan2(rot[:, 2, 1], rot[:, 2, 2]))
+    out[:, 4] = np.degrees(np.arctan2(-rot[:, 2, 0], np.hypot(rot[:, 2, 1], rot[:, 2, 2])))
+    out[:, 5] = np.degrees(np.arctan2(rot[:, 1, 0], rot[:, 0, 0]))
+    return out
+
+
+@lru_cache(maxsize=256)
+def _cached_pose(key: Tuple[int, ...]) -> Tuple[float, ...]:
+    pose = tool_pose([k * POSE_CACHE_RESOLUTION for k in key])[0]
+    return tuple(round(float(v), 2) + 0.0 for v in pose)  # + 0.0 turns -0.0 into 0.0
+
+
+def tool_pose_of(joints: Sequence[float]) -> Tuple[float, ...]:
+    """Pose of one joint configuration, cached (the arm is often still or revisits poses)"""
+    return _cached_pose(tuple(int(round(j / POSE_CACHE_RESOLUTION)) for j in joints))
@@ -0,0 +1,163 @@
+"""
+Streaming query engine over run-log CSV files.
+
+Files are scanned line by line through a memory map (or a gzip stream for
+archived logs), so memory stays bounded by the result limit no matter how
+large the logs are. Only the columns a filter needs are decoded.
+"""
+
+import gzip
+import mmap
+import os
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+
+class LogFilter:
+    """Row filter. Every criterion is optional; None means "don't care"."""
+
+    def __init__(self, cycle_min: Optional[int] = None, cycle_max: Optional[int] = None,
+                 phases: Optional[Iterable[str]] = None,
+                 force_min: Optional[float] = None, force_max: Optional[float] = None,
+                 time_from: Optional[str] = None, time_to: Optional[str] = None):
+        self.cycle_min = cycle_min
+        self.cycle_max = cycle_max
+        self.phases = {p.strip().lower().encode() for p in phases} if phases else None
+        self.force_min = force_min
+        self.force_max = force_max
+        # Timestamps are fixed-width "HH:MM:SS.fff", so byte comparison is chronological
+        self.time_from = time_from.encode() if time_from else None
+        self.time_to = time_to.encode() if time_to else None
+
+    def compile(self, columns: Dict[str, int]) -> Callable[[List[bytes]], bool]:
+        """Build a predicate over split CSV fields for a file with the given header"""
+        checks = []
+        # Column indexes and limits are bound as default arguments so each check keeps its own
+        if self.cycle_min is not None or self.cycle_max is not None:
+            lo = self.cycle_min if self.cycle_min is not None else float("-inf")
+            hi = self.cycle_max if self.cycle_max is not None else float("inf")
+            checks.append(lambda f, i=columns["Cycle"], lo=lo, hi=hi: lo <= int(f[i]) <= hi)
+        if self.phases is not None:
+            checks.append(lambda f, i=columns["Phase"], phases=self.phases: f[i].strip().lower() in phases)
+        if self.force_min is not None or self.force_max is not None:
+            lo = self.force_min if self.force_min is not None else float("-inf")
+            hi = self.force_max if self.force_max is not None else float("inf")
+            checks.append(lambda f, i=columns["Force_N"], lo=lo, hi=hi: lo <= float(f[i]) <= hi)
+        if self.time_from is not None or self.time_to is not None:
+            def in_window(f, i=columns["Timestamp"], t0=self.time_from, t1=self.time_to):
+                ts = f[i]
+                return (t0 is None or ts[:len(t0)] >= t0) and (t1 is None or ts[:len(t1)] <= t1)
+            checks.append(in_window)
+
+        def match(fields: List[bytes]) -> bool:
+            for check in checks:
+                if not check(fields):
+                    return False
+            return True
+        return match
+
+
+def iter_lines(path: str) -> Iterator[bytes]:
+    """Yield raw lines (without line endings) from a plain or gzipped log"""
+    if path.endswith(".gz"):
+        with gzip.open(path, "rb") as f:
+            for line in f:
+                yield line.rstrip(b"\r\n")
+        return
+    if os.path.getsize(path) == 0:
+        return
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for line in iter(mm.readline, b""):
+            yield line.rstrip(b"\r\n")
+
+
+def timestamp_seconds(ts: bytes) -> float:
+    """Log timestamp 'HH:MM:SS.fff' -> seconds since midnight"""
+    h, m, s = ts.split(b":")
+    return int(h) * 3600 + int(m) * 60 + float(s)
+
+
+def scan_log(path: str, log_filter: LogFilter) -> Iterator[Dict[str, str]]:
+    """Yield matching rows of one log as {column: value} dicts"""
+    lines = iter_lines(path)
+    header = next(lines, None)
+    if not header:
+        return
+    names = [h.decode() for h in header.split(b",")]
+    try:
+        match = log_filter.compile({name: i for i, name in enumerate(names)})
+    except KeyError:
+        return  # Log written before the filtered column existed
+
+    width = len(names)
+    for line in lines:
+        fields = line.split(b",")
+        if len(fields) != width:
+            continue  # Partial line from a run that is still writing
+        try:
+            if not match(fields):
+                continue
+        except ValueError:
+            continue
+        yield {name: value.decode() for name, value in zip(names, fields)}
+
+
+class LogAggregate:
+    """Running aggregate of matching rows (memory grows only with distinct phases and cycles)"""
+
+    def __init__(self):
+        self.rows = 0
+        self.force_sum = 0.0
+        self.force_min: Optional[float] = None
+        self.force_max: Optional[float] = None
+        self.phases: Dict[str, int] = {}
+        self.cycles = set()
+
+    def add(self, row: Dict[str, str]):
+        force = float(row["Force_N"])
+        self.rows += 1
+        self.force_sum += force
+        self.force_min = force if self.force_min is None else min(self.force_min, force)
+        self.force_max = force if self.force_max is None else max(self.force_max, force)
+        self.phases[row["Phase"]] = self.phases.get(row["Phase"], 0) + 1
+        self.cycles.add(int(row["Cycle"]))
+
+    def to_dict(self) -> Dict:
+        return {
+            "rows": self.rows,
+            "cycles": len(self.cycles),
+            "force_min": self.force_min,
+            "force_max": self.force_max,
+            "force_mean": round(self.force_sum / self.rows, 3) if self.rows else None,
+            "phases": self.phases,
+        }
+
+
+def query_logs(files: Dict[str, str], log_filter: LogFilter, mode: str = "rows", limit: int = 1000) -> Dict:
+    """
+    Run a query over several logs. `files` maps the public filename to its path.
+    mode="rows" returns up to `limit` rows; mode="aggregate" returns totals
+    and per-file aggregates.
+    """
+    if mode == "aggregate":
+        total = LogAggregate()
+        per_file = {}
+        for filename, path in files.items():
+            agg = LogAggregate()
+            for row in scan_log(path, log_filter):
+                agg.add(row)
+                total.add(row)
+            per_file[filename] = agg.to_dict()
+        return {"mode": mode, "files": len(files), "total": total.to_dict(), "per_file": per_file}
+
+    rows = []
+    truncated = False
+    for filename, path in files.items():
+        for row in scan_log(path, log_filter):
+            if len(rows) >= limit:
+                truncated = True
+                break
+            row["file"] = filename
+            rows.append(row)
+        if truncated:
+            break
+    return {"mode": "rows", "files": len(files), "count": len(rows), "truncated": truncated, "rows": rows}
@@ -0,0 +1,181 @@
+"""
+Replay of recorded run logs through the live telemetry path.
+
+Rows are streamed from disk (memory map for plain logs, gzip stream for
+archived ones) and paced by their timestamps at a chosen speed, so a
+multi-hour log replays in constant memory. Seeking to a cycle uses a binary
+search over the memory-mapped file (cycles are written in increasing order);
+archived logs are re-streamed from the start and skipped forward instead.
+"""
+
+import mmap
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from log_query import iter_lines, timestamp_seconds
+
+SLEEP_SLICE = 0.1   # Longest uninterrupted sleep, so stop/seek/speed changes apply promptly
+
+
+def _line_start_at_or_after(mm: mmap.mmap, pos: int, data_start: int) -> int:
+    if pos <= data_start or mm[pos - 1:pos] == b"\n":
+        return max(pos, data_start)
+    nl = mm.find(b"\n", pos)
+    return len(mm) if nl < 0 else nl + 1
+
+
+def find_cycle_offset(mm: mmap.mmap, data_start: int, cycle: int, cycle_col: int, width: int) -> int:
+    """Byte offset of the first row whose cycle is >= `cycle` (binary search, O(log n) lines read)"""
+    size = len(mm)
+
+    def cycle_at(start: int) -> Optional[int]:
+        # Cycle of the first parsable row at or after `start` (None at end of file)
+        while start < size:
+            end = mm.find(b"\n", start)
+            end = size if end < 0 else end
+            fields = mm[start:end].rstrip(b"\r").split(b",")
+            if len(fields) == width:
+                try:
+                    return int(fields[cycle_col])
+                except ValueError:
+                    pass
+            start = end + 1
+        return None
+
+    lo, hi = data_start, size
+    while lo < hi:
+        mid = (lo + hi) // 2
+        found = cycle_at(_line_start_at_or_after(mm, mid, data_start))
+        if found is None or found >= cycle:
+            hi = mid
+        else:
+            lo = mid + 1
+    return _line_start_at_or_after(mm, lo, data_start)
+
+
+class LogReplay:
+    """
+    One replay session. `speed` is a time multiplier (1 = real time); 0 means
+    as fast as possible. run() blocks until the log ends or `should_continue`
+    returns False; seek() and set_speed() may be called from other threads.
+    """
+
+    def __init__(self, path: str, filename: str, speed: float = 1.0,
+                 from_cycle: Optional[int] = None, to_cycle: Optional[int] = None):
+        self.path = path
+        self.filename = filename
+        self.speed = speed
+        self.to_cycle = to_cycle
+        self.columns: Dict[str, int] = {}
+        self.rows = 0
+        self.cycle: Optional[int] = None
+        self.phase: Optional[str] = None
+        self.log_time: Optional[str] = None
+        self.status = "ready"
+        self._seek: Optional[int] = from_cycle
+        self._lock = threading.Lock()
+        self._anchor: Optional[Tuple[float, float]] = None   # (wall clock, log time) for pacing
+
+    # --- Control (any thread) ---
+    def seek(self, cycle: int):
+        with self._lock:
+            self._seek = cycle
+
+    def set_speed(self, speed: float):
+        with self._lock:
+            self.speed = speed
+            self._anchor = None  # Re-anchor pacing at the current row
+
+    def progress(self) -> Dict:
+        return {"filename": self.filename, "status": self.status, "speed": self.speed,
+                "cycle": self.cycle, "phase": self.phase, "log_time": self.log_time,
+                "rows_replayed": self.rows, "to_cycle": self.to_cycle}
+
+    # --- Streaming ---
+    def _stream(self, cycle: Optional[int]) -> Iterator[List[bytes]]:
+        """Split rows starting at the first row of `cycle` (or the beginning)"""
+        if self.path.endswith(".gz") or os.path.getsize(self.path) == 0:
+            lines = iter_lines(self.path)
+            header = next(lines, None)
+            if not header:
+                return
+            self._set_header(header)
+            for line in lines:
+                fields = line.split(b",")
+                if cycle is not None:
+                    try:
+                        if int(fields[self.columns["Cycle"]]) < cycle:
+                            continue
+                    except (ValueError, IndexError):
+                        continue
+                    cycle = None
+                yield fields
+            return
+
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            header = mm.readline().rstrip(b"\r\n")
+            if not header:
+                return
+            self._set_header(header)
+            if cycle is not None:
+                mm.seek(find_cycle_offset(mm, mm.tell(), cycle, self.columns["Cycle"], len(self.columns)))
+            for line in iter(mm.readline, b""):
+                yield line.rstrip(b"\r\n").split(b",")
+
+    def _set_header(self, header: bytes):
+        self.columns = {name.decode(): i for i, name in enumerate(header.split(b","))}
+
+    def _wait_until(self, log_t: float, should_continue: Callable[[], bool]) -> bool:
+        """Pace to the row's log time. Returns False if interrupted (stop or seek)."""
+        while True:
+            with self._lock:
+                if self._seek is not None:
+                    return False
+                speed = self.speed
+                if self._anchor is None:
+                    self._anchor = (time.monotonic(), log_t)
+                wall0, t0 = self._anchor
+            if not should_continue():
+                return False
+            if speed <= 0:
+                return True
+            delta = log_t - t0
+            if delta < -43200:
+                delta += 86400  # Run crossed midnight (timestamps are time of day only)
+            remaining = wall0 + delta / speed - time.monotonic()
+            if remaining <= 0:
+                return True
+            time.sleep(min(remaining, SLEEP_SLICE))
+
+    def run(self, apply: Callable[[Dict[str, str]], None], should_continue: Callable[[], bool]) -> str:
+        self.status = "playing"
+        while True:
+            with self._lock:
+                start_cycle, self._seek = self._seek, None
+                self._anchor = None
+            interrupted = False
+            for fields in self._stream(start_cycle):
+                if len(fields) != len(self.columns):
+                    continue  # Partial line (log still being written)
+                try:
+                    log_t = timestamp_seconds(fields[self.columns["Timestamp"]])
+                    cycle = int(fields[self.columns["Cycle"]])
+                except (ValueError, KeyError):
+                    continue
+                if self.to_cycle is not None and cycle > self.to_cycle:
+                    break
+                if not self._wait_until(log_t, should_continue):
+                    interrupted = True
+                    break
+                row = {name: fields[i].decode() for name, i in self.columns.items()}
+                apply(row)
+                self.rows += 1
+                self.cycle = cycle
+                self.phase = row.get("Phase")
+                self.log_time = row.get("Timestamp")
+            if interrupted and should_continue():
+                continue  # Seek requested: restart the stream at the new cycle
+            self.status = "stopped" if interrupted else "finished"
+            return self.status
@@ -0,0 +1,164 @@
+"""
+Material classification from the measured grip force curve.
+
+Features are extracted from the grip-ramp samples (closure angle, force) and
+scored by a small Gaussian naive-Bayes model. Everything is plain Python
+arithmetic over a few dozen samples, so a prediction takes microseconds and
+fits inside a control tick. The model is loaded once and can be retrained
+from labeled feature vectors and saved as JSON.
+"""
+
+import json
+import math
+import os
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "material_model.json")
+
+FEATURES = ("plateau", "stiffness", "exponent")
+CONTACT_FORCE = 0.2    # N; below this the jaws are not touching the part
+OPEN_ANGLE = 180.0     # Gripper angle with the jaws fully open
+
+# Default parameters: mean / std per feature and class (matches the simulated
+# force model: harder materials reach higher force with a steeper, more
+# non-linear curve)
+DEFAULT_MODEL = {
+    "classes": {
+        "Metal":       {"prior": 1 / 3, "mean": {"plateau": 9.0, "stiffness": 0.050, "exponent": 2.5},
+                        "std": {"plateau": 1.0, "stiffness": 0.020, "exponent": 0.8}},
+        "Wood":        {"prior": 1 / 3, "mean": {"plateau": 6.0, "stiffness": 0.033, "exponent": 1.8},
+                        "std": {"plateau": 1.2, "stiffness": 0.015, "exponent": 0.8}},
+        "Sponge/Soft": {"prior": 1 / 3, "mean": {"plateau": 2.0, "stiffness": 0.011, "exponent": 1.2},
+                        "std": {"plateau": 1.2, "stiffness": 0.010, "exponent": 0.8}},
+    }
+}
+
+
+def _slope(xs: Sequence[float], ys: Sequence[float]) -> Optional[float]:
+    """Least-squares slope, None if x has no spread"""
+    n = len(xs)
+    if n < 2:
+        return None
+    mx = sum(xs) / n
+    my = sum(ys) / n
+    sxx = sum((x - mx) ** 2 for x in xs)
+    if sxx <= 1e-12:
+        return None
+    return sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / sxx
+
+
+def extract_features(samples: Sequence[Tuple[Optional[float], float]]) -> Dict[str, float]:
+    """
+    samples: [(gripper_angle or None, force_N), ...] in time order.
+
+    plateau   - mean force once the curve has settled (within 5% of its peak, N)
+    stiffness - dF/d(closure) over the contact region (N/deg)
+    exponent  - log-log slope of force vs closure ratio (curve non-linearity)
+
+    Features that cannot be estimated (e.g. no angle logged, single sample)
+    are left out and ignored by the model.
+    """
+    if not samples:
+        return {}
+    peak = max(f for _, f in samples)
+    settled = [f for _, f in samples if f >= 0.95 * peak]
+    features = {"plateau": sum(settled) / len(settled)}
+
+    contact = [(OPEN_ANGLE - a, f) for a, f in samples if a is not None and f >= CONTACT_FORCE and a < OPEN_ANGLE]
+    if len(contact) == 1:
+        closure, force = contact[0]
+        features["stiffness"] = force / closure
+    elif contact:
+        slope = _slope([c for c, _ in contact], [f for _, f in contact])
+        if slope is not None:
+            features["stiffness"] = slope
+        exponent = _slope([math.log(c / OPEN_ANGLE) for c, _ in contact], [math.log(f) for _, f in contact])
+        if exponent is not None:
+            features["exponent"] = exponent
+    return features
+
+
+class MaterialClassifier:
+    def __init__(self, params: Dict):
+        self.params = params
+        self.classes = params["classes"]
+
+    @classmethod
+    def load(cls, path: str = MODEL_PATH) -> "MaterialClassifier":
+        """Model from JSON if present, otherwise the built-in defaults"""
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                return cls(json.load(f))
+        return cls(DEFAULT_MODEL)
+
+    def save(self, path: str = MODEL_PATH):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.params, f, indent=2)
+
+    @classmethod
+    def fit(cls, rows: Iterable[Tuple[Dict[str, float], str]]) -> "MaterialClassifier":
+        """Train from (features, label) pairs, e.g. labeled historical grips"""
+        grouped: Dict[str, List[Dict[str, float]]] = {}
+        for features, label in rows:
+            grouped.setdefault(label, []).append(features)
+        total = sum(len(v) for v in grouped.values())
+        classes = {}
+        for label, items in grouped.items():
+            mean, std = {}, {}
+            for name in FEATURES:
+                values = [f[name] for f in items if name in f]
+                fallback = DEFAULT_MODEL["classes"].get(label, {})
+                if not values:
+                    mean[name] = fallback.get("mean", {}).get(name, 0.0)
+                    std[name] = fallback.get("std", {}).get(name, 1.0)
+                    continue
+                m = sum(values) / len(values)
+                var = sum((v - m) ** 2 for v in values) / max(1, len(values) - 1)
+                mean[name] = m
+                std[name] = max(math.sqrt(var), 1e-3)
+            classes[label] = {"prior": len(items) / total, "mean": mean, "std": std}
+        return cls({"classes": classes})
+
+    def predict(self, features: Dict[str, float]) -> Tuple[str, float]:
+        """Return (material, confidence %) for a feature dict"""
+        if not features or features.get("plateau", 0.0) < CONTACT_FORCE:
+            return "Unknown", 0.0
+        scores = {}
+        for label, c in self.classes.items():
+            score = math.log(c["prior"])
+            for name, value in features.items():
+                if name in c["mean"]:
+                    z = (value - c["mean"][name]) / c["std"][name]
+                    score -= 0.5 * z * z + math.log(c["std"][name])
+            scores[label] = score
+        best = max(scores, key=scores.get)
+        # Softmax over log-likelihoods -> posterior of the winning class
+        norm = sum(math.exp(s - scores[best]) for s in scores.values())
+        return best, round(100.0 / norm, 1)
+
+    def classify_curve(self, samples: Sequence[Tuple[Optional[float], float]]) -> Tuple[str, float]:
+        return self.predict(extract_features(samples))
+
+    def classify_log_rows(self, rows: Iterable[Dict[str, str]]) -> List[Dict]:
+        """
+        Batch inference over a run log: one prediction per cycle from its
+        grip-phase rows (uses the Gripper column when the log has it).
+        """
+        per_cycle: Dict[int, List[Tuple[Optional[float], float]]] = {}
+        for row in rows:
+            if not row.get("Phase", "").lower().startswith("gripping"):
+                continue
+            try:
+                cycle = int(row["Cycle"])
+                force = float(row["Force_N"])
+                angle = float(row["Gripper"]) if row.get("Gripper") not in (None, "") else None
+            except (KeyError, ValueError):
+                continue
+            per_cycle.setdefault(cycle, []).append((angle, force))
+
+        results = []
+        for cycle in sorted(per_cycle):
+            material, confidence = self.classify_curve(per_cycle[cycle])
+            results.append({"cycle": cycle, "material": material, "confidence": confidence,
+                            "samples": len(per_cycle[cycle])})
+        return results
@@ -0,0 +1,295 @@
+"""
+Motion planning helpers for the robot arm simulation.
+
+Pure functions only (no access to the live robot state) so the same planner
+can drive the auto-run engine, sequence playback and offline analysis.
+"""
+
+import math
+from collections import deque
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+JOINT_NAMES = ("j1", "j2", "j3", "j4", "j5", "j6")
+# Tool pose as reported in telemetry and logs: position (mm) and roll/pitch/yaw (degrees, Z-Y-X)
+POSE_NAMES = ("x", "y", "z", "roll", "pitch", "yaw")
+
+# Joint ranges (degrees) matching the control panel sliders
+JOINT_LIMITS = ((-180.0, 180.0), (-90.0, 90.0), (-90.0, 90.0),
+                (-180.0, 180.0), (-90.0, 90.0), (-180.0, 180.0))
+
+# Control tick used by every executor (seconds)
+TICK_INTERVAL = 0.04
+
+# Per-joint limits for j1..j6 (deg/s and deg/s^2); the base joints carry the
+# whole arm and are slower than the wrist.
+JOINT_MAX_VELOCITY = (90.0, 90.0, 120.0, 180.0, 180.0, 180.0)
+JOINT_MAX_ACCEL = (180.0, 180.0, 240.0, 360.0, 360.0, 360.0)
+# Jerk limits (deg/s^3) for live target tracking (manual control)
+JOINT_MAX_JERK = (720.0, 720.0, 960.0, 1440.0, 1440.0, 1440.0)
+
+# Joint-space tolerance (degrees) within which the next move may start.
+# 0 disables blending: every waypoint is reached exactly before moving on.
+DEFAULT_BLEND_RADIUS = 5.0
+
+Joints = Tuple[float, float, float, float, float, float]
+
+
+def joints_from(values: Dict, fallback: Sequence[float]) -> Joints:
+    """Read j1..j6 from a dict, keeping the fallback value for missing keys"""
+    return tuple(
+        float(values[name]) if values.get(name) is not None else float(fallback[i])
+        for i, name in enumerate(JOINT_NAMES)
+    )
+
+
+def split_move_runs(items: Iterable, is_move: Callable) -> List[Tuple[bool, List]]:
+    """
+    Group consecutive items for which is_move() is true.
+    Returns [(True, [move, move, ...]), (False, [other]), ...] in original order.
+    """
+    groups: List[Tuple[bool, List]] = []
+    for item in items:
+        if is_move(item):
+            if groups and groups[-1][0]:
+                groups[-1][1].append(item)
+            else:
+                groups.append((True, [item]))
+        else:
+            groups.append((False, [item]))
+    return groups
+
+
+def joint_move_time(distance: float, max_velocity: float, max_accel: float) -> float:
+    """Minimum time for one joint to travel `distance` degrees from rest to rest"""
+    distance = abs(distance)
+    if distance == 0:
+        return 0.0
+    if distance >= max_velocity * max_velocity / max_accel:
+        # Trapezoid: accelerate, cruise at max velocity, decelerate
+        return distance / max_velocity + max_velocity / max_accel
+    # Triangle: max velocity is never reached
+    return 2.0 * math.sqrt(distance / max_accel)
+
+
+def move_profile(delta: Sequence[float], duration_override: Optional[float] = None) -> Tuple[float, float]:
+    """
+    Synchronized time scaling for a joint move.
+
+    Returns (duration, accel_fraction): every joint follows the same normalized
+    trapezoid, so all joints start and stop together. The duration comes from
+    the slowest joint; duration_override may stretch the move but never makes
+    it faster than the joint limits allow.
+    """
+    times = [joint_move_time(d, v, a) for d, v, a in zip(delta, JOINT_MAX_VELOCITY, JOINT_MAX_ACCEL)]
+    slowest = max(range(len(times)), key=lambda j: times[j])
+    duration = times[slowest]
+    if duration == 0:
+        return max(0.0, float(duration_override or 0.0)), 0.5
+
+    d, vmax, amax = abs(delta[slowest]), JOINT_MAX_VELOCITY[slowest], JOINT_MAX_ACCEL[slowest]
+    accel_fraction = min(0.5, (vmax / amax) / duration) if d >= vmax * vmax / amax else 0.5
+
+    # The shared profile must also respect the limits of every other joint
+    f = accel_fraction
+    for dist, v, a in zip(delta, JOINT_MAX_VELOCITY, JOINT_MAX_ACCEL):
+        dist = abs(dist)
+        if dist:
+            duration = max(duration, dist / ((1 - f) * v), math.sqrt(dist / (f * (1 - f) * a)))
+
+    if duration_override and duration_override > duration:
+        duration = float(duration_override)
+    return duration, accel_fraction
+
+
+def profile_position(u: float, f: float) -> float:
+    """Normalized trapezoidal position (0..1) at normalized time u with accel fraction f"""
+    if u <= 0:
+        return 0.0
+    if u >= 1:
+        return 1.0
+    v = 1.0 / (1.0 - f)
+    if u < f:
+        return v * u * u / (2 * f)
+    if u > 1 - f:
+        r = 1 - u
+        return 1.0 - v * r * r / (2 * f)
+    return v * (u - f / 2)
+
+
+def profile_time_remaining(fraction_remaining: float, f: float) -> float:
+    """Normalized time left when `fraction_remaining` of the distance is still to go"""
+    v = 1.0 / (1.0 - f)
+    decel_fraction = v * f / 2
+    if fraction_remaining <= decel_fraction:
+        return math.sqrt(2 * f * fraction_remaining / v)
+    return min(1.0, f + (fraction_remaining - decel_fraction) / v)
+
+
+class _Segment:
+    __slots__ = ("delta", "start_tick", "ticks", "accel_fraction")
+
+    def __init__(self, delta: Joints, start_tick: int, ticks: int, accel_fraction: float = 0.5):
+        self.delta = delta
+        self.start_tick = start_tick
+        self.ticks = ticks
+        self.accel_fraction = accel_fraction
+
+    def progress(self, tick: int) -> float:
+        elapsed = tick - self.start_tick
+        if elapsed <= 0:
+            return 0.0
+        if elapsed >= self.ticks:
+            return 1.0
+        return profile_position(elapsed / self.ticks, self.accel_fraction)
+
+    @property
+    def end_tick(self) -> int:
+        return self.start_tick + self.ticks
+
+
+class BlendedPath:
+    """
+    Continuous trajectory through a run of joint-space waypoints.
+
+    Each waypoint is a velocity-limited move of its own (see move_profile).
+    When the robot gets within
+    ``blend_radius`` degrees (largest joint) of an intermediate waypoint the
+    next move is started and the two moves are superimposed, so the arm rounds
+    the corner instead of stopping on it. The final waypoint is always reached
+    exactly.
+    """
+
+    def __init__(self, start: Sequence[float], waypoints: Sequence[Sequence[float]],
+                 blend_radius: float = DEFAULT_BLEND_RADIUS,
+                 durations: Optional[Sequence[Optional[float]]] = None):
+        self.start: Joints = tuple(float(v) for v in start)
+        self.waypoints: List[Joints] = [tuple(float(v) for v in w) for w in waypoints]
+        self.blend_radius = max(0.0, float(blend_radius or 0.0))
+        self.segments: List[_Segment] = []
+
+        prev = self.start
+        tick = 0
+        for i, wp in enumerate(self.waypoints):
+            delta = tuple(b - a for a, b in zip(prev, wp))
+            duration, accel_fraction = move_profile(delta, durations[i] if durations else None)
+            # At least one tick so every waypoint is reported as reached
+            ticks = max(1, math.ceil(duration / TICK_INTERVAL - 1e-9))
+            self.segments.append(_Segment(delta, tick, ticks, accel_fraction))
+            tick += ticks
+            prev = wp
+
+        # Pull every following move forward by the time spent inside the blend zone
+        for i in range(len(self.segments) - 1):
+            seg, nxt = self.segments[i], self.segments[i + 1]
+            overlap = self._blend_ticks(seg, nxt)
+            for later in self.segments[i + 1:]:
+                later.start_tick -= overlap
+
+    def _blend_ticks(self, seg: _Segment, nxt: _Segment) -> int:
+        if self.blend_radius <= 0:
+            return 0
+        length = max(abs(d) for d in seg.delta)
+        next_length = max(abs(d) for d in nxt.delta)
+        if length == 0 or next_length == 0:
+            return 0
+        remaining = profile_time_remaining(min(1.0, self.blend_radius / length), seg.accel_fraction)
+        ticks = int(seg.ticks * remaining)
+        return min(ticks, seg.ticks // 2, nxt.ticks // 2)
+
+    @property
+    def total_ticks(self) -> int:
+        return max((s.end_tick for s in self.segments), default=0)
+
+    @property
+    def duration(self) -> float:
+        return self.total_ticks * TICK_INTERVAL
+
+    def setpoint(self, tick: int) -> Joints:
+        pos = list(self.start)
+        for seg in self.segments:
+            if tick <= seg.start_tick:
+                break
+            p = seg.progress(tick)
+            for j in range(6):
+                pos[j] += seg.delta[j] * p
+        return tuple(pos)
+
+    def iter_ticks(self) -> Iterator[Tuple[Joints, List[int]]]:
+        """
+        Yield (setpoint, reached) for every control tick.
+        ``reached`` lists the waypoint indices whose own move finished on that tick.
+        """
+        ends: Dict[int, List[int]] = {}
+        for i, seg in enumerate(self.segments):
+            ends.setdefault(seg.end_tick, []).append(i)
+        for tick in range(1, self.total_ticks + 1):
+            yield self.setpoint(tick), ends.get(tick, [])
+
+
+def plan_moves(start: Sequence[float], targets: Sequence[Dict],
+               blend_radius: Optional[float] = None) -> BlendedPath:
+    """
+    Build a blended path from target dicts. Missing joints keep the previous
+    waypoint value; an optional "duration" key (seconds) stretches that move.
+    """
+    waypoints = []
+    durations = []
+    prev = tuple(start)
+    for t in targets:
+        prev = joints_from(t, prev)
+        waypoints.append(prev)
+        durations.append(float(t.get("duration") or 0.0) or None)
+    radius = DEFAULT_BLEND_RADIUS if blend_radius is None else blend_radius
+    return BlendedPath(start, waypoints, radius, durations)
+
+
+class TargetTracker:
+    """
+    Follows a target that may change every tick (e.g. a slider) with velocity,
+    acceleration and jerk limits.
+
+    The target is first rate limited to max velocity, then smoothed by two
+    moving averages. The reference velocity can swing by up to 2v (reversal),
+    so averaging over 2v/a bounds the acceleration; likewise a window of 2a/j
+    bounds the jerk. The limits hold for any target sequence, the output
+    never overshoots a fixed target and reaches it exactly in finite time.
+    """
+
+    def __init__(self, start: Sequence[float], max_velocity: Sequence[float] = JOINT_MAX_VELOCITY,
+                 max_accel: Sequence[float] = JOINT_MAX_ACCEL, max_jerk: Sequence[float] = JOINT_MAX_JERK,
+                 tick: float = TICK_INTERVAL):
+        self.tick = tick
+        self.max_step = [v * tick for v in max_velocity]
+        self.windows = [(max(1, math.ceil(2 * v / a / tick)), max(1, math.ceil(2 * a / j / tick)))
+                        for v, a, j in zip(max_velocity, max_accel, max_jerk)]
+        self.reset(start)
+
+    def reset(self, position: Sequence[float]):
+        """Start from rest at `position`"""
+        self.reference = [float(p) for p in position]
+        self.stages = [(deque([p] * w1, maxlen=w1), deque([p] * w2, maxlen=w2))
+                       for p, (w1, w2) in zip(self.reference, self.windows)]
+        self.output: Joints = tuple(self.reference)
+
+    @property
+    def settled(self) -> bool:
+        """True once every joint rests at its reference (all filter stages agree)"""
+        return all(min(s1) == max(s1) == min(s2) == max(s2) == r
+                   for r, (s1, s2) in zip(self.reference, self.stages))
+
+    def step(self, target: Sequence[float]) -> Joints:
+        """Advance one tick toward `target` and return the new setpoint"""
+        out = []
+        for i, (goal, (s1, s2)) in enumerate(zip(target, self.stages)):
+            ref = self.reference[i]
+            limit = self.max_step[i]
+            ref += max(-limit, min(limit, goal - ref))
+            if abs(goal - ref) < 1e-9:
+                ref = goal
+            self.reference[i] = ref
+            s1.append(ref)
+            # Exact value once a stage is uniform, so the output lands on the target
+            s2.append(ref if min(s1) == max(s1) else sum(s1) / len(s1))
+            out.append(s2[-1] if min(s2) == max(s2) else sum(s2) / len(s2))
+        self.output = tuple(out)
+        return self.output
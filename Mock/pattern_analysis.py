@@ -0,0 +1,168 @@
+"""
+Pre-flight analysis of teaching patterns.
+
+Estimates per-step and per-cycle time from the same motion model the run
+engine uses, and validates the pattern before it is executed. Works on plain
+step dicts so it does not depend on the database models. With numpy
+installed the planned trajectories are also checked tick by tick for joint
+limits and self-collision (trajectory_check). The numpy modules are imported
+on first use, not when the server starts.
+"""
+
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from motion import JOINT_LIMITS, JOINT_NAMES, BlendedPath, plan_moves, split_move_runs, TICK_INTERVAL
+
+# Step timing used by the auto-run engine
+GRIP_RAMP_STEPS = 20
+GRIP_RAMP_INTERVAL = 0.05   # 20 * 0.05 = 1.0 second grip ramp
+RELEASE_DWELL = 0.5
+
+KNOWN_ACTIONS = ("move_joints", "move_cartesian", "grip", "release", "wait")
+MOVE_ACTIONS = ("move_joints", "move_cartesian")  # Executed as (blended) joint moves
+HOME_POSE = (0.0, 0.0, 0.0, 0.0, 0.0, 0.0)
+
+
+@lru_cache(maxsize=1)
+def numpy_checks():
+    """(check_path, resolve_cartesian), or (None, None) without numpy"""
+    try:
+        from trajectory_check import check_path
+        from inverse_kinematics import resolve_cartesian
+    except ImportError:  # numpy not installed
+        return None, None
+    return check_path, resolve_cartesian
+
+
+def validate_steps(steps: Sequence[Dict]) -> List[Dict]:
+    """Return a list of issues: {"severity": "error"|"warning", "step": index, "message": ...}"""
+    issues = []
+    if not steps:
+        issues.append({"severity": "error", "step": None, "message": "Pattern has no steps"})
+        return issues
+
+    for i, step in enumerate(steps):
+        action = step.get("action_type")
+        if action not in KNOWN_ACTIONS:
+            issues.append({"severity": "warning", "step": i,
+                           "message": f"Unknown action '{action}' is skipped at run time"})
+        elif action in MOVE_ACTIONS:
+            for name, (lo, hi) in zip(JOINT_NAMES, JOINT_LIMITS):
+                value = float(step.get(name) or 0.0)
+                if not lo <= value <= hi:
+                    issues.append({"severity": "error", "step": i,
+                                   "message": f"{name.upper()}={value:.1f}° outside limits [{lo:.0f}, {hi:.0f}]"})
+        elif action == "wait" and float(step.get("wait_time") or 0.0) < 0:
+            issues.append({"severity": "error", "step": i, "message": "Negative wait time"})
+
+    if not any(s.get("action_type") in KNOWN_ACTIONS for s in steps):
+        issues.append({"severity": "error", "step": None, "message": "Pattern has no executable steps"})
+    return issues
+
+
+def _cycle_times(steps: Sequence[Dict], start: Sequence[float], blend_radius: Optional[float],
+                 paths: Optional[List[Tuple[BlendedPath, List[int]]]] = None
+                 ) -> Tuple[List[float], Tuple[float, ...]]:
+    """
+    Simulate one cycle without sleeping. Returns (seconds per step, final pose).
+    Planned move runs are appended to `paths` as (path, step indices).
+    """
+    times = [0.0] * len(steps)
+    pose = tuple(start)
+    indexed = list(enumerate(steps))
+    for is_move, group in split_move_runs(indexed, lambda item: item[1].get("action_type") in MOVE_ACTIONS):
+        if is_move:
+            targets = [{**{n: step.get(n, 0.0) for n in JOINT_NAMES}, "duration": step.get("wait_time")}
+                       for _, step in group]
+            plan = plan_moves(pose, targets, blend_radius)
+            if paths is not None:
+                paths.append((plan, [idx for idx, _ in group]))
+            # Attribute the path time to waypoints by when each one is passed
+            prev_tick = 0
+            for (idx, _), seg in zip(group, plan.segments):
+                times[idx] = (seg.end_tick - prev_tick) * TICK_INTERVAL
+                prev_tick = seg.end_tick
+            pose = plan.waypoints[-1]
+            continue
+
+        idx, step = group[0]
+        action = step.get("action_type")
+        if action == "grip":
+            times[idx] = GRIP_RAMP_STEPS * GRIP_RAMP_INTERVAL
+        elif action == "release":
+            times[idx] = RELEASE_DWELL
+        elif action == "wait":
+            times[idx] = max(0.0, float(step.get("wait_time") or 0.0))
+    return times, pose
+
+
+def compile_steps(steps: Sequence[Dict], start: Sequence[float] = HOME_POSE) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Resolve move_cartesian steps to joint targets (inverse kinematics, seeded
+    from `start` and then from each previous move). Returns (steps, issues).
+    """
+    if not any(s.get("action_type") == "move_cartesian" for s in steps):
+        return list(steps), []
+    resolve_cartesian = numpy_checks()[1]
+    if resolve_cartesian is None:
+        return list(steps), [{"severity": "error", "step": i, "message": "move_cartesian requires numpy"}
+                             for i, s in enumerate(steps) if s.get("action_type") == "move_cartesian"]
+    return resolve_cartesian(steps, start)
+
+
+def check_trajectories(paths: Sequence[Tuple[BlendedPath, List[int]]], known: Sequence[Dict]) -> List[Dict]:
+    """Tick-by-tick check of planned move runs; steps that already have an error are not repeated"""
+    check_path = numpy_checks()[0]
+    if check_path is None:
+        return [{"severity": "warning", "step": None,
+                 "message": "Trajectory check skipped (pip install numpy for collision checking)"}]
+    flagged = {i["step"] for i in known if i["severity"] == "error"}
+    found: List[Dict] = []
+    for path, step_indices in paths:
+        for issue in check_path(path, step_indices):
+            if issue["step"] not in flagged and issue not in found:
+                found.append(issue)
+    return sorted(found, key=lambda i: i["step"])
+
+
+def analyze_steps(steps: Sequence[Dict], blend_radius: Optional[float] = None,
+                  start: Sequence[float] = HOME_POSE) -> Dict:
+    """
+    Analyze an ordered list of step dicts (action_type, j1..j6, wait_time;
+    x..yaw for move_cartesian, which are compiled to joints first).
+
+    The first cycle starts from `start` (the home pose for patterns); later
+    cycles start where the previous one ended, which is what `cycle_s` reports.
+    """
+    steps, issues = compile_steps(steps, start)
+    issues.extend(validate_steps(steps))
+    paths: List[Tuple[BlendedPath, List[int]]] = []
+    first_times, end_pose = _cycle_times(steps, start, blend_radius, paths)
+    steady_times, _ = _cycle_times(steps, end_pose, blend_radius, paths)
+    issues.extend(check_trajectories(paths, issues))
+
+    return {
+        "step_count": len(steps),
+        "steps": [
+            {"index": i, "action_type": step.get("action_type"), "duration_s": round(t, 3)}
+            for i, (step, t) in enumerate(zip(steps, steady_times))
+        ],
+        "first_cycle_s": round(sum(first_times), 3),
+        "cycle_s": round(sum(steady_times), 3),
+        "issues": issues,
+        "valid": not any(i["severity"] == "error" for i in issues),
+    }
+
+
+def estimate_run(analysis: Dict, cycles: int) -> Dict:
+    """Total run duration for `cycles` cycles of an analyzed pattern"""
+    cycles = max(0, int(cycles))
+    total = 0.0
+    if cycles:
+        total = analysis["first_cycle_s"] + (cycles - 1) * analysis["cycle_s"]
+    return {
+        "cycles": cycles,
+        "cycle_s": analysis["cycle_s"],
+        "total_s": round(total, 1),
+    }
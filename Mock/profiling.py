@@ -0,0 +1,196 @@
+"""
+Always-on request timing and an on-demand sampling profiler.
+
+TimingMiddleware adds a Server-Timing header, keeps per-route counters
+(RequestTimings) and logs requests slower than SLOW_REQUEST_MS. Its cost is
+two clock reads and a dict update per request, so it stays enabled in
+production.
+
+SamplingProfiler runs only while a profile is requested: a helper thread
+samples the stacks of the named threads (sys._current_frames) for a fixed
+time and aggregates them into collapsed stacks ("thread;outer;...;inner N"),
+the input format of flamegraph.pl and speedscope. Nothing is hooked into the
+profiled threads, so there is no overhead when no profile is running.
+"""
+
+import os
+import sys
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+SLOW_REQUEST_MS = float(os.environ.get("ROBOT_SLOW_REQUEST_MS", 250))
+MAX_ROUTES = 200                 # Distinct route keys tracked (unmatched paths share one key)
+MAX_PROFILE_SECONDS = 120
+MIN_INTERVAL_MS = 1.0
+DEFAULT_PROFILE_THREADS = ("auto-run", "sequence")
+
+
+class RequestTimings:
+    """Per-route request counters (count, total / max ms, slow, 5xx)"""
+
+    def __init__(self):
+        self.routes: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: str, elapsed: float, status: int, slow: bool):
+        with self._lock:
+            stats = self.routes.get(key)
+            if stats is None:
+                if len(self.routes) >= MAX_ROUTES:
+                    key = "<other>"
+                    stats = self.routes.get(key)
+                if stats is None:
+                    stats = self.routes[key] = {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "slow": 0, "errors": 0}
+            stats["count"] += 1
+            stats["total_ms"] += elapsed
+            stats["max_ms"] = max(stats["max_ms"], elapsed)
+            stats["slow"] += slow
+            stats["errors"] += status >= 500
+
+    def snapshot(self) -> List[Dict]:
+        """Per-route stats, slowest average first"""
+        with self._lock:
+            rows = [{"route": key, **stats} for key, stats in self.routes.items()]
+        for row in rows:
+            row["avg_ms"] = round(row["total_ms"] / row["count"], 2)
+            row["total_ms"] = round(row["total_ms"], 1)
+            row["max_ms"] = round(row["max_ms"], 1)
+        return sorted(rows, key=lambda r: r["avg_ms"], reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self.routes.clear()
+
+
+class TimingMiddleware:
+    """Pure ASGI middleware (does not buffer or wrap the response body)"""
+
+    def __init__(self, app, timings: RequestTimings, slow_ms: float = SLOW_REQUEST_MS):
+        self.app = app
+        self.timings = timings
+        self.slow_ms = slow_ms
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def timed_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                # Time to first byte; a streamed body may take longer
+                elapsed = (time.perf_counter() - start) * 1000
+                message["headers"] = [*message.get("headers", []),
+                                      (b"server-timing", f"app;dur={elapsed:.1f}".encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            # The router leaves the matched route in the scope: group by its template, not the raw path
+            route = getattr(scope.get("route"), "path", None) or "<unmatched>"
+            slow = elapsed >= self.slow_ms
+            self.timings.record(f"{scope['method']} {route}", elapsed, status, slow)
+            if slow:
+                query = scope.get("query_string", b"").decode(errors="replace")
+                path = scope["path"] + (f"?{query}" if query else "")
+                print(f"🐢 Slow request: {scope['method']} {path} -> {status} in {elapsed:.0f} ms")
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """One time-boxed profile at a time; results stay available until the next start"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.stacks: Dict[str, int] = {}
+        self.samples = 0
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.seconds = 0.0
+        self.interval = 0.0
+        self.thread_names: List[str] = []
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, seconds: float, interval_ms: float = 5.0,
+              thread_names: Iterable[str] = DEFAULT_PROFILE_THREADS) -> bool:
+        """False if a profile is already running"""
+        with self._lock:
+            if self.running:
+                return False
+            self.seconds = min(max(0.1, float(seconds)), MAX_PROFILE_SECONDS)
+            self.interval = max(MIN_INTERVAL_MS, float(interval_ms)) / 1000.0
+            self.thread_names = list(thread_names)
+            self.stacks = {}
+            self.samples = 0
+            self.started_at, self.finished_at = time.time(), None
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=1)
+
+    def _wanted(self, name: str) -> bool:
+        # Prefix match, so "sequence" also covers "sequence-2"; "*" profiles every thread
+        return any(want == "*" or name.startswith(want) for want in self.thread_names)
+
+    def _run(self):
+        me = threading.get_ident()
+        deadline = time.monotonic() + self.seconds
+        next_tick = time.monotonic()
+        while not self._stop.is_set() and time.monotonic() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                name = names.get(ident)
+                if ident == me or name is None or not self._wanted(name):
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                key = ";".join([name, *reversed(labels)])
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+                self.samples += 1
+            next_tick += self.interval
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_tick = time.monotonic()
+        self.finished_at = time.time()
+
+    def collapsed(self) -> str:
+        """flamegraph.pl / speedscope input: one "frame;frame;... count" line per distinct stack"""
+        stacks = dict(self.stacks)  # Copy: the sampler may still be adding stacks
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(stacks.items()))
+
+    def status(self) -> Dict:
+        return {
+            "running": self.running,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "seconds": self.seconds,
+            "interval_ms": round(self.interval * 1000, 2),
+            "threads": self.thread_names,
+            "samples": self.samples,
+            "stacks": len(self.stacks),
+        }
@@ -0,0 +1,62 @@
+"""
+Write-behind store for frequently updated database rows (run progress).
+
+The control thread records changes in memory in O(1) and never waits for the
+database. A background flusher writes whatever changed since the last flush
+every `interval` seconds, coalescing all updates of a row into one and all
+rows into one transaction. flush() writes immediately (end of run,
+shutdown). A crash loses at most `interval` seconds of progress; run
+checkpoints cover the rest.
+"""
+
+import threading
+from typing import Any, Callable, Dict, Optional
+
+FLUSH_INTERVAL = 2.0   # seconds
+
+
+class WriteBehindStore:
+    """Pending field updates per row key; `write(changes)` persists {key: {field: value}}"""
+
+    def __init__(self, write: Callable[[Dict[Any, Dict[str, Any]]], None], interval: float = FLUSH_INTERVAL):
+        self.write = write
+        self.interval = interval
+        self._pending: Dict[Any, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # One writer at a time, in update order
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def update(self, key, **fields):
+        with self._lock:
+            self._pending.setdefault(key, {}).update(fields)
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                changes, self._pending = self._pending, {}
+            if not changes:
+                return
+            try:
+                self.write(changes)
+            except Exception as e:
+                # Keep the changes for the next flush, unless newer values arrived meanwhile
+                with self._lock:
+                    for key, fields in changes.items():
+                        self._pending[key] = {**fields, **self._pending.get(key, {})}
+                print(f"⚠️ Progress flush failed: {e}")
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="progress-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval + 1)
+        self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.flush()
@@ -0,0 +1,499 @@
+"""
+Hardware driver layer.
+
+Executors (auto-run, sequence playback, manual control) send setpoints to a
+RobotDriver instead of writing the robot state directly:
+
+  SimulatorDriver - the built-in simulation (writes straight into the state)
+  ProtocolDriver  - a real controller over TCP or a serial port
+
+ProtocolDriver runs an asyncio loop in a background thread. Commands are
+pipelined: each line carries a sequence number and the driver never waits
+for an acknowledgement before sending the next one. Joint setpoints are
+coalesced to the latest value and flushed once per control tick together
+with any gripper command and one bulk sensor read, so a tick costs a single
+write. LoopbackController speaks the same protocol for testing without
+hardware.
+
+If the controller drops the connection, the driver stores a DriverError
+(set_joints / set_gripper raise it, so executors stop their run), reports it
+through on_disconnect and reconnects with exponential backoff.
+
+Wire protocol (ASCII, one command per line):
+  host -> controller   "<seq> J <j1> .. <j6>"          joint setpoint
+                       "<seq> G <angle> <force_limit>"  gripper setpoint
+                       "<seq> S"                        read all sensors
+  controller -> host   "<seq> OK"
+                       "<seq> S <j1> .. <j6> <gripper_angle> <force>"
+                       "<seq> ERR <message>"
+"""
+
+import abc
+import asyncio
+import concurrent.futures
+import itertools
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from motion import JOINT_NAMES, TICK_INTERVAL
+
+
+# Sensor reads are skipped on ticks where this many are still unanswered (slow link)
+MAX_SENSOR_READS_IN_FLIGHT = 4
+RECONNECT_MIN_DELAY = 0.5   # Seconds before the first reconnect attempt, doubled per failure
+RECONNECT_MAX_DELAY = 5.0
+
+
+class DriverError(Exception):
+    pass
+
+
+class RobotDriver(abc.ABC):
+    """Interface used by the executors. Setpoint calls never block on I/O."""
+
+    name = "base"
+    error: Optional[Exception] = None  # Set while the driver cannot reach the robot
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    @abc.abstractmethod
+    def set_joints(self, joints: Sequence[float]):
+        ...
+
+    @abc.abstractmethod
+    def set_gripper(self, angle: int, force_limit: float):
+        ...
+
+    @abc.abstractmethod
+    def read_sensors(self) -> Dict:
+        """Latest sensor values: j1..j6, gripper_angle, force"""
+
+    def describe(self) -> Dict:
+        return {"driver": self.name}
+
+
+class SimulatorDriver(RobotDriver):
+    """The simulation: setpoints are applied to the robot state immediately"""
+
+    name = "simulator"
+
+    def __init__(self, state):
+        self.state = state
+
+    def set_joints(self, joints: Sequence[float]):
+        self.state.update(**dict(zip(JOINT_NAMES, joints)))
+
+    def set_gripper(self, angle: int, force_limit: float):
+        self.state.gripper_angle = int(angle)
+
+    def read_sensors(self) -> Dict:
+        s = self.state.snapshot()
+        return {**{name: s[name] for name in JOINT_NAMES},
+                "gripper_angle": s["gripper_angle"], "force": s["current_force"]}
+
+
+class ProtocolDriver(RobotDriver):
+    """
+    Controller over TCP ("tcp://host:port") or serial
+    ("serial:///dev/ttyUSB0?baud=115200", needs pyserial-asyncio).
+
+    on_feedback(sensors) is called from the driver thread after every bulk
+    sensor read, e.g. to mirror measured values into the robot state.
+    on_disconnect(error) is called from the driver thread when the connection
+    is lost, e.g. to stop the runs that are streaming setpoints.
+    """
+
+    name = "protocol"
+
+    def __init__(self, url: str, on_feedback: Optional[Callable[[Dict], None]] = None,
+                 tick: float = TICK_INTERVAL, timeout: float = 2.0,
+                 on_disconnect: Optional[Callable[["DriverError"], None]] = None):
+        self.url = url
+        self.on_feedback = on_feedback
+        self.on_disconnect = on_disconnect
+        self.tick = tick
+        self.timeout = timeout
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._pending: Dict[int, object] = {}    # seq -> Future (request) or (sent_at, "S") (tick sensor read)
+        self._seq = itertools.count(1)
+        self._lock = threading.Lock()           # Guards the setpoint slots below
+        self._joints: Optional[tuple] = None    # Latest joint setpoint not yet sent
+        self._gripper: Optional[tuple] = None
+        self._sensors: Dict = {}
+        self._ready = threading.Event()
+        self._error: Optional[BaseException] = None
+        self._tasks: List[asyncio.Task] = []
+        self.counters = {"ticks": 0, "commands": 0, "coalesced": 0, "errors": 0, "sensor_reads": 0,
+                         "disconnects": 0, "reconnects": 0}
+        self.rtt_ms: Optional[float] = None     # Exponential moving average of sensor read latency
+        self.loopback: Optional["LoopbackController"] = None  # Fake controller owned by this driver
+
+    # --- Lifecycle (called from request/executor threads) ---
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="robot-driver", daemon=True)
+        self._thread.start()
+        if not self._ready.wait(self.timeout + 1):
+            raise DriverError(f"Timed out connecting to {self.url}")
+        if self._error:
+            raise DriverError(f"Cannot connect to {self.url}: {self._error}")
+
+    def stop(self):
+        if self._loop and self._loop.is_running():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread:
+            self._thread.join(timeout=2)
+        if self.loopback:
+            self.loopback.stop()
+
+    @property
+    def error(self) -> Optional[BaseException]:
+        return self._error
+
+    def set_joints(self, joints: Sequence[float]):
+        if self._error:
+            raise self._error
+        with self._lock:
+            if self._joints is not None:
+                self.counters["coalesced"] += 1  # Superseded before it was sent
+            self._joints = tuple(float(j) for j in joints)
+
+    def set_gripper(self, angle: int, force_limit: float):
+        if self._error:
+            raise self._error
+        with self._lock:
+            self._gripper = (int(angle), float(force_limit))
+
+    def read_sensors(self) -> Dict:
+        return dict(self._sensors)
+
+    def request(self, *fields) -> str:
+        """Send one command and wait for its reply (blocking; not for the control tick)"""
+        return self._wait(self._request(" ".join(str(f) for f in fields)), self.timeout)
+
+    def pipeline(self, commands: Sequence[Sequence]) -> List[str]:
+        """Send many commands back to back and wait for all replies (one round trip, not one per command)"""
+        async def run():
+            return await asyncio.gather(*(self._request(" ".join(str(f) for f in c)) for c in commands))
+        return self._wait(run(), self.timeout + len(commands) * 0.01)
+
+    def _wait(self, coro, timeout: float):
+        """Run a coroutine on the driver loop; callers only ever see DriverError"""
+        future = asyncio.run_coroutine_threadsafe(coro, self._loop)
+        try:
+            return future.result(timeout)
+        except (concurrent.futures.TimeoutError, asyncio.TimeoutError):
+            future.cancel()
+            raise DriverError(f"No reply from {self.url} within {timeout:.2f} s") from None
+
+    def describe(self) -> Dict:
+        return {"driver": self.name, "url": self.url, "connected": self._writer is not None,
+                "rtt_ms": round(self.rtt_ms, 3) if self.rtt_ms is not None else None, **self.counters}
+
+    # --- Driver thread ---
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._connect())
+        except BaseException as e:
+            self._error = e
+            self._ready.set()
+            return
+        self._ready.set()
+        self._start_tasks()
+        try:
+            self._loop.run_forever()
+        finally:
+            for t in self._tasks:
+                t.cancel()
+            if self._writer:
+                self._writer.close()
+            self._writer = None
+            self._loop.run_until_complete(asyncio.sleep(0))
+            self._loop.close()
+
+    def _start_tasks(self):
+        self._tasks = [self._loop.create_task(self._read_loop(self._reader)),
+                       self._loop.create_task(self._tick_loop())]
+
+    def _connection_lost(self, reason: str):
+        """Single place that handles a dead connection: stop ticking, fail waiters, reconnect"""
+        if self._writer is None:
+            return  # Already handled (read and tick loop can both notice)
+        error = DriverError(f"Lost connection to {self.url}: {reason}")
+        self._error = error
+        self.counters["disconnects"] += 1
+        self._writer.close()
+        self._writer = None
+        current = asyncio.current_task()
+        for t in self._tasks:
+            if t is not current:
+                t.cancel()
+        for waiter in self._pending.values():
+            if isinstance(waiter, asyncio.Future) and not waiter.done():
+                waiter.set_exception(error)
+        self._pending.clear()
+        with self._lock:
+            self._joints = self._gripper = None  # Stale setpoints are not replayed after reconnecting
+        print(f"⚠️ {error}")
+        if self.on_disconnect:
+            try:
+                self.on_disconnect(error)
+            except Exception as e:
+                print(f"⚠️ Driver disconnect handler failed: {e}")
+        self._tasks = [self._loop.create_task(self._reconnect())]
+
+    async def _reconnect(self):
+        delay = RECONNECT_MIN_DELAY
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                await self._connect()
+            except (OSError, asyncio.TimeoutError, DriverError):
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+                continue
+            self._error = None
+            self.counters["reconnects"] += 1
+            print(f"✅ Reconnected to {self.url}")
+            self._start_tasks()
+            return
+
+    async def _connect(self):
+        target = urlparse(self.url)
+        if target.scheme == "tcp":
+            coro = asyncio.open_connection(target.hostname, target.port)
+        elif target.scheme == "serial":
+            try:
+                import serial_asyncio
+            except ImportError:
+                raise DriverError("serial:// needs the optional pyserial-asyncio package")
+            baud = int(parse_qs(target.query).get("baud", ["115200"])[0])
+            coro = serial_asyncio.open_serial_connection(url=target.path, baudrate=baud)
+        else:
+            raise DriverError(f"Unsupported driver URL: {self.url}")
+        self._reader, self._writer = await asyncio.wait_for(coro, self.timeout)
+
+    def _frame(self, *fields) -> Tuple[int, bytes]:
+        seq = next(self._seq)
+        return seq, (" ".join(str(f) for f in (seq,) + fields) + "\n").encode()
+
+    async def _request(self, command: str) -> str:
+        seq, frame = self._frame(command)
+        if self._writer is None:
+            raise self._error or DriverError(f"Not connected to {self.url}")
+        future = self._loop.create_future()
+        self._pending[seq] = future
+        try:
+            self._writer.write(frame)
+            await self._writer.drain()
+            return await asyncio.wait_for(future, self.timeout)
+        finally:
+            self._pending.pop(seq, None)  # No reply: do not leak the waiter
+
+    async def _tick_loop(self):
+        next_tick = time.monotonic()
+        while True:
+            with self._lock:
+                joints, self._joints = self._joints, None
+                gripper, self._gripper = self._gripper, None
+
+            # One write per tick: latest setpoints plus a bulk sensor read
+            frames = []
+            if joints is not None:
+                frames.append(self._frame("J", *("%.3f" % j for j in joints))[1])
+            if gripper is not None:
+                frames.append(self._frame("G", gripper[0], "%.3f" % gripper[1])[1])
+            now = time.perf_counter()
+            reads = [k for k, v in self._pending.items() if isinstance(v, tuple)]
+            for k in reads:
+                if now - self._pending[k][0] > self.timeout:
+                    del self._pending[k]  # Lost reply
+            if len(reads) < MAX_SENSOR_READS_IN_FLIGHT:
+                seq, frame = self._frame("S")
+                frames.append(frame)
+                self._pending[seq] = (now, "S")
+            if frames:
+                try:
+                    self._writer.write(b"".join(frames))
+                    self.counters["commands"] += len(frames)
+                    await self._writer.drain()
+                except (ConnectionError, OSError) as e:
+                    self._connection_lost(str(e) or type(e).__name__)
+                    return
+            self.counters["ticks"] += 1
+
+            next_tick += self.tick
+            await asyncio.sleep(max(0.0, next_tick - time.monotonic()))
+            if next_tick < time.monotonic() - self.tick:
+                next_tick = time.monotonic()  # Fell behind (e.g. slow link): don't burst to catch up
+
+    async def _read_loop(self, reader: asyncio.StreamReader):
+        while True:
+            try:
+                line = await reader.readline()
+            except (ConnectionError, OSError) as e:
+                self._connection_lost(str(e) or type(e).__name__)
+                return
+            if not line:
+                self._connection_lost("closed by the controller")
+                return
+            parts = line.decode(errors="replace").split()
+            if len(parts) < 2 or not parts[0].isdigit():
+                continue
+            seq, kind = int(parts[0]), parts[1]
+            waiter = self._pending.pop(seq, None)
+            if kind == "ERR":
+                self.counters["errors"] += 1
+            if isinstance(waiter, tuple) and kind == "S" and len(parts) == 10:
+                sensors = dict(zip(JOINT_NAMES, map(float, parts[2:8])))
+                sensors["gripper_angle"] = int(float(parts[8]))
+                sensors["force"] = float(parts[9])
+                self._sensors = sensors
+                self.counters["sensor_reads"] += 1
+                rtt = (time.perf_counter() - waiter[0]) * 1000
+                self.rtt_ms = rtt if self.rtt_ms is None else 0.9 * self.rtt_ms + 0.1 * rtt
+                if self.on_feedback:
+                    self.on_feedback(sensors)
+            elif isinstance(waiter, asyncio.Future) and not waiter.done():
+                waiter.set_result(" ".join(parts[1:]))
+
+
+class LoopbackController:
+    """
+    In-process fake controller speaking the wire protocol on a local TCP port.
+    `latency` delays every reply (one-way link + controller processing) while
+    keeping replies in order, like a real serial/TCP link.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.joints = [0.0] * 6
+        self.gripper_angle = 180
+        self.force_limit = 5.0
+        self.lines = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        self._writers: set = set()
+
+    @property
+    def url(self) -> str:
+        return f"tcp://{self.host}:{self.port}"
+
+    def start(self) -> "LoopbackController":
+        self._thread = threading.Thread(target=self._run, name="loopback-controller", daemon=True)
+        self._thread.start()
+        self._ready.wait(5)
+        return self
+
+    def stop(self):
+        """Shut down like a powered-off controller: open connections are closed too"""
+        if self._loop and self._loop.is_running():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        if self._thread:
+            self._thread.join(timeout=2)
+
+    def disconnect(self):
+        """Drop every open connection but keep listening (a controller reset)"""
+        if self._loop and self._loop.is_running():
+            self._loop.call_soon_threadsafe(self._close_connections)
+
+    def _close_connections(self):
+        for writer in list(self._writers):
+            writer.close()
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        server = self._loop.run_until_complete(asyncio.start_server(self._serve, self.host, self.port))
+        self.port = server.sockets[0].getsockname()[1]
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            server.close()
+            self._close_connections()
+            self._loop.run_until_complete(asyncio.sleep(0))  # Let the sockets actually close
+            self._loop.close()
+
+    def _force(self) -> float:
+        # Simple spring model: force grows with closure up to the limit
+        return round(min(self.force_limit, self.force_limit * (1 - self.gripper_angle / 180.0) * 1.2), 3)
+
+    def _handle(self, line: str) -> Optional[str]:
+        parts = line.split()
+        if len(parts) < 2:
+            return None
+        seq, kind, args = parts[0], parts[1], parts[2:]
+        try:
+            if kind == "J" and len(args) == 6:
+                self.joints = [float(a) for a in args]
+                return f"{seq} OK"
+            if kind == "G" and len(args) == 2:
+                self.gripper_angle = max(0, min(180, int(float(args[0]))))
+                self.force_limit = float(args[1])
+                return f"{seq} OK"
+            if kind == "S":
+                values = " ".join("%.3f" % j for j in self.joints)
+                return f"{seq} S {values} {self.gripper_angle} {self._force()}"
+            if kind == "PING":
+                return f"{seq} OK"
+        except ValueError:
+            pass
+        return f"{seq} ERR bad command"
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        outbox: asyncio.Queue = asyncio.Queue()
+
+        async def send_replies():
+            while True:
+                due, reply = await outbox.get()
+                delay = due - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                writer.write(reply.encode() + b"\n")
+                if outbox.empty():
+                    await writer.drain()
+
+        sender = asyncio.ensure_future(send_replies())
+        self._writers.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self.lines += 1
+                reply = self._handle(line.decode(errors="replace"))
+                if reply is not None:
+                    outbox.put_nowait((time.monotonic() + self.latency, reply))
+        except ConnectionError:
+            pass
+        finally:
+            self._writers.discard(writer)
+            sender.cancel()
+            writer.close()
+
+
+def create_driver(spec: str, state, on_feedback: Optional[Callable[[Dict], None]] = None,
+                  on_disconnect: Optional[Callable[[DriverError], None]] = None) -> RobotDriver:
+    """
+    Driver from a spec string (ROBOT_DRIVER): "sim" (default), "loopback",
+    "tcp://host:port" or "serial:///dev/ttyUSB0?baud=115200".
+    """
+    if not spec or spec == "sim":
+        return SimulatorDriver(state)
+    if spec == "loopback":
+        controller = LoopbackController().start()
+        driver = ProtocolDriver(controller.url, on_feedback, on_disconnect=on_disconnect)
+        driver.loopback = controller  # Stopped together with the driver
+        return driver
+    return ProtocolDriver(spec, on_feedback, on_disconnect=on_disconnect)
@@ -0,0 +1,229 @@
+"""
+Cross-run force analytics.
+
+Each run log is loaded once into columnar NumPy arrays; per-run and per-cycle
+aggregates are then computed with vectorized reductions and cached by the
+log checksum, so comparing hundreds of runs only parses new logs.
+
+Requires numpy (optional dependency of the backend).
+"""
+
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from log_query import iter_lines, timestamp_seconds
+
+GRIP_PHASE_PREFIX = "gripping"
+PERCENTILES = (50, 95, 99)
+
+
+def load_run_arrays(path: str) -> Dict[str, np.ndarray]:
+    """Parse a run log into columns: t (s), cycle, phase (codes), force; plus the phase names"""
+    lines = iter_lines(path)
+    header = next(lines, None)
+    if not header:
+        return {"t": np.zeros(0), "cycle": np.zeros(0, np.int32), "phase": np.zeros(0, np.uint8),
+                "force": np.zeros(0, np.float32), "phase_names": []}
+    columns = {name.decode(): i for i, name in enumerate(header.split(b","))}
+    i_t, i_c, i_p, i_f = columns["Timestamp"], columns["Cycle"], columns["Phase"], columns["Force_N"]
+    width = len(columns)
+
+    t, cycle, phase, force = [], [], [], []
+    phase_codes: Dict[bytes, int] = {}
+    for line in lines:
+        fields = line.split(b",")
+        if len(fields) != width:
+            continue
+        try:
+            ts, c, f = timestamp_seconds(fields[i_t]), int(fields[i_c]), float(fields[i_f])
+        except ValueError:
+            continue
+        t.append(ts)
+        cycle.append(c)
+        force.append(f)
+        phase.append(phase_codes.setdefault(fields[i_p], len(phase_codes)))
+
+    t_arr = np.asarray(t, dtype=np.float64)
+    if t_arr.size > 1:
+        # Timestamps are time-of-day only: unwrap runs that cross midnight
+        wraps = np.concatenate(([0], np.cumsum(np.diff(t_arr) < -43200)))
+        t_arr = t_arr + wraps * 86400.0
+    names = [name.decode() for name, _ in sorted(phase_codes.items(), key=lambda kv: kv[1])]
+    return {
+        "t": t_arr,
+        "cycle": np.asarray(cycle, dtype=np.int32),
+        "phase": np.asarray(phase, dtype=np.uint8),
+        "force": np.asarray(force, dtype=np.float32),
+        "phase_names": names,
+    }
+
+
+def load_tool_path(path: str) -> Dict[str, np.ndarray]:
+    """
+    Joint columns of a run log converted to tool-tip positions in one FK call.
+    Logs from before J4-J6 were recorded read those joints as 0.
+    Returns t (s), cycle, phase (codes), xyz (N, 3, mm); plus the phase names.
+    """
+    from kinematics import tool_pose
+
+    lines = iter_lines(path)
+    header = next(lines, None)
+    columns = {name.decode(): i for i, name in enumerate(header.split(b","))} if header else {}
+    if not columns:
+        return {"t": np.zeros(0), "cycle": np.zeros(0, np.int32), "phase": np.zeros(0, np.uint8),
+                "xyz": np.zeros((0, 3)), "phase_names": []}
+    i_t, i_c, i_p = columns["Timestamp"], columns["Cycle"], columns["Phase"]
+    joint_cols = [columns.get(f"J{k}") for k in range(1, 7)]
+    width = len(columns)
+
+    t, cycle, phase, joints = [], [], [], []
+    phase_codes: Dict[bytes, int] = {}
+    for line in lines:
+        fields = line.split(b",")
+        if len(fields) != width:
+            continue
+        try:
+            ts, c = timestamp_seconds(fields[i_t]), int(fields[i_c])
+            q = [float(fields[i]) if i is not None else 0.0 for i in joint_cols]
+        except ValueError:
+            continue
+        t.append(ts)
+        cycle.append(c)
+        joints.append(q)
+        phase.append(phase_codes.setdefault(fields[i_p], len(phase_codes)))
+
+    names = [name.decode() for name, _ in sorted(phase_codes.items(), key=lambda kv: kv[1])]
+    return {
+        "t": np.asarray(t, dtype=np.float64),
+        "cycle": np.asarray(cycle, dtype=np.int32),
+        "phase": np.asarray(phase, dtype=np.uint8),
+        "xyz": tool_pose(np.asarray(joints, dtype=np.float64).reshape(-1, 6))[:, :3],
+        "phase_names": names,
+    }
+
+
+def waypoint_repeatability(run: Dict[str, np.ndarray], phase_name: str = "Moving") -> List[Dict]:
+    """
+    Spread of the tool tip at each waypoint across cycles: the k-th `phase_name`
+    row of every cycle is the same waypoint, so its positions should coincide.
+    """
+    if phase_name not in run["phase_names"]:
+        return []
+    rows = np.flatnonzero(run["phase"] == run["phase_names"].index(phase_name))
+    if rows.size == 0:
+        return []
+    cycle = run["cycle"][rows]
+    # Index of each row within its cycle
+    starts = np.flatnonzero(np.concatenate(([True], cycle[1:] != cycle[:-1])))
+    counts = np.diff(np.append(starts, cycle.size))
+    within = np.arange(cycle.size) - np.repeat(starts, counts)
+
+    result = []
+    for k in range(int(within.max()) + 1):
+        xyz = run["xyz"][rows[within == k]]
+        mean = xyz.mean(axis=0)
+        spread = np.linalg.norm(xyz - mean, axis=1)
+        result.append({"waypoint": k, "samples": int(len(xyz)), "mean_mm": mean.round(2).tolist(),
+                       "max_dev_mm": round(float(spread.max()), 3), "std_mm": round(float(spread.std()), 3)})
+    return result
+
+
+def tool_path_summary(run: Dict[str, np.ndarray], max_points: int = 2000) -> Dict:
+    """Tool path (decimated to at most `max_points`), path length and per-waypoint repeatability"""
+    xyz = run["xyz"]
+    step = max(1, -(-len(xyz) // max(1, max_points)))
+    length = float(np.linalg.norm(np.diff(xyz, axis=0), axis=1).sum()) if len(xyz) > 1 else 0.0
+    return {
+        "samples": int(len(xyz)),
+        "path_length_mm": round(length, 1),
+        "bounds_mm": {"min": xyz.min(axis=0).round(1).tolist(), "max": xyz.max(axis=0).round(1).tolist()}
+        if len(xyz) else None,
+        "repeatability": waypoint_repeatability(run),
+        "path": {
+            "t": (run["t"][::step] - (run["t"][0] if len(xyz) else 0.0)).round(3).tolist(),
+            "cycle": run["cycle"][::step].tolist(),
+            "xyz": xyz[::step].round(1).tolist(),
+        },
+    }
+
+
+def cycle_aggregates(run: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Per-cycle peak/mean force and grip-phase duration (rows are grouped by cycle in the log)"""
+    cycle, force, t = run["cycle"], run["force"], run["t"]
+    if cycle.size == 0:
+        empty = np.zeros(0)
+        return {"cycle": empty.astype(np.int32), "peak": empty, "mean": empty, "grip_s": empty}
+
+    # Segment boundaries wherever the cycle number changes
+    starts = np.flatnonzero(np.concatenate(([True], cycle[1:] != cycle[:-1])))
+    counts = np.diff(np.append(starts, cycle.size))
+    peak = np.maximum.reduceat(force, starts)
+    mean = np.add.reduceat(force.astype(np.float64), starts) / counts
+
+    grip_codes = [i for i, name in enumerate(run["phase_names"]) if name.lower().startswith(GRIP_PHASE_PREFIX)]
+    grip_s = np.zeros(starts.size)
+    if grip_codes:
+        grip_mask = np.isin(run["phase"], grip_codes)
+        segment = np.repeat(np.arange(starts.size), counts)
+        g_seg, g_t = segment[grip_mask], t[grip_mask]
+        if g_seg.size:
+            first = np.full(starts.size, np.inf)
+            last = np.full(starts.size, -np.inf)
+            np.minimum.at(first, g_seg, g_t)
+            np.maximum.at(last, g_seg, g_t)
+            has_grip = np.isfinite(first)
+            grip_s[has_grip] = last[has_grip] - first[has_grip]
+
+    return {"cycle": cycle[starts], "peak": peak.astype(np.float64), "mean": mean, "grip_s": grip_s}
+
+
+def run_aggregates(run: Dict[str, np.ndarray]) -> Dict:
+    force = run["force"]
+    cycles = cycle_aggregates(run)
+    if force.size == 0:
+        return {"samples": 0, "cycles": 0, "peak": None, "mean": None,
+                **{f"p{p}": None for p in PERCENTILES}, "grip_s_mean": None, "per_cycle": cycles}
+    pct = np.percentile(force, PERCENTILES)
+    return {
+        "samples": int(force.size),
+        "cycles": int(cycles["cycle"].size),
+        "peak": round(float(force.max()), 3),
+        "mean": round(float(force.mean()), 3),
+        **{f"p{p}": round(float(v), 3) for p, v in zip(PERCENTILES, pct)},
+        "grip_s_mean": round(float(cycles["grip_s"].mean()), 3),
+        "per_cycle": cycles,
+    }
+
+
+@lru_cache(maxsize=1024)
+def cached_run_aggregates(path: str, version: str) -> Dict:
+    """Aggregates for one log; `version` (checksum or size) invalidates the entry when the log changes"""
+    return run_aggregates(load_run_arrays(path))
+
+
+def compare_runs(runs: Sequence[Dict], include_cycles: bool = False) -> Dict:
+    """
+    runs: [{"id", "filename", "created_at" (datetime), "path", "version"}] in chronological order.
+    Returns per-run aggregates and trend series with a linear drift estimate per day.
+    """
+    results: List[Dict] = []
+    for r in runs:
+        agg = cached_run_aggregates(r["path"], r["version"])
+        entry = {"id": r["id"], "filename": r["filename"], "created_at": r["created_at"].isoformat(),
+                 **{k: v for k, v in agg.items() if k != "per_cycle"}}
+        if include_cycles:
+            entry["per_cycle"] = {k: v.round(3).tolist() for k, v in agg["per_cycle"].items()}
+        results.append(entry)
+
+    valid = [r for r in results if r["samples"]]
+    trend: Dict[str, Optional[Dict]] = {}
+    if valid:
+        days = np.array([np.datetime64(r["created_at"]).astype("datetime64[s]").astype(np.int64)
+                         for r in valid], dtype=np.float64) / 86400.0
+        for key in ("peak", "mean", "p95", "grip_s_mean"):
+            series = np.array([r[key] for r in valid], dtype=np.float64)
+            slope = float(np.polyfit(days - days[0], series, 1)[0]) if len(valid) > 1 and np.ptp(days) > 0 else 0.0
+            trend[key] = {"series": series.round(3).tolist(), "drift_per_day": round(slope, 4)}
+    return {"runs": results, "trend": trend, "count": len(results)}
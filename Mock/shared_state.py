@@ -0,0 +1,376 @@
+"""
+Robot state shared between uvicorn worker processes.
+
+The live state (joints, gripper, force, material, mode) and the run flags are
+kept in a fixed binary layout inside a `multiprocessing.shared_memory`
+segment, so every worker can answer `/data` from its own process.
+
+Exactly one worker owns the control loop. It is elected with an exclusive
+file lock, creates the segment and is the only writer of the state fields;
+a seqlock lets readers in other processes take consistent snapshots without
+blocking it. Control commands received by other workers are forwarded to
+the owner over a local Unix socket (see ControlChannel).
+
+Before `start()` is called the state lives in a private buffer with the same
+layout, so single-process use (scripts, tests, benchmarks) needs no setup.
+"""
+
+import fcntl
+import functools
+import hashlib
+import json
+import os
+import socket
+import socketserver
+import struct
+import tempfile
+import threading
+import time
+import typing
+from contextlib import contextmanager
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+# (name, struct format, default). Strings are fixed-size and NUL padded.
+STATE_FIELDS = (
+    ("j1", "d", 0.0), ("j2", "d", 0.0), ("j3", "d", 0.0),
+    ("j4", "d", 0.0), ("j5", "d", 0.0), ("j6", "d", 0.0),
+    ("gripper_angle", "i", 180),          # 0=Bite, 180=Open
+    ("is_gripping", "?", False),
+    ("max_force_setting", "d", 5.0),
+    ("current_force", "d", 0.0),
+    ("detected_material", "32s", "Waiting..."),
+    ("confidence", "d", 0.0),
+    ("mode", "16s", "MANUAL"),            # MANUAL, AUTO, TEACHING
+    ("is_running", "?", False),
+    ("run_history_id", "i", 0),           # RunHistory id of the active auto run (0 = none)
+    ("run_cycle", "i", 0),                # Its current cycle, ahead of the database (write-behind)
+    ("sensor_force", "d", 0.0),           # Filtered load-cell force at telemetry rate (force_sensor.py)
+)
+# Run flags are single bytes written by any worker (a stop request may come
+# from anywhere), so they live outside the seqlock-protected block.
+FLAG_FIELDS = ("auto_run_active", "sequence_running", "replay_active")
+
+_HEADER = struct.Struct("<QiB" + "B" * len(FLAG_FIELDS))  # seq, owner pid, ready, flags
+_STATE = struct.Struct("<" + "".join(fmt for _, fmt, _ in STATE_FIELDS))
+_SEQ_OFFSET = 0
+_OWNER_OFFSET = 8
+_READY_OFFSET = 12
+_FLAG_OFFSET = {name: 13 + i for i, name in enumerate(FLAG_FIELDS)}
+_STATE_OFFSET = (_HEADER.size + 7) // 8 * 8
+SEGMENT_SIZE = _STATE_OFFSET + _STATE.size
+# A reader gives up on a segment that stays mid-update this long (owner died while writing)
+SEQLOCK_TIMEOUT = 0.5
+
+_FIELD_INDEX = {name: i for i, (name, _, _) in enumerate(STATE_FIELDS)}
+_STRING_FIELDS = {name: int(fmt[:-1]) for name, fmt, _ in STATE_FIELDS if fmt.endswith("s")}
+
+
+def _encode(name: str, value):
+    if name in _STRING_FIELDS:
+        return str(value).encode()[:_STRING_FIELDS[name]]
+    return value
+
+
+def _decode(values) -> Dict[str, Any]:
+    out = {}
+    for (name, _, _), value in zip(STATE_FIELDS, values):
+        out[name] = value.rstrip(b"\0").decode(errors="replace") if name in _STRING_FIELDS else value
+    return out
+
+
+@contextmanager
+def _untracked():
+    """
+    Keep segments away from multiprocessing's resource tracker. uvicorn workers
+    share one tracker, which would otherwise unlink the segment (or complain)
+    when any worker exits. The owner unlinks explicitly on shutdown, and a
+    segment left by a crashed owner is replaced by the next one.
+    """
+    register, unregister = resource_tracker.register, resource_tracker.unregister
+    resource_tracker.register = resource_tracker.unregister = lambda *args, **kwargs: None
+    try:
+        yield
+    finally:
+        resource_tracker.register, resource_tracker.unregister = register, unregister
+
+
+def deployment_id(base_dir: str) -> str:
+    """Short id for one backend installation, so separate deployments never share a segment"""
+    return hashlib.sha1(os.path.abspath(base_dir).encode()).hexdigest()[:12]
+
+
+class SharedRobotState:
+    """
+    Attribute-style access to the shared state, e.g. `state.j1 = 10.0`.
+    Use update(**fields) for changes that must be seen together and
+    snapshot() for a consistent read of every field.
+    """
+
+    def __init__(self):
+        buf = bytearray(SEGMENT_SIZE)
+        object.__setattr__(self, "_shm", None)
+        object.__setattr__(self, "_buf", memoryview(buf))
+        object.__setattr__(self, "_write_lock", threading.Lock())
+        object.__setattr__(self, "_last_good", None)  # Last consistent read, fallback for a stuck segment
+        object.__setattr__(self, "_lock_file", None)
+        object.__setattr__(self, "is_owner", True)  # Private buffer: this process does everything
+        self._write_state({name: default for name, _, default in STATE_FIELDS})
+
+    # --- Lifecycle ---
+    def start(self, deployment: str, attach_timeout: float = 15.0) -> bool:
+        """
+        Elect the control owner and move the state into shared memory.
+        Returns True if this process owns the control loop.
+        """
+        lock_file = open(_runtime_path(deployment, "lock"), "a+")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            owner = True
+        except OSError:
+            lock_file.close()
+            owner = False
+
+        name = f"robot_state_{deployment}"
+        if owner:
+            with _untracked():
+                try:
+                    shm = shared_memory.SharedMemory(name=name, create=True, size=SEGMENT_SIZE)
+                except FileExistsError:
+                    # Left behind by an owner that crashed; nobody else can be using it while we hold the lock
+                    stale = shared_memory.SharedMemory(name=name)
+                    stale.close()
+                    stale.unlink()
+                    shm = shared_memory.SharedMemory(name=name, create=True, size=SEGMENT_SIZE)
+            shm.buf[:SEGMENT_SIZE] = self._buf[:SEGMENT_SIZE]  # Carry over anything set before start()
+            object.__setattr__(self, "_lock_file", lock_file)
+        else:
+            shm = self._attach(name, attach_timeout)
+
+        object.__setattr__(self, "_shm", shm)
+        object.__setattr__(self, "_buf", shm.buf)
+        object.__setattr__(self, "is_owner", owner)
+        return owner
+
+    @staticmethod
+    def _attach(name: str, timeout: float) -> shared_memory.SharedMemory:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                with _untracked():
+                    shm = shared_memory.SharedMemory(name=name)
+                break
+            except FileNotFoundError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError("Control worker did not create the shared state segment")
+                time.sleep(0.05)
+        while shm.buf[_READY_OFFSET] == 0:
+            if time.monotonic() > deadline:
+                raise RuntimeError("Control worker did not finish starting")
+            time.sleep(0.05)
+        return shm
+
+    def mark_ready(self):
+        """Owner: initialisation done, other workers may start serving"""
+        struct.pack_into("<i", self._buf, _OWNER_OFFSET, os.getpid())
+        self._buf[_READY_OFFSET] = 1
+
+    def stop(self):
+        shm = self._shm
+        if shm is None:
+            return
+        snapshot = bytes(self._buf[:SEGMENT_SIZE])
+        object.__setattr__(self, "_buf", memoryview(bytearray(snapshot)))
+        object.__setattr__(self, "_shm", None)
+        shm.close()
+        if self.is_owner:
+            with _untracked():
+                shm.unlink()
+            if self._lock_file:
+                self._lock_file.close()
+                object.__setattr__(self, "_lock_file", None)
+
+    @property
+    def owner_pid(self) -> int:
+        return struct.unpack_from("<i", self._buf, _OWNER_OFFSET)[0]
+
+    # --- Seqlock ---
+    def _write_state(self, changes: Dict[str, Any]):
+        with self._write_lock:
+            buf = self._buf
+            seq = struct.unpack_from("<Q", buf, _SEQ_OFFSET)[0]
+            struct.pack_into("<Q", buf, _SEQ_OFFSET, seq + 1)  # Odd: write in progress
+            values = list(_STATE.unpack_from(buf, _STATE_OFFSET))
+            for name, value in changes.items():
+                values[_FIELD_INDEX[name]] = _encode(name, value)
+            _STATE.pack_into(buf, _STATE_OFFSET, *values)
+            struct.pack_into("<Q", buf, _SEQ_OFFSET, seq + 2)
+
+    def _read_state(self):
+        buf = self._buf
+        if self.is_owner:
+            # The writer lives in this process: take its lock instead of spinning against it
+            with self._write_lock:
+                return _STATE.unpack_from(buf, _STATE_OFFSET)
+        deadline = None
+        delay = 0.0
+        while True:
+            seq = struct.unpack_from("<Q", buf, _SEQ_OFFSET)[0]
+            if not seq & 1:
+                values = _STATE.unpack_from(buf, _STATE_OFFSET)
+                if struct.unpack_from("<Q", buf, _SEQ_OFFSET)[0] == seq:
+                    object.__setattr__(self, "_last_good", values)
+                    return values
+            # Writer mid-update: yield so it can finish, backing off if it takes long
+            if deadline is None:
+                deadline = time.monotonic() + SEQLOCK_TIMEOUT
+            elif time.monotonic() > deadline:
+                break
+            time.sleep(delay)
+            delay = min(0.001, delay * 2 or 0.00001)
+        # Owner died mid-update: never hand out a torn state
+        if self._last_good is not None:
+            return self._last_good
+        raise RuntimeError("Shared robot state is stuck mid-update (control worker died?)")
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Consistent copy of every state field and flag"""
+        out = _decode(self._read_state())
+        for name in FLAG_FIELDS:
+            out[name] = bool(self._buf[_FLAG_OFFSET[name]])
+        return out
+
+    def update(self, **fields):
+        """Write several fields as one change (readers never see half of it)"""
+        flags = {k: fields.pop(k) for k in FLAG_FIELDS if k in fields}
+        for name, value in flags.items():
+            self._buf[_FLAG_OFFSET[name]] = 1 if value else 0
+        if fields:
+            unknown = set(fields) - set(_FIELD_INDEX)
+            if unknown:
+                raise AttributeError(f"Unknown state field(s): {', '.join(sorted(unknown))}")
+            self._write_state(fields)
+
+    def __getattr__(self, name):
+        if name in _FLAG_OFFSET:
+            return bool(self._buf[_FLAG_OFFSET[name]])
+        if name in _FIELD_INDEX:
+            value = self._read_state()[_FIELD_INDEX[name]]
+            return value.rstrip(b"\0").decode(errors="replace") if name in _STRING_FIELDS else value
+        raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self.update(**{name: value})
+
+
+class ControlChannel:
+    """
+    Forwards control commands from non-owner workers to the owner.
+
+    Endpoints decorated with `command` run locally in the owner; any other
+    worker sends the call (JSON over a Unix socket) and relays the result or
+    the HTTPException raised by the owner.
+
+    `on_command(name, body, origin)`, if set, is called in the owner before
+    every command runs; `origin()` describes the caller (e.g. client address)
+    and travels with forwarded commands.
+    """
+
+    def __init__(self, state: SharedRobotState):
+        self.state = state
+        self.socket_path: Optional[str] = None
+        self.commands: Dict[str, Callable] = {}
+        self.on_command: Optional[Callable[[str, Dict[str, Any], Dict[str, Any]], None]] = None
+        self.origin: Callable[[], Dict[str, Any]] = dict
+        self._server: Optional[socketserver.ThreadingUnixStreamServer] = None
+
+    def command(self, fn: Callable) -> Callable:
+        self.commands[fn.__name__] = fn
+
+        @functools.wraps(fn)
+        def endpoint(**kwargs):
+            origin = {**self.origin(), "pid": os.getpid()}
+            if self.state.is_owner:
+                if self.on_command is not None:
+                    self.on_command(fn.__name__, _json_body(kwargs), origin)
+                return fn(**kwargs)
+            return self.forward(fn.__name__, _json_body(kwargs), origin)
+        return endpoint
+
+    def forward(self, name: str, body: Dict[str, Any], origin: Optional[Dict[str, Any]] = None):
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+                s.settimeout(10)
+                s.connect(self.socket_path)
+                s.sendall(json.dumps({"command": name, "body": body, "origin": origin or {}}).encode() + b"\n")
+                reply = json.loads(s.makefile("rb").readline())
+        except (OSError, ValueError):
+            raise HTTPException(status_code=503, detail="Control worker unavailable")
+        if reply["status"] != 200:
+            raise HTTPException(status_code=reply["status"], detail=reply["detail"])
+        return reply["body"]
+
+    def _execute(self, name: str, body: Dict[str, Any], origin: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        fn = self.commands.get(name)
+        if fn is None:
+            return {"status": 404, "detail": f"Unknown command: {name}"}
+        if self.on_command is not None:
+            self.on_command(name, body, origin or {})
+        hints = typing.get_type_hints(fn)
+        kwargs = {}
+        for key, value in body.items():
+            hint = hints.get(key)
+            if isinstance(hint, type) and issubclass(hint, BaseModel):
+                value = hint.model_validate(value)
+            kwargs[key] = value
+        try:
+            return {"status": 200, "body": fn(**kwargs)}
+        except HTTPException as e:
+            return {"status": e.status_code, "detail": e.detail}
+        except Exception as e:
+            return {"status": 500, "detail": str(e)}
+
+    def serve(self, socket_path: str):
+        """Owner: accept forwarded commands in a background thread"""
+        channel = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                request = json.loads(self.rfile.readline())
+                reply = channel._execute(request["command"], request.get("body") or {}, request.get("origin"))
+                self.wfile.write(json.dumps(reply, default=str).encode() + b"\n")
+
+        if os.path.exists(socket_path):
+            os.remove(socket_path)  # Stale socket from a previous owner
+        self._server = socketserver.ThreadingUnixStreamServer(socket_path, Handler)
+        self._server.daemon_threads = True
+        self.socket_path = socket_path
+        threading.Thread(target=self._server.serve_forever, name="control-channel", daemon=True).start()
+
+    def connect(self, socket_path: str):
+        """Non-owner: where to forward commands"""
+        self.socket_path = socket_path
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            if self.socket_path and os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+
+def _json_body(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v.model_dump(mode="json") if isinstance(v, BaseModel) else v for k, v in kwargs.items()}
+
+
+def _runtime_path(deployment: str, kind: str) -> str:
+    # AF_UNIX paths are limited to ~100 bytes, so keep these out of the project directory
+    return os.path.join(tempfile.gettempdir(), f"robot_control_{deployment}.{kind}")
+
+
+def socket_path_for(deployment: str) -> str:
+    return _runtime_path(deployment, "sock")
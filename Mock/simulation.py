@@ -1,17 +1,43 @@
-import uvicorn
 import threading
 import time
-import random
 import os
+import sys
 import csv
+import gzip
+import hashlib
+import re
+import shutil
 import logging
-from datetime import datetime
-from typing import List, Optional, Dict
-from fastapi import FastAPI, Depends, HTTPException
-from fastapi.responses import HTMLResponse, FileResponse, JSONResponse
+import uuid
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import List, Optional, Dict, Tuple
+from fastapi import FastAPI, Depends, HTTPException, Query, Request
+from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from sqlmodel import SQLModel, Field, Session, select, create_engine, Relationship, delete
+from sqlalchemy import text, insert as sa_insert, update as sa_update
+from sqlalchemy.exc import IntegrityError, OperationalError
 from pydantic import BaseModel, ConfigDict
+from motion import JOINT_NAMES, POSE_NAMES, TICK_INTERVAL, BlendedPath, joints_from, plan_moves, split_move_runs
+from log_query import LogFilter, query_logs, scan_log
+from log_replay import LogReplay
+from material_classifier import MaterialClassifier
+from compression import CompressionMiddleware, compress, negotiate
+from command_mailbox import CommandMailbox
+import run_checkpoint
+from run_checkpoint import RunCheckpoint
+from progress_store import WriteBehindStore
+from force_sensor import LOG_RATE_HZ, TELEMETRY_RATE_HZ, ForceSensorPipeline, History, SimulatedLoadCell
+from what_if import (MATERIALS, MAX_COMBINATIONS, MAX_CYCLES, MAX_SPEED, MIN_SPEED, WhatIfJob,
+                     calculate_realistic_force, expand_grid)
+from event_journal import KINDS as JOURNAL_KINDS, EventJournal, RequestOriginMiddleware, request_origin
+from profiling import DEFAULT_PROFILE_THREADS, MAX_PROFILE_SECONDS, RequestTimings, SamplingProfiler, TimingMiddleware
+from robot_driver import DriverError, RobotDriver, SimulatorDriver, create_driver
+from shared_state import ControlChannel, SharedRobotState, deployment_id, socket_path_for
+from teach_recorder import DEFAULT_TOLERANCE, RECORD_RATE_HZ, TeachRecorder
+from pattern_analysis import (GRIP_RAMP_STEPS, GRIP_RAMP_INTERVAL, RELEASE_DWELL, MOVE_ACTIONS, analyze_steps,
+                              compile_steps, estimate_run, numpy_checks)
 
 # ==========================================
 # 1. SETUP & CONFIG
@@ -21,6 +47,25 @@ LOG_DIR = "logs"
 if not os.path.exists(LOG_DIR):
     os.makedirs(LOG_DIR)
 
+# Log retention (days, 0 = never). Finished logs are gzipped after
+# LOG_COMPRESS_AFTER_DAYS and, only if opted in, deleted after LOG_RETENTION_DAYS.
+LOG_COMPRESS_AFTER_DAYS = float(os.environ.get("ROBOT_LOG_COMPRESS_AFTER_DAYS", 7))
+LOG_RETENTION_DAYS = float(os.environ.get("ROBOT_LOG_RETENTION_DAYS", 0))
+LOG_HOUSEKEEPING_INTERVAL = 3600  # Seconds between retention passes while the server runs
+# Compressed copies of finished logs, keyed by checksum (built on first download)
+LOG_CACHE_DIR = os.path.join(LOG_DIR, ".compressed")
+# Auto-run progress checkpoints (one per unfinished run, see run_checkpoint.py)
+CHECKPOINT_DIR = os.path.join(LOG_DIR, ".checkpoints")
+# Robot backend: "sim" (default), "loopback" (fake controller for testing),
+# "tcp://host:port" or "serial:///dev/ttyUSB0?baud=115200"
+ROBOT_DRIVER = os.environ.get("ROBOT_DRIVER", "sim")
+# High-rate force sensor: "" (none) or "sim" (simulated 1 kHz load cell), and the filter
+# whose output reaches the dashboard: lowpass, kalman, average or raw
+ROBOT_FORCE_SENSOR = os.environ.get("ROBOT_FORCE_SENSOR", "")
+ROBOT_FORCE_FILTER = os.environ.get("ROBOT_FORCE_FILTER", "lowpass")
+LOG_HEADER = ["Timestamp", "Cycle", "Phase", "Force_N", "Material", "Confidence", "J1", "J2", "J3", "Gripper",
+              "J4", "J5", "J6", "X_mm", "Y_mm", "Z_mm", "Roll", "Pitch", "Yaw", "Sensor_Force_N"]
+
 sqlite_file_name = "robot_arm_system.db"
 sqlite_url = f"sqlite:///{sqlite_file_name}"
 engine = create_engine(sqlite_url, echo=False)
@@ -46,6 +91,13 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Negotiated gzip/br/zstd for responses over 1 KB (pattern sync, history, logs)
+app.add_middleware(CompressionMiddleware)
+# Client address / X-Operator of each request, recorded with journaled commands
+app.add_middleware(RequestOriginMiddleware)
+# Outermost, so the timing includes compression (slow requests: ROBOT_SLOW_REQUEST_MS)
+request_timings = RequestTimings()
+app.add_middleware(TimingMiddleware, timings=request_timings)
 
 def get_session():
     with Session(engine) as session:
@@ -56,15 +108,17 @@ def get_session():
 # ==========================================
 class TeachingPatterns(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    name: str
+    name: str = Field(index=True)  # Sync matches patterns by name when the app has no id
+    description: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.now)
+    revision: int = 0  # bumped whenever the steps change (cache key for analysis)
     steps: List["PatternSteps"] = Relationship(back_populates="pattern")
 
 class PatternSteps(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     pattern_id: Optional[int] = Field(default=None, foreign_key="teachingpatterns.id")
     sequence_order: int
-    action_type: str  # 'move_joints', 'grip', 'release', 'wait'
+    action_type: str  # 'move_joints', 'move_cartesian', 'grip', 'release', 'wait'
     
     # Joint Angles
     j1: float = 0.0
@@ -74,6 +128,14 @@ class PatternSteps(SQLModel, table=True):
     j5: float = 0.0
     j6: float = 0.0
     
+    # Tool-tip target of move_cartesian steps (mm / degrees; no roll/pitch/yaw = any orientation)
+    x: Optional[float] = None
+    y: Optional[float] = None
+    z: Optional[float] = None
+    roll: Optional[float] = None
+    pitch: Optional[float] = None
+    yaw: Optional[float] = None
+
     # Gripper Settings for this step
     gripper_angle: int = 0
     wait_time: float = 0.0
@@ -88,44 +150,186 @@ class RunHistory(SQLModel, table=True):
     cycle_target: int
     cycle_completed: int = 0
     max_force: float
-    status: str  # "Running", "Completed", "Stopped"
+    status: str  # "Running", "Completed", "Stopped", "Interrupted" (backend or controller went down mid-run, resumable)
     created_at: datetime = Field(default_factory=datetime.now)
+    log_expired: bool = False  # The log was deleted by the retention policy; the summary stays
+
+class LogFile(SQLModel, table=True):
+    """Catalog of run logs so listings and downloads never have to scan logs/"""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    filename: str = Field(index=True, unique=True)  # Name shown to the app (always *.csv)
+    stored_name: str                                 # Actual file in LOG_DIR (*.csv or *.csv.gz)
+    status: str = "open"                             # "open" while the run writes, then "closed"
+    compressed: bool = False
+    size_bytes: int = 0                              # Uncompressed CSV size
+    stored_bytes: int = 0                            # Size on disk
+    row_count: int = 0                               # Data rows (header excluded)
+    started_at: Optional[datetime] = None
+    ended_at: Optional[datetime] = None
+    checksum: Optional[str] = None                   # sha256 of the uncompressed CSV
+    created_at: datetime = Field(default_factory=datetime.now)
+
+class LogNameCounter(SQLModel, table=True):
+    """Next free numeric suffix per requested log name (run_data -> run_data_1, ...)"""
+    base_name: str = Field(primary_key=True)
+    next_suffix: int = 0
 
 # ==========================================
 # 3. GLOBAL STATE & LOGIC
 # ==========================================
-class RobotState(BaseModel):
-    # Joints
-    j1: float = 0.0
-    j2: float = 0.0
-    j3: float = 0.0
-    j4: float = 0.0
-    j5: float = 0.0
-    j6: float = 0.0
-    
-    # Gripper Logic
-    gripper_angle: int = 180    # 0=Bite, 180=Open (Example)
-    is_gripping: bool = False   # True when executing Grip logic
-    max_force_setting: float = 5.0 
-    current_force: float = 0.0
-    
-    # Material Logic (Derived from MaxForce as user requested)
-    detected_material: str = "Waiting..."
-    confidence: float = 0.0
-    
-    # System Status
-    mode: str = "MANUAL" # MANUAL, AUTO, TEACHING
-    is_running: bool = False
-
-current_state = RobotState()
+# Live state and run flags (auto_run_active, sequence_running) live in shared
+# memory so several uvicorn workers can serve reads; one worker owns control.
+current_state = SharedRobotState()
+control = ControlChannel(current_state)
+# Executors send setpoints through the driver; replaced at startup per ROBOT_DRIVER
+driver: RobotDriver = SimulatorDriver(current_state)
+material_model: Optional[MaterialClassifier] = None  # Loaded once at startup
+force_pipeline: Optional[ForceSensorPipeline] = None  # With ROBOT_FORCE_SENSOR (control owner only)
+force_history: Optional[History] = None
+load_cell: Optional[SimulatedLoadCell] = None
+profiler = SamplingProfiler()  # Idle until /api/admin/profile starts it
+auto_run_worker: Optional[threading.Thread] = None
+shutdown_requested = threading.Event()  # Runs cut short by a shutdown stay resumable
+driver_lost = threading.Event()  # Same for runs cut short by a lost controller connection
+# Audit trail of commands, run steps and state changes (written by the control owner)
+journal = EventJournal(read_state=current_state.snapshot)
+control.origin = request_origin.get
 # Removed unused legacy globals: teaching_buffer, current_editing_pattern_id, pattern_buffers 
-auto_run_active = False
-sequence_running = False
+
+# Columns added after the first release: (table, column, DDL).
+# create_all only creates missing tables, so existing databases are altered in place.
+SCHEMA_ADDITIONS = [
+    ("teachingpatterns", "revision", "INTEGER NOT NULL DEFAULT 0"),
+    *(("patternsteps", name, "REAL") for name in ("x", "y", "z", "roll", "pitch", "yaw")),
+    ("teachingpatterns", "description", "TEXT"),
+    ("runhistory", "log_expired", "BOOLEAN NOT NULL DEFAULT 0"),
+]
+# Indexes added after the first release: (name, table, columns). Single-column ones are
+# named as create_all names them; see `generate_er_diagram.py --advise` for the others.
+SCHEMA_INDEXES = [
+    ("ix_teachingpatterns_name", "teachingpatterns", "name"),
+    ("ix_patternsteps_pattern_id_sequence_order", "patternsteps", "pattern_id, sequence_order"),
+    ("ix_runhistory_pattern_id_created_at", "runhistory", "pattern_id, created_at"),
+    ("ix_runhistory_status_created_at", "runhistory", "status, created_at"),
+]
+# Full-text index over pattern names and descriptions (SQLite FTS5, external content),
+# kept in sync with teachingpatterns by triggers
+PATTERN_SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE pattern_search USING fts5("
+    "name, description, content='teachingpatterns', content_rowid='id', prefix='2 3')",
+    "CREATE TRIGGER pattern_search_ai AFTER INSERT ON teachingpatterns BEGIN "
+    "INSERT INTO pattern_search(rowid, name, description) VALUES (new.id, new.name, new.description); END",
+    "CREATE TRIGGER pattern_search_ad AFTER DELETE ON teachingpatterns BEGIN "
+    "INSERT INTO pattern_search(pattern_search, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); END",
+    "CREATE TRIGGER pattern_search_au AFTER UPDATE OF name, description ON teachingpatterns BEGIN "
+    "INSERT INTO pattern_search(pattern_search, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); "
+    "INSERT INTO pattern_search(rowid, name, description) VALUES (new.id, new.name, new.description); END",
+    "INSERT INTO pattern_search(pattern_search) VALUES ('rebuild')",
+]
+pattern_fts = False  # FTS5 available (some SQLite builds lack it: search falls back to LIKE)
+
+def migrate_schema():
+    with engine.begin() as conn:
+        for table, column, ddl in SCHEMA_ADDITIONS:
+            columns = {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})")}
+            if columns and column not in columns:
+                conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+                print(f"✅ Migrated: {table}.{column}")
+        for index, table, columns in SCHEMA_INDEXES:
+            conn.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS {index} ON {table} ({columns})")
+    ensure_pattern_search()
+
+def ensure_pattern_search():
+    global pattern_fts
+    with engine.begin() as conn:
+        if conn.exec_driver_sql("SELECT 1 FROM sqlite_master WHERE name = 'pattern_search'").first():
+            pattern_fts = True
+            return
+    try:
+        with engine.begin() as conn:
+            for ddl in PATTERN_SEARCH_DDL:
+                conn.exec_driver_sql(ddl)
+        pattern_fts = True
+        print("✅ Pattern search index built")
+    except OperationalError as e:
+        print(f"⚠️ Pattern search without full-text index: {e}")
+
+def write_run_progress(changes: Dict[int, dict]):
+    with Session(engine) as session:
+        for history_id, fields in changes.items():
+            session.execute(sa_update(RunHistory).where(RunHistory.id == history_id).values(**fields))
+        session.commit()
+
+# RunHistory progress is written behind the run (coalesced, off the control thread)
+run_progress = WriteBehindStore(write_run_progress)
+
+@lru_cache(maxsize=1)
+def journaled_commands() -> frozenset:
+    """Commands behind POST/PUT/DELETE routes (status polls are not worth an audit record)"""
+    return frozenset(route.endpoint.__name__ for route in app.routes
+                     if getattr(route, "methods", None) and route.methods - {"GET", "HEAD"})
+
+def journal_command(name: str, body: dict, origin: dict):
+    if name in journaled_commands():
+        journal.record("command", name=name, args=body, **origin)
+
+def checkpoint_path(history_id: int) -> str:
+    return os.path.join(CHECKPOINT_DIR, f"run_{history_id}.ckpt")
+
+def mark_interrupted_runs():
+    """Runs still "Running" at startup were cut short by a crash: offer them for resume"""
+    with Session(engine) as session:
+        stale = session.exec(select(RunHistory).where(RunHistory.status == "Running")).all()
+        for h in stale:
+            h.status = "Interrupted"
+            checkpoint = run_checkpoint.load(checkpoint_path(h.id))
+            if checkpoint:  # Progress not flushed before the crash
+                h.cycle_completed = max(h.cycle_completed, checkpoint["cycle"] + 1)
+            session.add(h)
+        session.commit()
+        interrupted = session.exec(select(RunHistory).where(RunHistory.status == "Interrupted")).all()
+        for h in interrupted:
+            checkpoint = run_checkpoint.load(checkpoint_path(h.id))
+            if checkpoint:
+                print(f"⏸️ Interrupted run {h.id} ({h.pattern_name}, {h.filename}) can resume at cycle "
+                      f"{checkpoint['cycle'] + 1}/{h.cycle_target}: POST /auto-run/resume/{h.id}")
+
+def background_init():
+    """Startup work that no request has to wait for, then periodic log retention"""
+    try:
+        sync_log_catalog()
+        apply_log_retention()
+        for name in os.listdir(STATIC_DIR):
+            load_static_asset(name)
+        # Import numpy here rather than in the first /data request or pre-flight check
+        tool_pose_function()
+        numpy_checks()
+    except Exception as e:
+        print(f"⚠️ Background init failed: {e}")
+    while not shutdown_requested.wait(LOG_HOUSEKEEPING_INTERVAL):
+        try:
+            apply_log_retention()
+        except Exception as e:
+            print(f"⚠️ Log retention failed: {e}")
 
 @app.on_event("startup")
 def startup_db():
+    # With several workers, the first to take the lock owns the control loop
+    # and the database setup; the others only read state and forward commands.
+    deployment = deployment_id(os.getcwd())
+    if not current_state.start(deployment):
+        control.connect(socket_path_for(deployment))
+        print(f"✅ Worker {os.getpid()} attached (control owner: {current_state.owner_pid})")
+        return
+
     SQLModel.metadata.create_all(engine)
+    migrate_schema()
     print("✅ Database initialized")
+    mark_interrupted_runs()
+    # Everything else warms up in the background so the server answers immediately
+    threading.Thread(target=background_init, name="housekeeping", daemon=True).start()
     
     # Auto-create default pattern if none exist
     with Session(engine) as session:
@@ -137,69 +341,298 @@ def startup_db():
             session.refresh(default_pattern)
             print(f"✅ Created default pattern (ID: {default_pattern.id})")
 
+    start_driver()
+    start_force_sensor()
+    mailbox.start()
+    run_progress.start()
+    journal.start()
+    control.on_command = journal_command
+    control.serve(socket_path_for(deployment))
+    current_state.mark_ready()
+
+@app.on_event("shutdown")
+def shutdown_state():
+    if current_state.is_owner:
+        # The run flags are shared: a reader worker going away must not stop the owner's runs
+        shutdown_requested.set()
+        current_state.update(auto_run_active=False, sequence_running=False, replay_active=False)
+    if auto_run_worker is not None:
+        auto_run_worker.join(timeout=5)  # Let the run record its checkpoint and status
+    run_progress.stop()  # Final flush
+    journal.stop()
+    for job in what_if_jobs.values():
+        job.cancel()
+    control.close()
+    if recorder is not None:
+        recorder.stop()
+    profiler.stop()
+    mailbox.stop()
+    if load_cell is not None:
+        load_cell.stop()
+    driver.stop()
+    current_state.stop()
+
 # --- Helper Functions ---
-# ... (determine_material_from_force, calculate_realistic_force, log_data_row kept as is) ...
+def apply_driver_feedback(sensors: dict):
+    """Mirror measured controller values into the live state (measurements win over simulated force)"""
+    if current_state.replay_active:
+        return  # The dashboard is showing a recorded run
+    current_state.update(**{name: sensors[name] for name in JOINT_NAMES},
+                         gripper_angle=sensors["gripper_angle"], current_force=sensors["force"])
+
+def on_driver_lost(error: DriverError):
+    """Controller connection lost (driver thread): stop the runs, the driver reconnects on its own"""
+    driver_lost.set()
+    current_state.update(auto_run_active=False, sequence_running=False)
+    journal.record("event", name="driver_lost", error=str(error))
+
+def start_force_sensor():
+    global force_pipeline, force_history, load_cell
+    if not ROBOT_FORCE_SENSOR:
+        return
+    if ROBOT_FORCE_SENSOR != "sim":
+        raise ValueError(f"Unknown ROBOT_FORCE_SENSOR '{ROBOT_FORCE_SENSOR}' (expected 'sim')")
+    force_pipeline = ForceSensorPipeline(primary=ROBOT_FORCE_FILTER)
+    force_history = History(LOG_RATE_HZ)
+    force_pipeline.add_output(TELEMETRY_RATE_HZ, lambda t, value: setattr(current_state, "sensor_force", value))
+    force_pipeline.add_output(LOG_RATE_HZ, force_history.append)
+    # The simulated force is the ground truth the load cell measures
+    load_cell = SimulatedLoadCell(lambda: current_state.current_force, force_pipeline.rate_hz)
+    load_cell.start(force_pipeline)
+    print(f"✅ Force sensor: simulated, {force_pipeline.rate_hz:.0f} Hz, {ROBOT_FORCE_FILTER} filter")
+
+def start_driver():
+    global driver
+    driver = create_driver(ROBOT_DRIVER, current_state, on_feedback=apply_driver_feedback,
+                           on_disconnect=on_driver_lost)
+    driver.start()  # A configured controller that cannot be reached fails startup
+    print(f"✅ Robot driver: {driver.describe()}")
+
+def get_material_model() -> MaterialClassifier:
+    global material_model
+    if material_model is None:
+        material_model = MaterialClassifier.load()
+        print(f"✅ Material model loaded ({', '.join(material_model.classes)})")
+    return material_model
 
 def determine_material_from_force(max_force: float):
-    if max_force >= 8.0:
-        return "Metal", random.uniform(90.0, 99.9)
-    elif max_force >= 4.0:
-        return "Wood", random.uniform(85.0, 95.0)
-    elif max_force > 0:
-        return "Sponge/Soft", random.uniform(80.0, 90.0)
-    else:
+    """Prior estimate from the force limit alone, before a grip curve has been measured"""
+    if max_force <= 0:
         return "Unknown", 0.0
+    return get_material_model().predict({"plateau": max_force})
 
-def calculate_realistic_force(angle: int, max_force_setting: float, material_type: str) -> float:
-    contact_ratio = 1.0 - (angle / 180.0)
-    if "Metal" in material_type:
-        stiffness, nonlinearity = 1.2, 2.5
-    elif "Wood" in material_type:
-        stiffness, nonlinearity = 1.0, 1.8
-    elif "Sponge" in material_type or "Soft" in material_type:
-        stiffness, nonlinearity = 0.7, 1.2
-    else:
-        stiffness, nonlinearity = 0.9, 1.5
-    
-    if angle > 135: angle_efficiency = 0.3
-    elif angle > 90: angle_efficiency = 0.8
-    elif angle > 45: angle_efficiency = 1.0
-    else: angle_efficiency = 0.9
-    
-    base_force = max_force_setting * (contact_ratio ** nonlinearity)
-    realistic_force = base_force * stiffness * angle_efficiency
-    noise = random.uniform(-0.15, 0.15)
-    realistic_force += noise
-    realistic_force = max(0.0, min(realistic_force, max_force_setting * 1.1))
-    if realistic_force < 0.2: realistic_force = 0.0
-    return round(realistic_force, 2)
+@lru_cache(maxsize=1)
+def tool_pose_function():
+    """kinematics.tool_pose_of, imported on first use (numpy is slow to import), or None without numpy"""
+    try:
+        from kinematics import tool_pose_of
+    except ImportError:  # numpy not installed: no tool pose in telemetry and logs
+        return None
+    return tool_pose_of
+
+def tool_pose(state: dict) -> Optional[dict]:
+    """Tool-tip pose (mm / degrees) for a state snapshot, or None without numpy"""
+    tool_pose_of = tool_pose_function()
+    if tool_pose_of is None:
+        return None
+    return dict(zip(POSE_NAMES, tool_pose_of([state[name] for name in JOINT_NAMES])))
 
 def log_data_row(filename: str, cycle: int, phase: str):
     """บันทึกข้อมูลลงไฟล์ CSV"""
     filepath = os.path.join(LOG_DIR, filename)
-    file_exists = os.path.isfile(filepath)
+    file_exists = os.path.isfile(filepath) and os.path.getsize(filepath) > 0
     
+    state = current_state.snapshot()
+    pose = tool_pose(state)
+    pose_cells = [f"{v:.1f}" for v in pose.values()] if pose else [""] * 6
     with open(filepath, mode='a', newline='') as f:
         writer = csv.writer(f)
         if not file_exists:
-            writer.writerow(["Timestamp", "Cycle", "Phase", "Force_N", "Material", "Confidence", "J1", "J2", "J3"])
+            writer.writerow(LOG_HEADER)
             
         writer.writerow([
             datetime.now().strftime("%H:%M:%S.%f")[:-3],
             cycle,
             phase,
-            f"{current_state.current_force:.2f}",
-            current_state.detected_material,
-            f"{current_state.confidence:.1f}",
-            f"{current_state.j1:.1f}",
-            f"{current_state.j2:.1f}",
-            f"{current_state.j3:.1f}"
+            f"{state['current_force']:.2f}",
+            state["detected_material"],
+            f"{state['confidence']:.1f}",
+            f"{state['j1']:.1f}",
+            f"{state['j2']:.1f}",
+            f"{state['j3']:.1f}",
+            state["gripper_angle"],
+            f"{state['j4']:.1f}",
+            f"{state['j5']:.1f}",
+            f"{state['j6']:.1f}",
+            *pose_cells,
+            # Filtered, decimated load cell force (empty without ROBOT_FORCE_SENSOR)
+            f"{state['sensor_force']:.2f}" if force_pipeline is not None else "",
         ])
 
-# Note: move_robot_smoothly removed in favor of shared move_robot_to_target defined later
+# --- Log Catalog ---
+def split_log_name(filename: str):
+    """'run_data_2.csv' -> ('run_data', 2); 'run_data.csv' -> ('run_data', 0)"""
+    stem = filename[:-4] if filename.endswith(".csv") else filename
+    match = re.match(r"^(.*)_(\d+)$", stem)
+    if match:
+        return match.group(1), int(match.group(2))
+    return stem, 0
+
+def _next_log_suffix(base_name: str) -> int:
+    # Single atomic statement: safe across threads, workers and processes
+    with engine.begin() as conn:
+        return conn.execute(text(
+            "INSERT INTO lognamecounter (base_name, next_suffix) VALUES (:b, 1) "
+            "ON CONFLICT(base_name) DO UPDATE SET next_suffix = next_suffix + 1 "
+            "RETURNING next_suffix"
+        ), {"b": base_name}).scalar_one() - 1
+
+def allocate_log_file(requested: str) -> str:
+    """
+    Reserve a unique log filename and create the file with its header.
+    Names follow the legacy scheme (name.csv, name_1.csv, name_2.csv, ...)
+    but come from a counter instead of probing the disk one name at a time.
+    """
+    if not requested or requested.strip() == "":
+        requested = "run_data.csv"
+    requested = os.path.basename(requested.strip())
+    if not requested.endswith(".csv"):
+        requested += ".csv"
+    base_name = requested[:-4]
+
+    while True:
+        suffix = _next_log_suffix(base_name)
+        filename = f"{base_name}.csv" if suffix == 0 else f"{base_name}_{suffix}.csv"
+        try:
+            with Session(engine) as session:
+                session.add(LogFile(filename=filename, stored_name=filename, started_at=datetime.now()))
+                session.commit()
+        except IntegrityError:
+            continue  # Name registered outside the counter (e.g. imported legacy log)
+        try:
+            with open(os.path.join(LOG_DIR, filename), "x", newline="") as f:
+                csv.writer(f).writerow(LOG_HEADER)
+        except FileExistsError:
+            # Uncataloged file on disk: leave it alone and take the next name
+            with Session(engine) as session:
+                session.exec(delete(LogFile).where(LogFile.filename == filename))
+                session.commit()
+            continue
+        return filename
+
+def _scan_log(path: str):
+    """One streaming pass: (uncompressed size, data rows, sha256)"""
+    digest = hashlib.sha256()
+    size = 0
+    lines = 0
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+            size += len(chunk)
+            lines += chunk.count(b"\n")
+    return size, max(0, lines - 1), digest.hexdigest()
+
+def close_log_file(filename: str):
+    """Record final size, row count, time range and checksum once a run is over"""
+    with Session(engine) as session:
+        entry = session.exec(select(LogFile).where(LogFile.filename == filename)).first()
+        if not entry:
+            return
+        path = os.path.join(LOG_DIR, entry.stored_name)
+        if os.path.exists(path):
+            entry.size_bytes, entry.row_count, entry.checksum = _scan_log(path)
+            entry.stored_bytes = os.path.getsize(path)
+        entry.ended_at = datetime.now()
+        entry.status = "closed"
+        session.add(entry)
+        session.commit()
+
+def drop_compressed_log(checksum: Optional[str]):
+    """Remove cached compressed copies of a log (after deletion or archival)"""
+    if not checksum or not os.path.isdir(LOG_CACHE_DIR):
+        return
+    for name in os.listdir(LOG_CACHE_DIR):
+        if name.startswith(checksum + "."):
+            os.remove(os.path.join(LOG_CACHE_DIR, name))
+
+def compressed_log_path(entry: "LogFile", encoding: str) -> str:
+    """Compress a finished log once per encoding and reuse the file for later downloads"""
+    cached = os.path.join(LOG_CACHE_DIR, f"{entry.checksum}.{encoding}")
+    if not os.path.exists(cached):
+        os.makedirs(LOG_CACHE_DIR, exist_ok=True)
+        with open(os.path.join(LOG_DIR, entry.stored_name), "rb") as f:
+            packed = compress(f.read(), encoding)
+        tmp = f"{cached}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(packed)
+        os.replace(tmp, cached)  # Concurrent downloads race harmlessly to the same content
+    return cached
+
+def sync_log_catalog():
+    """Register log files that exist on disk but not in the catalog (e.g. legacy logs)"""
+    with Session(engine) as session:
+        known = set(session.exec(select(LogFile.stored_name)).all())
+    for name in sorted(os.listdir(LOG_DIR)):
+        if name in known or not (name.endswith(".csv") or name.endswith(".csv.gz")):
+            continue
+        path = os.path.join(LOG_DIR, name)
+        compressed = name.endswith(".gz")
+        filename = name[:-3] if compressed else name
+        size, rows, checksum = _scan_log(path)
+        mtime = datetime.fromtimestamp(os.path.getmtime(path))
+        try:
+            with Session(engine) as session:
+                session.add(LogFile(
+                    filename=filename, stored_name=name, status="closed", compressed=compressed,
+                    size_bytes=size, stored_bytes=os.path.getsize(path), row_count=rows,
+                    ended_at=mtime, checksum=checksum, created_at=mtime,
+                ))
+                # Keep the name counter ahead of every file already on disk
+                base_name, suffix = split_log_name(filename)
+                session.execute(text(
+                    "INSERT INTO lognamecounter (base_name, next_suffix) VALUES (:b, :n) "
+                    "ON CONFLICT(base_name) DO UPDATE SET next_suffix = MAX(next_suffix, :n)"
+                ), {"b": base_name, "n": suffix + 1})
+                session.commit()
+        except IntegrityError:
+            continue  # Registered meanwhile (a run just allocated this name)
+        print(f"📁 Cataloged existing log: {name}")
+
+def apply_log_retention():
+    """Compress and expire closed logs according to the retention settings"""
+    now = datetime.now()
+    with Session(engine) as session:
+        closed = session.exec(select(LogFile).where(LogFile.status == "closed")).all()
+        for entry in closed:
+            age_days = (now - (entry.ended_at or entry.created_at)).total_seconds() / 86400
+            path = os.path.join(LOG_DIR, entry.stored_name)
+            if LOG_RETENTION_DAYS and age_days > LOG_RETENTION_DAYS:
+                if os.path.exists(path):
+                    os.remove(path)
+                session.delete(entry)
+                drop_compressed_log(entry.checksum)
+                session.execute(sa_update(RunHistory).where(RunHistory.filename == entry.filename)
+                                .values(log_expired=True))
+                print(f"🗑️ Log expired: {entry.filename}")
+            elif LOG_COMPRESS_AFTER_DAYS and age_days > LOG_COMPRESS_AFTER_DAYS and not entry.compressed:
+                if not os.path.exists(path):
+                    continue
+                gz_name = entry.stored_name + ".gz"
+                with open(path, "rb") as src, gzip.open(os.path.join(LOG_DIR, gz_name), "wb") as dst:
+                    shutil.copyfileobj(src, dst)
+                os.remove(path)
+                entry.stored_name = gz_name
+                entry.compressed = True
+                entry.stored_bytes = os.path.getsize(os.path.join(LOG_DIR, gz_name))
+                session.add(entry)
+                drop_compressed_log(entry.checksum)  # The archive itself is served from now on
+                print(f"🗜️ Log compressed: {entry.filename}")
+        session.commit()
 
-def auto_run_thread_func(pattern_id: int, cycles: int, max_force: float, filename: str):
-    global current_state, auto_run_active
+def auto_run_thread_func(pattern_id: int, cycles: int, max_force: float, filename: str,
+                         blend_radius: Optional[float] = None, resume: Optional[dict] = None):
+    """resume: checkpoint of an interrupted run to continue (same history entry, same log)"""
     
     # 1. Setup Initial State
     current_state.max_force_setting = max_force
@@ -207,118 +640,156 @@ def auto_run_thread_func(pattern_id: int, cycles: int, max_force: float, filenam
     current_state.detected_material = mat_name
     current_state.confidence = conf
     
-    # Check Filename Duplication
-    if not filename or filename.strip() == "":
-        filename = f"run_data.csv"
-    if not filename.endswith(".csv"):
-        filename += ".csv"
-        
-    base_name, ext = os.path.splitext(filename)
-    counter = 1
-    while os.path.exists(os.path.join(LOG_DIR, filename)):
-        filename = f"{base_name}_{counter}{ext}"
-        counter += 1
-
     # Create History Entry
     history_id = None
     with Session(engine) as session:
         pattern = session.get(TeachingPatterns, pattern_id)
         if not pattern:
-            auto_run_active = False
+            current_state.auto_run_active = False
             return
-        
-        history = RunHistory(
-            filename=filename,
-            pattern_id=pattern_id,
-            pattern_name=pattern.name,
-            cycle_target=cycles,
-            max_force=max_force,
-            status="Running"
-        )
-        session.add(history)
-        session.commit()
-        session.refresh(history)
-        history_id = history.id
+
+        if resume:
+            history_id, filename = resume["history_id"], resume["filename"]
+            history = session.get(RunHistory, history_id)
+            history.status = "Running"
+            session.add(history)
+            session.commit()
+            # Rows logged after the checkpoint belong to the step that is repeated now
+            log_path = os.path.join(LOG_DIR, filename)
+            if os.path.getsize(log_path) > resume["log_offset"]:
+                os.truncate(log_path, resume["log_offset"])
+        else:
+            # Unique log file name (atomic, via the log catalog)
+            filename = allocate_log_file(filename)
+
+            history = RunHistory(
+                filename=filename,
+                pattern_id=pattern_id,
+                pattern_name=pattern.name,
+                cycle_target=cycles,
+                max_force=max_force,
+                status="Running"
+            )
+            session.add(history)
+            session.commit()
+            session.refresh(history)
+            history_id = history.id
+        checkpoint = RunCheckpoint(checkpoint_path(history_id), {
+            "history_id": history_id, "pattern_id": pattern_id, "revision": pattern.revision,
+            "cycles": cycles, "max_force": max_force, "blend_radius": blend_radius, "filename": filename,
+        })
+    log_path = os.path.join(LOG_DIR, filename)
 
     with Session(engine) as session:
         pattern = session.get(TeachingPatterns, pattern_id)
         if not pattern: 
-            auto_run_active = False
+            current_state.auto_run_active = False
             return
         
         current_state.mode = "AUTO"
         current_state.is_running = True
-        steps = sorted(pattern.steps, key=lambda x: x.sequence_order)
+        current_state.run_history_id = history_id
+        # move_cartesian targets are solved once here (cached), then run as joint moves
+        steps, _ = compile_steps(pattern_step_dicts(pattern.steps))
+        # Consecutive move steps are executed as one blended path
+        step_groups = split_move_runs(steps, lambda s: s["action_type"] in MOVE_ACTIONS)
         
-        print(f"--- Starting Auto Run: {pattern.name} | File: {filename} ---")
+        first_cycle, first_group = (resume["cycle"], resume["group"]) if resume else (0, 0)
+        journal.record("event", name="auto_run_resumed" if resume else "auto_run_started", run=history_id,
+                       pattern_id=pattern_id, pattern=pattern.name, cycles=cycles, max_force=max_force, file=filename)
+        if resume:
+            print(f"--- Resuming Auto Run: {pattern.name} | File: {filename} | "
+                  f"Cycle {first_cycle + 1}, step group {first_group + 1} ---")
+            if resume.get("gripping"):
+                # The interrupted step began with the part held
+                current_state.is_gripping = True
+                current_state.current_force = round(max_force, 2)
+                send_gripper(resume["gripper_angle"], max_force)
+        else:
+            print(f"--- Starting Auto Run: {pattern.name} | File: {filename} ---")
         
-        for cycle in range(cycles):
-            if not auto_run_active: break
+        for cycle in range(first_cycle, cycles):
+            if not current_state.auto_run_active: break
             print(f"Cycle {cycle + 1}/{cycles}")
             
-            # Update Cycle Count in DB
-            if history_id:
-                with Session(engine) as session:
-                    h = session.get(RunHistory, history_id)
-                    if h:
-                        h.cycle_completed = cycle + 1
-                        session.add(h)
-                        session.commit()
+            # Cycle count: live in shared state, written to the DB behind the run
+            current_state.run_cycle = cycle + 1
+            run_progress.update(history_id, cycle_completed=cycle + 1)
             
-            for step in steps:
-                if not auto_run_active: break
+            for group_index, (is_move, group) in enumerate(step_groups):
+                if not current_state.auto_run_active: break
+                if cycle == first_cycle and group_index < first_group:
+                    continue  # Done before the interruption
+                # Step boundary: one pwrite, so a crash loses at most the step in progress
+                checkpoint.save(cycle, group_index, os.path.getsize(log_path),
+                                gripping=current_state.is_gripping, gripper_angle=current_state.gripper_angle)
+                journal.record("step", run=history_id, cycle=cycle + 1, group=group_index,
+                               action=group[0]["action_type"], steps=len(group))
                 
-                # --- Action: MOVE ---
-                if step.action_type == "move_joints":
-                    # Action: MOVE
-                    targets = {
-                        "j1": step.j1, "j2": step.j2, "j3": step.j3,
-                        "j4": step.j4, "j5": step.j5, "j6": step.j6
-                    }
-                    move_robot_to_target(targets)
-                    log_data_row(filename, cycle+1, "Moving")
+                # --- Action: MOVE (run of consecutive waypoints) ---
+                if is_move:
+                    targets = [
+                        {**{name: s[name] for name in JOINT_NAMES},
+                         "duration": s["wait_time"]}  # move steps store their duration in wait_time
+                        for s in group
+                    ]
+                    move_robot_through(
+                        targets,
+                        blend_radius=blend_radius,
+                        on_waypoint=lambda _idx: log_data_row(filename, cycle+1, "Moving"),
+                    )
+                    continue
+
+                step = group[0]
                 
                 # --- Action: GRIP ---
-                elif step.action_type == "grip":
+                if step["action_type"] == "grip":
                     # EXACT Requirement: "Force equals Force Limit immediately, gradually rising"
                     current_state.is_gripping = True
                     target_angle = 0 # Force Close
                     start_angle = current_state.gripper_angle
                     
-                    ramp_steps = 20
+                    ramp_steps = GRIP_RAMP_STEPS
+                    curve = []  # (gripper angle, force) samples for the classifier
                     for i in range(ramp_steps):
-                        if not auto_run_active: break
+                        if not current_state.auto_run_active: break
                         
                         progress = (i + 1) / ramp_steps
                         
                         # Visual: Close gripper
                         current_angle = int(start_angle - (start_angle - target_angle) * progress)
-                        current_state.gripper_angle = max(0, current_angle)
+                        send_gripper(max(0, current_angle), max_force)
                         
                         # Force: Linear Ramp to Max Force
                         current_state.current_force = round(max_force * progress, 2)
+                        curve.append((current_state.gripper_angle, current_state.current_force))
                         
-                        time.sleep(0.05)
+                        time.sleep(GRIP_RAMP_INTERVAL)
                         log_data_row(filename, cycle+1, "Gripping")
                         
                     # Final Hold
                     current_state.current_force = round(max_force, 2)
+                    if curve:
+                        # Classify from the measured grip curve
+                        mat_name, conf = get_material_model().classify_curve(curve)
+                        current_state.detected_material = mat_name
+                        current_state.confidence = conf
                     log_data_row(filename, cycle+1, "Gripping (Hold)")
 
                 # --- Action: RELEASE ---
-                elif step.action_type == "release":
+                elif step["action_type"] == "release":
                     current_state.is_gripping = False
                     current_state.current_force = 0.0
-                    current_state.gripper_angle = 180 
-                    time.sleep(0.5)
+                    send_gripper(180, max_force)
+                    time.sleep(RELEASE_DWELL)
                     log_data_row(filename, cycle+1, "Release")
                     
                 # --- Action: WAIT ---
-                elif step.action_type == "wait":
-                    duration = step.wait_time
+                elif step["action_type"] == "wait":
+                    duration = step["wait_time"]
                     end_time = time.time() + duration
                     while time.time() < end_time:
-                        if not auto_run_active: break
+                        if not current_state.auto_run_active: break
                         time.sleep(0.05)
                     log_data_row(filename, cycle+1, "Waiting")
 
@@ -327,16 +798,25 @@ def auto_run_thread_func(pattern_id: int, cycles: int, max_force: float, filenam
         current_state.is_running = False
         
         # Finalize History Status
-        final_status = "Completed" if auto_run_active else "Stopped"
-        if history_id:
-            with Session(engine) as session:
-                h = session.get(RunHistory, history_id)
-                if h:
-                    h.status = final_status
-                    session.add(h)
-                    session.commit()
+        if current_state.auto_run_active:
+            final_status = "Completed"
+        elif shutdown_requested.is_set() or driver_lost.is_set():
+            final_status = "Interrupted"  # Keep the checkpoint and leave the log open
+        else:
+            final_status = "Stopped"
+        run_progress.update(history_id, status=final_status)
+        run_progress.flush()
+        journal.record("event", name="auto_run_finished", run=history_id, status=final_status)
+        current_state.update(run_history_id=0, run_cycle=0)
+
+        if final_status == "Interrupted":
+            checkpoint.close()
+            print(f"--- Auto Run Interrupted (resume with POST /auto-run/resume/{history_id}) ---")
+            return
+        checkpoint.remove()
+        close_log_file(filename)
 
-        auto_run_active = False
+        current_state.auto_run_active = False
         print("--- Auto Run Finished ---")
 
 # ==========================================
@@ -350,7 +830,7 @@ def health_check():
         # Quick DB check
         with Session(engine) as session:
             session.exec(select(TeachingPatterns)).first()
-        return {"status": "ok", "database": "reachable"}
+        return {"status": "ok", "database": "reachable", "driver": driver.describe()}
     except Exception as exc:  # pragma: no cover - diagnostics only
         return {"status": "degraded", "error": str(exc)}
 
@@ -360,32 +840,53 @@ def get_sensor_data():
     """
     คืนค่า JSON สำหรับหน้า Dashboard และ Auto Run Graph
     """
+    state = current_state.snapshot()  # One consistent read, from any worker
     # ถ้าไม่ได้ Run อยู่ ให้ Material เป็นค่าว่างหรือตาม Force ที่ค้าง
-    if not current_state.is_running and current_state.current_force < 0.5:
+    if not state["is_running"] and state["current_force"] < 0.5:
         mat = "Ready"
         conf = 0.0
     else:
-        mat = current_state.detected_material
-        conf = current_state.confidence
+        mat = state["detected_material"]
+        conf = state["confidence"]
 
     return {
         "timestamp": time.time(),
-        "joints": [current_state.j1, current_state.j2, current_state.j3, 
-                   current_state.j4, current_state.j5, current_state.j6],
+        "joints": [state["j1"], state["j2"], state["j3"],
+                   state["j4"], state["j5"], state["j6"]],
         # Individual joint values for easy access
-        "j1": round(current_state.j1, 2),
-        "j2": round(current_state.j2, 2),
-        "j3": round(current_state.j3, 2),
-        "j4": round(current_state.j4, 2),
-        "j5": round(current_state.j5, 2),
-        "j6": round(current_state.j6, 2),
-        "force": round(current_state.current_force, 2),
-        "max_force_setting": current_state.max_force_setting,
-        "gripper_angle": current_state.gripper_angle,
+        "j1": round(state["j1"], 2),
+        "j2": round(state["j2"], 2),
+        "j3": round(state["j3"], 2),
+        "j4": round(state["j4"], 2),
+        "j5": round(state["j5"], 2),
+        "j6": round(state["j6"], 2),
+        "force": round(state["current_force"], 2),
+        # Filtered high-rate measurement (None without a force sensor pipeline)
+        "sensor_force": round(state["sensor_force"], 2) if ROBOT_FORCE_SENSOR else None,
+        "max_force_setting": state["max_force_setting"],
+        "gripper_angle": state["gripper_angle"],
         "material": mat,
         "confidence": round(conf, 2),
-        "mode": current_state.mode,
-        "is_running": current_state.is_running
+        "mode": state["mode"],
+        "is_running": state["is_running"],
+        "tool": tool_pose(state),  # x/y/z mm, roll/pitch/yaw degrees (None without numpy)
+    }
+
+@app.get("/api/sensor/force")
+@control.command
+def force_sensor_data(seconds: float = 10.0):
+    """Filter outputs and the log-rate force history of the last `seconds`"""
+    if force_pipeline is None:
+        raise HTTPException(status_code=503, detail="No force sensor pipeline (set ROBOT_FORCE_SENSOR=sim)")
+    since = time.time() - max(0.0, min(seconds, force_history.capacity / LOG_RATE_HZ))
+    return {
+        "rate_hz": force_pipeline.rate_hz,
+        "filter": force_pipeline.primary,
+        "samples": force_pipeline.count,
+        "late_batches": load_cell.late if load_cell else 0,
+        "latest": force_pipeline.latest(),
+        "history_rate_hz": LOG_RATE_HZ,
+        "history": [[round(t, 3), round(v, 3)] for t, v in force_history.since(since)],
     }
 
 # --- 4.2 Manual Control ---
@@ -398,16 +899,13 @@ class ManualMoveRequest(BaseModel):
     j6: Optional[float] = None
 
 @app.post("/api/robot/manual-move")
+@control.command
 def manual_move(data: ManualMoveRequest):
-    if sequence_running or auto_run_active:
-        raise HTTPException(status_code=423, detail="System busy (Auto Run or Sequence Active)")
-
-    if data.j1 is not None: current_state.j1 = data.j1
-    if data.j2 is not None: current_state.j2 = data.j2
-    if data.j3 is not None: current_state.j3 = data.j3
-    if data.j4 is not None: current_state.j4 = data.j4
-    if data.j5 is not None: current_state.j5 = data.j5
-    if data.j6 is not None: current_state.j6 = data.j6
+    if current_state.sequence_running or current_state.auto_run_active or current_state.replay_active:
+        raise HTTPException(status_code=423, detail="System busy (Auto Run, Sequence or Replay Active)")
+
+    # Latest target wins; the manual-control loop moves there smoothly
+    mailbox.post_joints(data.model_dump(exclude_none=True))
     return {"status": "moved"}
 
 class GripperControl(BaseModel):
@@ -416,44 +914,91 @@ class GripperControl(BaseModel):
     switch_on: bool # ON/OFF Switch
 
 @app.post("/api/robot/gripper")
+@control.command
 def control_gripper(data: GripperControl):
     """
     รับค่าจากหน้า Manual Control (Slider Max Force, Slider Angle, Switch)
     """
-    if sequence_running or auto_run_active:
-        raise HTTPException(status_code=423, detail="System busy (Auto Run or Sequence Active)")
+    if current_state.sequence_running or current_state.auto_run_active or current_state.replay_active:
+        raise HTTPException(status_code=423, detail="System busy (Auto Run, Sequence or Replay Active)")
+
+    mailbox.post_gripper(data.model_dump())
+    # Force as of the last control tick; the new command is applied on the next ones
+    return {"status": "updated", "force": current_state.current_force}
+
+# --- 4.3 Teaching/Sync Endpoints ---
+# (Simplified: Removed Legacy Buffer Endpoints)
+
+def apply_manual_gripper(angle: int, command: dict):
+    """Manual-control tick for the gripper: `angle` moves toward command["angle"] at a limited rate"""
+    current_state.max_force_setting = command["max_force"]
+    driver.set_gripper(angle, command["max_force"])
 
-    current_state.max_force_setting = data.max_force
-    current_state.gripper_angle = data.angle
-    
     # Logic Mock: Relaxed to < 179 degrees for easier testing
-    if data.switch_on and data.angle < 179:
+    if command["switch_on"] and angle < 179:
         current_state.is_gripping = True
         # Determine material first
-        mat, conf = determine_material_from_force(data.max_force)
-        current_state.detected_material = mat
-        current_state.confidence = conf
-        
+        mat, conf = determine_material_from_force(command["max_force"])
+        current_state.update(detected_material=mat, confidence=conf)
+
         # Use realistic physics-based force calculation
         current_state.current_force = calculate_realistic_force(
-            angle=data.angle,
-            max_force_setting=data.max_force,
+            angle=angle,
+            max_force_setting=command["max_force"],
             material_type=mat
         )
     else:
-        current_state.is_gripping = False
-        current_state.current_force = 0.0
-        current_state.detected_material = "Ready"
-        
-    return {"status": "updated", "force": current_state.current_force}
+        current_state.update(is_gripping=False, current_force=0.0, detected_material="Ready")
+
+mailbox = CommandMailbox(
+    read_joints=lambda: current_joints(),
+    read_gripper=lambda: current_state.gripper_angle,
+    apply_joints=lambda setpoint: driver.set_joints(setpoint),
+    apply_gripper=apply_manual_gripper,
+    is_blocked=lambda: (current_state.auto_run_active or current_state.sequence_running or current_state.replay_active
+                        or driver.error is not None),
+)
 
-# --- 4.3 Teaching/Sync Endpoints ---
-# (Simplified: Removed Legacy Buffer Endpoints)
+@app.get("/api/robot/command-stats")
+@control.command
+def manual_command_stats():
+    """Manual-control mailbox counters (superseded = replaced before the control loop applied it)"""
+    return mailbox.stats()
 
 @app.get("/api/patterns")
-def get_patterns(session: Session = Depends(get_session)):
-    patterns = session.exec(select(TeachingPatterns)).all()
-    return [{"id": p.id, "name": p.name} for p in patterns]
+def get_patterns(limit: Optional[int] = None, after_id: int = 0, session: Session = Depends(get_session)):
+    """All patterns, or one page of `limit` by id (pass the last id seen as after_id for the next page)"""
+    query = select(TeachingPatterns.id, TeachingPatterns.name).where(TeachingPatterns.id > after_id)
+    query = query.order_by(TeachingPatterns.id)
+    if limit is not None:
+        query = query.limit(max(1, min(limit, 1000)))
+    return [{"id": pid, "name": name} for pid, name in session.exec(query).all()]
+
+def fts_query(q: str) -> str:
+    """User text -> FTS5 query: every word must match, as a word prefix (type-ahead)"""
+    words = q.split()
+    return " ".join('"' + word.replace('"', '""') + '"*' for word in words)
+
+@app.get("/api/patterns/search")
+def search_patterns(q: str, limit: int = 50, offset: int = 0, session: Session = Depends(get_session)):
+    """Patterns whose name or description contains words starting with the given words, best match first"""
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Empty search")
+    limit = max(1, min(limit, 200))
+    if pattern_fts:
+        rows = session.execute(text(
+            "SELECT p.id, p.name, p.description FROM pattern_search "
+            "JOIN teachingpatterns p ON p.id = pattern_search.rowid "
+            "WHERE pattern_search MATCH :q ORDER BY bm25(pattern_search, 10.0, 1.0) LIMIT :limit OFFSET :offset"
+        ), {"q": fts_query(q), "limit": limit, "offset": max(0, offset)}).all()
+    else:
+        like = f"%{q.strip()}%"
+        rows = session.execute(
+            select(TeachingPatterns.id, TeachingPatterns.name, TeachingPatterns.description)
+            .where(TeachingPatterns.name.like(like) | TeachingPatterns.description.like(like))
+            .order_by(TeachingPatterns.name).limit(limit).offset(max(0, offset))
+        ).all()
+    return [{"id": pid, "name": name, "description": description} for pid, name, description in rows]
 
 @app.delete("/api/patterns/{pattern_id}")
 def delete_pattern(pattern_id: int, session: Session = Depends(get_session)):
@@ -468,6 +1013,125 @@ def delete_pattern(pattern_id: int, session: Session = Depends(get_session)):
     
     return {"message": "Deleted"}
 
+# --- 4.3.0 Pattern Pre-flight Analysis ---
+def pattern_step_dicts(steps: List[PatternSteps]) -> List[dict]:
+    return [
+        {
+            "sequence_order": s.sequence_order,
+            "action_type": s.action_type,
+            "j1": s.j1, "j2": s.j2, "j3": s.j3, "j4": s.j4, "j5": s.j5, "j6": s.j6,
+            "x": s.x, "y": s.y, "z": s.z, "roll": s.roll, "pitch": s.pitch, "yaw": s.yaw,
+            "gripper_angle": s.gripper_angle,
+            "wait_time": s.wait_time,
+        }
+        for s in sorted(steps, key=lambda x: x.sequence_order)
+    ]
+
+@lru_cache(maxsize=256)
+def analyze_pattern_cached(pattern_id: int, created_at: datetime, revision: int,
+                           blend_radius: Optional[float]) -> Optional[dict]:
+    """Analysis is computed once per (pattern, revision, blend radius).
+
+    SQLite reuses the ids of deleted patterns and every worker has its own cache, so
+    the key includes the creation time: a new pattern never hits an old one's entry.
+    Returns None when the pattern no longer matches the key (edited or deleted since).
+    """
+    with Session(engine) as session:
+        pattern = session.get(TeachingPatterns, pattern_id)
+        if not pattern or pattern.created_at != created_at or pattern.revision != revision:
+            return None
+        result = analyze_steps(pattern_step_dicts(pattern.steps), blend_radius)
+        result.update({"pattern_id": pattern.id, "name": pattern.name, "revision": revision})
+        return result
+
+def analyze_pattern(pattern_id: int, blend_radius: Optional[float] = None) -> Optional[dict]:
+    while True:
+        with Session(engine) as session:
+            pattern = session.get(TeachingPatterns, pattern_id)
+            if not pattern:
+                return None
+            key = (pattern.created_at, pattern.revision)
+        analysis = analyze_pattern_cached(pattern_id, *key, blend_radius)
+        if analysis is not None:
+            return analysis  # Otherwise the pattern changed in between: look again
+
+@app.get("/api/patterns/{pattern_id}/analyze")
+def analyze_pattern_endpoint(pattern_id: int, cycles: Optional[int] = None, blend_radius: Optional[float] = None):
+    """Per-step / per-cycle time estimates and validation issues for a pattern"""
+    analysis = analyze_pattern(pattern_id, blend_radius)
+    if analysis is None:
+        raise HTTPException(status_code=404, detail="Pattern not found")
+    if cycles is None:
+        return analysis
+    return {**analysis, "estimate": estimate_run(analysis, cycles)}
+
+# --- 4.3.0.1 What-if Simulation (dry run over a parameter grid) ---
+class WhatIfRequest(BaseModel):
+    max_forces: List[float]          # N
+    speeds: List[float] = [1.0]      # Fraction of the joint velocity limits
+    materials: List[str] = list(MATERIALS)
+    cycles: int = 10
+    blend_radius: Optional[float] = None
+    seed: int = 0                    # Sensor noise seed (same request = same results)
+
+MAX_WHAT_IF_JOBS = 8  # Finished jobs kept for polling; the oldest are dropped
+what_if_jobs: Dict[str, WhatIfJob] = {}
+
+def get_what_if_job(job_id: str) -> WhatIfJob:
+    job = what_if_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="No what-if job with this id")
+    return job
+
+@app.post("/api/patterns/{pattern_id}/what-if")
+@control.command
+def start_what_if(pattern_id: int, req: WhatIfRequest):
+    """Start a dry run of the pattern for every (max_force, speed, material); poll GET /api/what-if/{id}"""
+    if any(job.running for job in what_if_jobs.values()):
+        raise HTTPException(status_code=409, detail="A what-if simulation is already running")
+    if not 1 <= req.cycles <= MAX_CYCLES:
+        raise HTTPException(status_code=400, detail=f"cycles must be 1..{MAX_CYCLES}")
+    if not req.max_forces or any(f <= 0 for f in req.max_forces):
+        raise HTTPException(status_code=400, detail="max_forces must be positive")
+    if not req.speeds or any(not MIN_SPEED <= v <= MAX_SPEED for v in req.speeds):
+        raise HTTPException(status_code=400, detail=f"speeds must be within {MIN_SPEED}..{MAX_SPEED}")
+    if not req.materials:
+        raise HTTPException(status_code=400, detail="materials must not be empty")
+    combos = expand_grid(req.max_forces, req.speeds, req.materials, req.seed)
+    if len(combos) > MAX_COMBINATIONS:
+        raise HTTPException(status_code=400, detail=f"Grid has {len(combos)} combinations (max {MAX_COMBINATIONS})")
+
+    analysis = analyze_pattern(pattern_id, req.blend_radius)
+    if analysis is None:
+        raise HTTPException(status_code=404, detail="Pattern not found")
+    if not analysis["valid"]:
+        raise HTTPException(status_code=400, detail={"error": "Pattern failed pre-flight check",
+                                                     "issues": analysis["issues"]})
+    with Session(engine) as session:
+        steps, _ = compile_steps(pattern_step_dicts(session.get(TeachingPatterns, pattern_id).steps))
+
+    finished = [j.id for j in what_if_jobs.values() if not j.running]
+    for old in finished[:max(0, len(finished) - (MAX_WHAT_IF_JOBS - 1))]:
+        del what_if_jobs[old]
+    pattern = {"id": pattern_id, "name": analysis["name"], "revision": analysis["revision"]}
+    job = WhatIfJob(uuid.uuid4().hex[:12], pattern, steps, combos, req.cycles, req.blend_radius)
+    what_if_jobs[job.id] = job
+    job.start()
+    return job.status()
+
+@app.get("/api/what-if/{job_id}")
+@control.command
+def what_if_result(job_id: str):
+    """Progress and the combinations simulated so far (grid order)"""
+    return get_what_if_job(job_id).result()
+
+@app.delete("/api/what-if/{job_id}")
+@control.command
+def cancel_what_if(job_id: str):
+    job = get_what_if_job(job_id)
+    job.cancel()
+    return job.status()
+
 # --- 4.3.1 Full Sync Endpoints (SQLite ↔ Backend) ---
 class SyncPatternStep(BaseModel):
     step_order: int
@@ -492,13 +1156,13 @@ class SyncPatternsRequest(BaseModel):
 @app.get("/api/sync/patterns")
 def sync_patterns_pull(session: Session = Depends(get_session)):
     patterns = session.exec(select(TeachingPatterns)).all()
+    # All steps in one query, grouped per pattern
+    steps_by_pattern = {}
+    for s in session.exec(select(PatternSteps).order_by(PatternSteps.pattern_id, PatternSteps.sequence_order)):
+        steps_by_pattern.setdefault(s.pattern_id, []).append(s)
     response = []
     for pat in patterns:
-        steps = session.exec(
-            select(PatternSteps)
-            .where(PatternSteps.pattern_id == pat.id)
-            .order_by(PatternSteps.sequence_order)
-        ).all()
+        steps = steps_by_pattern.get(pat.id, [])
 
         step_payload = []
         for s in steps:
@@ -514,6 +1178,8 @@ def sync_patterns_pull(session: Session = Depends(get_session)):
                 "wait_time": s.wait_time,
                 "duration": s.wait_time,
             }
+            # Cartesian target of move_cartesian steps
+            params.update({name: getattr(s, name) for name in POSE_NAMES if getattr(s, name) is not None})
             step_payload.append({
                 "step_order": max(0, s.sequence_order - 1),
                 "action_type": s.action_type,
@@ -523,7 +1189,7 @@ def sync_patterns_pull(session: Session = Depends(get_session)):
         response.append({
             "id": pat.id,
             "name": pat.name,
-            "description": None,
+            "description": pat.description,
             "created_at": pat.created_at.isoformat() if pat.created_at else None,
             "updated_at": pat.created_at.isoformat() if pat.created_at else None,
             "steps": step_payload,
@@ -532,6 +1198,23 @@ def sync_patterns_pull(session: Session = Depends(get_session)):
     return {"patterns": response}
 
 
+SQL_IN_CHUNK = 500  # Ids per IN (...) clause, well below SQLite's variable limit
+
+# Step fields compared by a sync to tell changed patterns from unchanged ones
+PATTERN_STEP_COLUMNS = ("pattern_id", "sequence_order", "action_type", *JOINT_NAMES, "gripper_angle", "wait_time",
+                        *POSE_NAMES)
+
+def chunked(values: list, size: int = SQL_IN_CHUNK):
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+def fetch_in(session: Session, model, column, values) -> list:
+    """Rows of `model` whose `column` is in `values`, in chunks"""
+    rows = []
+    for chunk in chunked(list(values)):
+        rows.extend(session.exec(select(model).where(column.in_(chunk))).all())
+    return rows
+
 @app.post("/api/sync/patterns")
 def sync_patterns_push(payload: SyncPatternsRequest, session: Session = Depends(get_session)):
     # Debug: Log incoming payload
@@ -551,7 +1234,7 @@ def sync_patterns_push(payload: SyncPatternsRequest, session: Session = Depends(
                         'params_keys': list(p.steps[0].params.keys()) if p.steps else None
                     }
                 }
-                for p in payload.patterns
+                for p in payload.patterns[:3]  # A sample: a full dump of a large sync takes longer than the sync
             ]
         }
         print(f"[DEBUG] Incoming sync payload: {json.dumps(debug_data, indent=2, default=str)}", flush=True)
@@ -561,62 +1244,91 @@ def sync_patterns_push(payload: SyncPatternsRequest, session: Session = Depends(
     synced = 0
     incoming_ids = set()
 
+    # 1) Find existing by ID, fallback to name: batched lookups instead of two queries per pattern
+    by_id = {p.id: p for p in fetch_in(session, TeachingPatterns, TeachingPatterns.id,
+                                       {p.id for p in payload.patterns if p.id})}
+    names = {p.name for p in payload.patterns if p.id not in by_id}
+    by_name = {}
+    for p in sorted(fetch_in(session, TeachingPatterns, TeachingPatterns.name, names), key=lambda p: p.id):
+        by_name.setdefault(p.name, p)  # First by id, like .first()
+
+    targets = []    # (payload pattern, existing TeachingPatterns or row dict of a new one)
+    created = []
     for pat_data in payload.patterns:
-        # 1) Find existing by ID, fallback to name
-        pat = session.get(TeachingPatterns, pat_data.id) if pat_data.id else None
-        if not pat:
-            pat = session.exec(select(TeachingPatterns).where(TeachingPatterns.name == pat_data.name)).first()
-
-        # 2) Create if missing
-        if not pat:
-            pat = TeachingPatterns(name=pat_data.name)
-            session.add(pat)
-            session.commit()
-            session.refresh(pat)
-        else:
+        pat = by_id.get(pat_data.id) or by_name.get(pat_data.name)
+        if pat is None:
+            pat = {"name": pat_data.name, "description": pat_data.description,
+                   "created_at": datetime.now(), "revision": 0}
+            created.append(pat)
+        elif isinstance(pat, TeachingPatterns) and by_name.get(pat.name) is pat and pat.name != pat_data.name:
+            del by_name[pat.name]  # Renamed: later patterns must not match the old name
+        by_name.setdefault(pat_data.name, pat)
+        targets.append((pat_data, pat))
+
+    # 2) Create if missing: one multi-row INSERT ... RETURNING id
+    if created:
+        ids = session.execute(sa_insert(TeachingPatterns).returning(TeachingPatterns.id, sort_by_parameter_order=True),
+                              created).scalars().all()
+        for row, pid in zip(created, ids):
+            row["id"] = pid
+
+    # 3) Replace steps, only where they changed (unchanged patterns keep their revision and analysis)
+    steps_by_pattern = {}
+    renamed = set()
+    for pat_data, pat in targets:
+        pid = pat["id"] if isinstance(pat, dict) else pat.id
+        incoming_ids.add(pid)
+        steps_by_pattern[pid] = [  # A pattern sent twice keeps the last steps
+            {
+                "pattern_id": pid,
+                "sequence_order": step.step_order + 1,
+                "action_type": step.action_type,
+                **{name: float(step.params.get(name, 0.0) or 0.0) for name in JOINT_NAMES},
+                "gripper_angle": int(step.params.get("angle", step.params.get("gripper_angle", 0)) or 0),
+                "wait_time": float(step.params.get("duration", step.params.get("wait_time", 0.0)) or 0.0),
+                **{name: None if step.params.get(name) is None else float(step.params[name]) for name in POSE_NAMES},
+            }
+            for step in sorted(pat_data.steps, key=lambda s: s.step_order)
+        ]
+        if isinstance(pat, TeachingPatterns):
+            if pat.name != pat_data.name:
+                renamed.add(pid)  # The cached analysis carries the name
             pat.name = pat_data.name
-
-        if pat.id is not None:
-            incoming_ids.add(pat.id)
-
-        # 3) Replace steps
-        session.exec(delete(PatternSteps).where(PatternSteps.pattern_id == pat.id))
-
-        ordered_steps = sorted(pat_data.steps, key=lambda s: s.step_order)
-        
-        for step in ordered_steps:
-            params = step.params or {}
-
-            j1 = float(params.get("j1", 0.0) or 0.0)
-            j2 = float(params.get("j2", 0.0) or 0.0)
-            j3 = float(params.get("j3", 0.0) or 0.0)
-            j4 = float(params.get("j4", 0.0) or 0.0)
-            j5 = float(params.get("j5", 0.0) or 0.0)
-            j6 = float(params.get("j6", 0.0) or 0.0)
-            wait_time = float(params.get("duration", params.get("wait_time", 0.0)) or 0.0)
-            gripper_angle = int(params.get("angle", params.get("gripper_angle", 0)) or 0)
-
-            session.add(PatternSteps(
-                pattern_id=pat.id,
-                sequence_order=step.step_order + 1,
-                action_type=step.action_type,
-                j1=j1, j2=j2, j3=j3, j4=j4, j5=j5, j6=j6,
-                gripper_angle=gripper_angle,
-                wait_time=wait_time,
-            ))
-
-        session.commit()
+            pat.description = pat_data.description
         synced += 1
 
+    stored = {pid: [] for pid in by_id.keys() | {p.id for p in by_name.values() if isinstance(p, TeachingPatterns)}}
+    step_columns = [getattr(PatternSteps, name) for name in PATTERN_STEP_COLUMNS]
+    for chunk in chunked(list(stored)):
+        for row in session.execute(select(*step_columns).where(PatternSteps.pattern_id.in_(chunk))
+                                   .order_by(PatternSteps.pattern_id, PatternSteps.sequence_order)):
+            stored[row.pattern_id].append(dict(row._mapping))
+    changed = {pid: rows for pid, rows in steps_by_pattern.items() if stored.get(pid) != rows}
+    for pid in (changed.keys() | renamed) & stored.keys():
+        pattern = session.get(TeachingPatterns, pid)
+        pattern.revision = (pattern.revision or 0) + 1
+    for chunk in chunked(list(changed)):
+        session.exec(delete(PatternSteps).where(PatternSteps.pattern_id.in_(chunk)))
+    step_rows = [row for rows in changed.values() for row in rows]
+    if step_rows:
+        session.execute(sa_insert(PatternSteps), step_rows)
+
     # 4) Delete patterns that are no longer present in payload
-    existing_ids = {p.id for p in session.exec(select(TeachingPatterns)).all() if p.id is not None}
+    existing_ids = set(session.exec(select(TeachingPatterns.id)).all())
     to_delete = existing_ids - incoming_ids
-    for pid in to_delete:
-        session.exec(delete(PatternSteps).where(PatternSteps.pattern_id == pid))
-        session.exec(delete(TeachingPatterns).where(TeachingPatterns.id == pid))
+    for chunk in chunked(list(to_delete)):
+        session.exec(delete(PatternSteps).where(PatternSteps.pattern_id.in_(chunk)))
+        session.exec(delete(TeachingPatterns).where(TeachingPatterns.id.in_(chunk)))
     session.commit()
 
-    return {"message": "Synced", "count": synced, "deleted": len(to_delete)}
+    # Pre-flight check at save time, on the steps just written (unchanged ones were checked when saved)
+    invalid = {}
+    for pid, rows in changed.items():
+        analysis = analyze_steps(rows)
+        if not analysis["valid"]:
+            invalid[pid] = analysis["issues"]
+
+    return {"message": "Synced", "count": synced, "deleted": len(to_delete), "invalid": invalid}
 
 # --- 4.4 Execute Sequence (backend-driven play) ---
 class SequenceStep(BaseModel):
@@ -630,89 +1342,139 @@ class ExecuteSequenceRequest(BaseModel):
     gripper_angle: float
     is_on: bool
     pattern_name: Optional[str] = None
+    blend_radius: Optional[float] = None  # degrees, None = motion.DEFAULT_BLEND_RADIUS
 
-# Shared Helper for Interpolation
-def move_robot_to_target(targets: dict, duration_override: float = None):
+def sequence_step_dicts(steps: List[SequenceStep], start) -> Tuple[List[dict], List[dict]]:
     """
-    Shared function to move robot joints smoothly.
-    Respects global stop flags (auto_run_active, sequence_running).
+    Sequence steps as analysis step dicts (missing joints keep the previous
+    target, as in playback). move_cartesian steps are solved on the way and
+    come back as move_joints. Returns (steps, inverse-kinematics issues).
     """
-    def lerp(a, b, t): return a + (b - a) * t
+    pose = tuple(start)
+    result, issues = [], []
+    for i, step in enumerate(sorted(steps, key=lambda s: s.step_order)):
+        action = step.action_type.lower()
+        params = step.params or {}
+        if action == "move_joints":
+            pose = joints_from(params, pose)
+        elif action == "move_cartesian":
+            (solved,), found = compile_steps([{"action_type": action, **params}], pose)
+            pose = joints_from(solved, pose)
+            issues.extend({**issue, "step": i} for issue in found)
+            action = "move_joints"
+        default_wait = 1.0 if action == "wait" else 0.0
+        result.append({
+            "action_type": action,
+            **dict(zip(JOINT_NAMES, pose)),
+            "wait_time": float(params.get("duration", params.get("wait_time", default_wait)) or 0.0),
+        })
+    return result, issues
 
-    start_vals = {
-        "j1": current_state.j1, "j2": current_state.j2, "j3": current_state.j3,
-        "j4": current_state.j4, "j5": current_state.j5, "j6": current_state.j6
-    }
-    
-    # Check what keys are present, default to current
-    safe_targets = {
-        "j1": float(targets.get("j1", current_state.j1)),
-        "j2": float(targets.get("j2", current_state.j2)),
-        "j3": float(targets.get("j3", current_state.j3)),
-        "j4": float(targets.get("j4", current_state.j4)),
-        "j5": float(targets.get("j5", current_state.j5)),
-        "j6": float(targets.get("j6", current_state.j6)),
-    }
+# Shared Helpers for Interpolation
+def current_joints():
+    s = current_state.snapshot()
+    return (s["j1"], s["j2"], s["j3"], s["j4"], s["j5"], s["j6"])
 
-    # Interpolation settings    
-    steps = 60
-    interval = 0.04 # 60 * 0.04 = 2.4 seconds approx movement time
-    
-    for i in range(steps):
+def run_motion_plan(plan: BlendedPath, on_waypoint=None) -> bool:
+    """
+    Play a planned path one control tick at a time.
+    Respects the stop flags (auto_run_active, sequence_running) on every tick.
+    Returns False if the motion was interrupted.
+    """
+    for setpoint, reached in plan.iter_ticks():
         # Check Stop Flags
-        if not auto_run_active and not sequence_running:
-            break
-            
-        t = (i + 1) / steps
-        current_state.j1 = lerp(start_vals["j1"], safe_targets["j1"], t)
-        current_state.j2 = lerp(start_vals["j2"], safe_targets["j2"], t)
-        current_state.j3 = lerp(start_vals["j3"], safe_targets["j3"], t)
-        current_state.j4 = lerp(start_vals["j4"], safe_targets["j4"], t)
-        current_state.j5 = lerp(start_vals["j5"], safe_targets["j5"], t)
-        current_state.j6 = lerp(start_vals["j6"], safe_targets["j6"], t)
-        time.sleep(interval)
+        if not current_state.auto_run_active and not current_state.sequence_running:
+            return False
+
+        try:
+            driver.set_joints(setpoint)
+        except DriverError:
+            return False  # on_driver_lost has cleared the run flags
+        time.sleep(TICK_INTERVAL)
+
+        if on_waypoint:
+            for idx in reached:
+                on_waypoint(idx)
+    return True
+
+def send_gripper(angle: int, force_limit: float) -> bool:
+    """Gripper setpoint from an executor; False once the controller is gone (on_driver_lost stops the run)"""
+    try:
+        driver.set_gripper(angle, force_limit)
+        return True
+    except DriverError:
+        return False
+
+def move_robot_through(targets: List[dict], blend_radius: Optional[float] = None, on_waypoint=None) -> bool:
+    """
+    Move through consecutive waypoints as one continuous blended path
+    (no stop at intermediate waypoints). on_waypoint(i) fires as each waypoint is passed.
+    """
+    plan = plan_moves(current_joints(), targets, blend_radius)
+    return run_motion_plan(plan, on_waypoint)
 
 @app.post("/api/teach/execute-sequence")
+@control.command
 def execute_sequence(req: ExecuteSequenceRequest):
-    global sequence_running
-    if auto_run_active:
+    if current_state.auto_run_active:
          return {"error": "System busy (Auto Run Active)"}
-    if sequence_running:
+    if current_state.sequence_running:
          return {"error": "System busy (Sequence Active)"}
-         
+    if current_state.replay_active:
+         return {"error": "System busy (Replay Active)"}
+
+    # Pre-flight check: joint limits and self-collision along the planned path
+    start = current_joints()
+    steps, issues = sequence_step_dicts(req.steps, start)
+    analysis = analyze_steps(steps, req.blend_radius, start)
+    if issues or not analysis["valid"]:
+        return {"error": "Sequence failed pre-flight check", "issues": issues + analysis["issues"]}
+
+    # Playback runs move_cartesian steps as moves to their solved joint targets
+    for step, compiled in zip(sorted(req.steps, key=lambda s: s.step_order), steps):
+        if step.action_type.lower() == "move_cartesian":
+            step.action_type = "move_joints"
+            step.params = {**{name: compiled[name] for name in JOINT_NAMES}, "duration": compiled["wait_time"]}
+
     # Run in background thread
-    t = threading.Thread(target=execute_sequence_worker, args=(req,))
+    t = threading.Thread(target=execute_sequence_worker, args=(req,), name="sequence")
     t.start()
     return {"message": "Sequence started"}
 
 def execute_sequence_worker(req: ExecuteSequenceRequest):
-    global sequence_running
-    sequence_running = True
+    current_state.sequence_running = True
 
     print(f"🎬 Execute sequence: {req.pattern_name}, steps={len(req.steps)}")
     current_state.mode = "TEACHING"
     current_state.is_running = req.is_on
     current_state.max_force_setting = req.max_force
-    current_state.gripper_angle = int(req.gripper_angle)
+    send_gripper(int(req.gripper_angle), req.max_force)
 
     ordered_steps = sorted(req.steps, key=lambda s: s.step_order)
-
-    for step in ordered_steps:
-        if not sequence_running: break
-        
+    step_groups = split_move_runs(ordered_steps, lambda s: s.action_type.lower() == "move_joints")
+
+    journal.record("event", name="sequence_started", sequence=req.pattern_name, steps=len(req.steps))
+    for group_index, (is_move, group) in enumerate(step_groups):
+        if not current_state.sequence_running: break
+        journal.record("step", sequence=req.pattern_name, group=group_index,
+                       action=group[0].action_type.lower(), steps=len(group))
+
+        if is_move:
+            # Use shared helper (consecutive moves are blended)
+            targets = [s.params or {} for s in group]
+            print(f"  📍 MOVE_JOINTS x{len(targets)}: {targets}")
+            move_robot_through(targets, blend_radius=req.blend_radius)
+            continue
+
+        step = group[0]
         action = step.action_type.lower()
         params = step.params or {}
 
-        if action == "move_joints":
-            # Use shared helper
-            print(f"  📍 MOVE_JOINTS: {params}")
-            move_robot_to_target(params)
-            
-        elif action == "grip":
+        if action == "grip":
             # Play Sequence Mode: Uses realistic physics (keeps gripper angle logic)
             print(f"  🤏 GRIP (Physics)")
             angle = int(params.get("angle", params.get("gripper_angle", current_state.gripper_angle)))
-            current_state.gripper_angle = angle
+            send_gripper(angle, req.max_force)
             current_state.is_gripping = req.is_on
             
             mat, conf = determine_material_from_force(req.max_force)
@@ -729,7 +1491,7 @@ def execute_sequence_worker(req: ExecuteSequenceRequest):
 
         elif action == "release":
             print(f"  👐 RELEASE")
-            current_state.gripper_angle = 180
+            send_gripper(180, req.max_force)
             current_state.is_gripping = False
             current_state.current_force = 0.0
             time.sleep(0.5)
@@ -739,67 +1501,493 @@ def execute_sequence_worker(req: ExecuteSequenceRequest):
             print(f"  ⏱️  WAIT: {duration}s")
             end_time = time.time() + duration
             while time.time() < end_time:
-                if not sequence_running: break
+                if not current_state.sequence_running: break
                 time.sleep(0.1)
 
-    sequence_running = False
+    journal.record("event", name="sequence_finished", sequence=req.pattern_name,
+                   completed=current_state.sequence_running)
+    current_state.sequence_running = False
     current_state.mode = "MANUAL"
     current_state.is_running = False
     print("✅ Sequence finished")
 
 @app.post("/api/teach/stop")
+@control.command
 def stop_sequence():
-    global sequence_running, auto_run_active
-    sequence_running = False
-    auto_run_active = False # Kill both just in case
+    current_state.sequence_running = False
+    current_state.auto_run_active = False # Kill both just in case
+    current_state.replay_active = False
     current_state.is_running = False
     current_state.mode = "MANUAL"
     return {"message": "Stopped"}
 
+# --- 4.4 Teach Recording (record jogged motion into a pattern) ---
+recorder: Optional[TeachRecorder] = None  # Current or last recording
+
+class RecordStartRequest(BaseModel):
+    rate_hz: float = RECORD_RATE_HZ
+
+class RecordStopRequest(BaseModel):
+    save: bool = True
+    pattern_id: Optional[int] = None      # Replace this pattern's steps instead of creating a new one
+    name: Optional[str] = None
+    tolerance: float = DEFAULT_TOLERANCE  # degrees of joint-space deviation allowed by simplification
+    keep_timing: bool = False             # Keep the operator's pace instead of running at the limits
+
+@app.post("/api/teach/record/start")
+@control.command
+def start_recording(req: RecordStartRequest):
+    global recorder
+    if current_state.auto_run_active or current_state.sequence_running or current_state.replay_active:
+        raise HTTPException(status_code=423, detail="System busy (Auto Run, Sequence or Replay Active)")
+    if recorder is not None and recorder.recording:
+        raise HTTPException(status_code=409, detail="Already recording")
+    if not 1 <= req.rate_hz <= 500:
+        raise HTTPException(status_code=400, detail="rate_hz must be between 1 and 500")
+
+    recorder = TeachRecorder(lambda: (current_joints(), current_state.gripper_angle), req.rate_hz)
+    recorder.start()
+    current_state.mode = "TEACHING"
+    print(f"⏺️ Teach recording started at {req.rate_hz:g} Hz")
+    return {"status": "Recording", "rate_hz": req.rate_hz}
+
+@app.post("/api/teach/record/stop")
+@control.command
+def stop_recording(req: RecordStopRequest):
+    if recorder is None or recorder.started_at is None:
+        raise HTTPException(status_code=409, detail="No recording")
+    recorder.stop()
+    current_state.mode = "MANUAL"
+    steps = recorder.build_steps(max(0.0, req.tolerance), req.keep_timing)
+    result = {"samples": recorder.samples, "steps": len(steps),
+              "reduction": round(recorder.samples / len(steps), 1) if steps else None}
+    print(f"⏹️ Teach recording: {recorder.samples} samples -> {len(steps)} steps")
+    if not req.save or not steps:
+        return {**result, "pattern_id": None, "pattern_steps": steps}
+
+    with Session(engine) as session:
+        if req.pattern_id is not None:
+            pat = session.get(TeachingPatterns, req.pattern_id)
+            if not pat:
+                raise HTTPException(status_code=404, detail="Pattern not found")
+            pat.revision = (pat.revision or 0) + 1
+            if req.name:
+                pat.name = req.name
+            session.exec(delete(PatternSteps).where(PatternSteps.pattern_id == pat.id))
+        else:
+            pat = TeachingPatterns(name=req.name or f"Recorded {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+            session.add(pat)
+            session.commit()
+            session.refresh(pat)
+        for order, step in enumerate(steps, start=1):
+            session.add(PatternSteps(pattern_id=pat.id, sequence_order=order, **step))
+        session.commit()
+        result.update({"pattern_id": pat.id, "name": pat.name})
+    analysis = analyze_pattern(result["pattern_id"])
+    return {**result, "valid": analysis["valid"], "issues": analysis["issues"], "pattern_steps": steps}
+
+@app.get("/api/teach/record/status")
+@control.command
+def recording_status():
+    if recorder is None:
+        return {"recording": False, "samples": 0}
+    elapsed = recorder.samples * recorder.interval
+    return {"recording": recorder.recording, "samples": recorder.samples, "seconds": round(elapsed, 1)}
+
 # --- 4.4 Auto Run & Logging ---
 class AutoRunRequest(BaseModel):
     pattern_id: int
     cycles: int
     max_force: float
     filename: str  # รับชื่อไฟล์จาก App
+    blend_radius: Optional[float] = None  # degrees, None = motion.DEFAULT_BLEND_RADIUS, 0 = stop at every waypoint
 
 @app.post("/auto-run/start")
+@control.command
 def start_auto_run(req: AutoRunRequest):
-    global auto_run_active
-    if auto_run_active: return {"error": "System busy (Auto Run Active)"}
-    if sequence_running: return {"error": "System busy (Sequence Active)"}
+    if current_state.auto_run_active: return {"error": "System busy (Auto Run Active)"}
+    if current_state.sequence_running: return {"error": "System busy (Sequence Active)"}
+    if current_state.replay_active: return {"error": "System busy (Replay Active)"}
+
+    # Pre-flight check (cached per pattern revision)
+    analysis = analyze_pattern(req.pattern_id, req.blend_radius)
+    if analysis is None:
+        return {"error": "Pattern not found"}
+    if not analysis["valid"]:
+        return {"error": "Pattern failed pre-flight check", "issues": analysis["issues"]}
+    estimate = estimate_run(analysis, req.cycles)
+    estimate["finish_at"] = (datetime.now() + timedelta(seconds=estimate["total_s"])).isoformat()
     
-    auto_run_active = True
-    t = threading.Thread(
+    launch_auto_run(req.pattern_id, req.cycles, req.max_force, req.filename, req.blend_radius)
+    return {"status": "Started", "file": req.filename, "estimate": estimate}
+
+def launch_auto_run(*args, resume: Optional[dict] = None):
+    global auto_run_worker
+    driver_lost.clear()
+    current_state.auto_run_active = True
+    auto_run_worker = threading.Thread(
         target=auto_run_thread_func, 
-        args=(req.pattern_id, req.cycles, req.max_force, req.filename)
+        args=args,
+        kwargs={"resume": resume},
+        name="auto-run"
     )
-    t.start()
-    return {"status": "Started", "file": req.filename}
+    auto_run_worker.start()
 
 @app.post("/auto-run/stop")
+@control.command
 def stop_auto_run():
-    global auto_run_active
-    auto_run_active = False
+    current_state.auto_run_active = False
     return {"status": "Stopping..."}
 
+@app.get("/auto-run/interrupted")
+def list_interrupted_runs(session: Session = Depends(get_session)):
+    """Runs cut short by a crash or restart; the resumable ones continue from their checkpoint"""
+    runs = session.exec(select(RunHistory).where(RunHistory.status == "Interrupted")
+                        .order_by(RunHistory.created_at.desc())).all()
+    result = []
+    for h in runs:
+        checkpoint = run_checkpoint.load(checkpoint_path(h.id))
+        result.append({
+            "id": h.id,
+            "filename": h.filename,
+            "pattern_id": h.pattern_id,
+            "pattern_name": h.pattern_name,
+            "cycle_target": h.cycle_target,
+            "resumable": checkpoint is not None,
+            "resume_cycle": checkpoint["cycle"] + 1 if checkpoint else None,
+            "created_at": h.created_at.isoformat(),
+        })
+    return result
+
+@app.post("/auto-run/resume/{history_id}")
+@control.command
+def resume_auto_run(history_id: int):
+    if current_state.auto_run_active: return {"error": "System busy (Auto Run Active)"}
+    if current_state.sequence_running: return {"error": "System busy (Sequence Active)"}
+    if current_state.replay_active: return {"error": "System busy (Replay Active)"}
+
+    with Session(engine) as session:
+        history = session.get(RunHistory, history_id)
+        if not history or history.status != "Interrupted":
+            return {"error": "No interrupted run with this id"}
+    checkpoint = run_checkpoint.load(checkpoint_path(history_id))
+    if checkpoint is None:
+        return {"error": "No checkpoint for this run"}
+    if not os.path.exists(os.path.join(LOG_DIR, checkpoint["filename"])):
+        return {"error": "Log file of this run no longer exists"}
+    analysis = analyze_pattern(checkpoint["pattern_id"], checkpoint["blend_radius"])
+    if analysis is None:
+        return {"error": "Pattern not found"}
+    if analysis["revision"] != checkpoint["revision"]:
+        return {"error": "Pattern was edited since the run was interrupted"}
+    if not analysis["valid"]:
+        return {"error": "Pattern failed pre-flight check", "issues": analysis["issues"]}
+    estimate = estimate_run(analysis, checkpoint["cycles"] - checkpoint["cycle"])
+    estimate["finish_at"] = (datetime.now() + timedelta(seconds=estimate["total_s"])).isoformat()
+
+    launch_auto_run(checkpoint["pattern_id"], checkpoint["cycles"], checkpoint["max_force"],
+                    checkpoint["filename"], checkpoint["blend_radius"], resume=checkpoint)
+    return {"status": "Resumed", "file": checkpoint["filename"], "cycle": checkpoint["cycle"] + 1,
+            "estimate": estimate}
+
+@app.delete("/auto-run/interrupted/{history_id}")
+@control.command
+def discard_interrupted_run(history_id: int):
+    """Give up on an interrupted run: it becomes "Stopped" and its log is closed"""
+    with Session(engine) as session:
+        history = session.get(RunHistory, history_id)
+        if not history or history.status != "Interrupted":
+            raise HTTPException(status_code=404, detail="No interrupted run with this id")
+        history.status = "Stopped"
+        session.add(history)
+        session.commit()
+        filename = history.filename
+    run_checkpoint.discard(checkpoint_path(history_id))
+    close_log_file(filename)
+    return {"message": "Discarded"}
+
 @app.get("/api/logs/download/{filename}")
-def download_log(filename: str):
+def download_log(filename: str, request: Request, session: Session = Depends(get_session)):
     """ดาวน์โหลดไฟล์ Log CSV"""
-    file_path = os.path.join(LOG_DIR, filename)
     if not filename.endswith(".csv"):
-        file_path += ".csv"
-        
-    if os.path.exists(file_path):
-        return FileResponse(file_path, media_type='text/csv', filename=filename)
-    else:
+        filename += ".csv"
+    entry = session.exec(select(LogFile).where(LogFile.filename == filename)).first()
+    if not entry:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    file_path = os.path.join(LOG_DIR, entry.stored_name)
+    accept = request.headers.get("accept-encoding", "")
+    if not entry.compressed:
+        encoding = negotiate(accept)
+        if entry.status != "closed" or not entry.checksum or encoding is None:
+            # Still being written: the middleware compresses it on the fly
+            return FileResponse(file_path, media_type='text/csv', filename=filename)
+        return FileResponse(
+            compressed_log_path(entry, encoding), media_type='text/csv', filename=filename,
+            headers={"Content-Encoding": encoding, "Vary": "Accept-Encoding", "ETag": f'"{entry.checksum[:16]}-{encoding}"'},
+        )
+
+    # Archived logs are stored gzipped: pass through as-is when the client accepts it
+    if negotiate(accept, ["gzip"]):
+        return FileResponse(
+            file_path, media_type='text/csv', filename=filename,
+            headers={"Content-Encoding": "gzip"},
+        )
+
+    def stream():
+        with gzip.open(file_path, "rb") as f:
+            yield from iter(lambda: f.read(1 << 16), b"")
+    return StreamingResponse(
+        stream(), media_type='text/csv',
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+# --- Log Replay ---
+replay: Optional[LogReplay] = None  # Current or last replay session
+
+class ReplayRequest(BaseModel):
+    filename: str
+    speed: float = 1.0                 # Time multiplier (10 = 10x); 0 = as fast as possible
+    from_cycle: Optional[int] = None
+    to_cycle: Optional[int] = None
+
+class ReplaySeekRequest(BaseModel):
+    cycle: int
+
+class ReplaySpeedRequest(BaseModel):
+    speed: float
+
+def apply_replay_row(row: dict):
+    """Show one recorded row on the live telemetry path (state only, never the driver)"""
+    fields = {
+        "current_force": float(row["Force_N"]),
+        "detected_material": row["Material"],
+        "confidence": float(row["Confidence"]),
+        "is_gripping": row["Phase"].lower().startswith("gripping"),
+    }
+    for column, name in zip(("J1", "J2", "J3", "J4", "J5", "J6"), JOINT_NAMES):
+        if row.get(column):
+            fields[name] = float(row[column])
+    if row.get("Gripper"):
+        fields["gripper_angle"] = int(float(row["Gripper"]))
+    current_state.update(**fields)
+
+def replay_thread_func(session_replay: LogReplay):
+    current_state.update(mode="REPLAY", is_running=True)
+    pace = f"{session_replay.speed}x" if session_replay.speed else "max speed"
+    print(f"▶️ Replay: {session_replay.filename} at {pace}")
+    try:
+        status = session_replay.run(apply_replay_row, lambda: current_state.replay_active)
+        print(f"⏹️ Replay {status}: {session_replay.rows} rows")
+    except Exception as e:
+        session_replay.status = "failed"
+        print(f"⚠️ Replay failed: {e}")
+    finally:
+        current_state.update(mode="MANUAL", is_running=False, is_gripping=False, current_force=0.0,
+                             replay_active=False)
+
+@app.post("/api/replay/start")
+@control.command
+def start_replay(req: ReplayRequest):
+    """Stream a recorded run log back through /data as if it were live"""
+    global replay
+    if current_state.auto_run_active or current_state.sequence_running or current_state.replay_active:
+        raise HTTPException(status_code=423, detail="System busy (Auto Run, Sequence or Replay Active)")
+    filename = req.filename if req.filename.endswith(".csv") else req.filename + ".csv"
+    with Session(engine) as session:
+        entry = session.exec(select(LogFile).where(LogFile.filename == filename)).first()
+    if not entry:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    replay = LogReplay(os.path.join(LOG_DIR, entry.stored_name), filename, max(0.0, req.speed),
+                       req.from_cycle, req.to_cycle)
+    current_state.replay_active = True
+    threading.Thread(target=replay_thread_func, args=(replay,), name="log-replay", daemon=True).start()
+    return {"status": "Started", **replay.progress()}
+
+@app.post("/api/replay/seek")
+@control.command
+def seek_replay(req: ReplaySeekRequest):
+    if replay is None or not current_state.replay_active:
+        raise HTTPException(status_code=409, detail="No replay running")
+    replay.seek(req.cycle)
+    return {"status": "Seeking", "cycle": req.cycle}
+
+@app.post("/api/replay/speed")
+@control.command
+def set_replay_speed(req: ReplaySpeedRequest):
+    if replay is None or not current_state.replay_active:
+        raise HTTPException(status_code=409, detail="No replay running")
+    replay.set_speed(max(0.0, req.speed))
+    return replay.progress()
+
+@app.post("/api/replay/stop")
+@control.command
+def stop_replay():
+    current_state.replay_active = False
+    return {"status": "Stopping..."}
+
+@app.get("/api/replay/status")
+@control.command
+def replay_status():
+    if replay is None:
+        return {"status": "idle"}
+    return replay.progress()
+
+@app.get("/api/logs")
+def list_logs(session: Session = Depends(get_session)):
+    """Log catalog (metadata only, no filesystem access)"""
+    logs = session.exec(select(LogFile).order_by(LogFile.created_at.desc())).all()
+    return [
+        {
+            "filename": l.filename,
+            "status": l.status,
+            "compressed": l.compressed,
+            "size_bytes": l.size_bytes,
+            "stored_bytes": l.stored_bytes,
+            "row_count": l.row_count,
+            "started_at": l.started_at.isoformat() if l.started_at else None,
+            "ended_at": l.ended_at.isoformat() if l.ended_at else None,
+            "checksum": l.checksum,
+        }
+        for l in logs
+    ]
+
+class LogQueryRequest(BaseModel):
+    files: Optional[List[str]] = None     # None = every cataloged log
+    since: Optional[datetime] = None      # Only logs of runs active after/before these times
+    until: Optional[datetime] = None
+    cycle_min: Optional[int] = None
+    cycle_max: Optional[int] = None
+    phases: Optional[List[str]] = None    # e.g. ["Gripping", "Gripping (Hold)"]
+    force_min: Optional[float] = None
+    force_max: Optional[float] = None
+    time_from: Optional[str] = None       # Time of day "HH:MM:SS[.fff]"
+    time_to: Optional[str] = None
+    mode: str = "rows"                    # "rows" or "aggregate"
+    limit: int = 1000
+
+@app.post("/api/logs/query")
+def query_run_logs(req: LogQueryRequest, session: Session = Depends(get_session)):
+    """Filter one or many run logs, e.g. every sample where force exceeded 9 N"""
+    if req.mode not in ("rows", "aggregate"):
+        raise HTTPException(status_code=422, detail="mode must be 'rows' or 'aggregate'")
+
+    query = select(LogFile).order_by(LogFile.created_at)
+    if req.files:
+        names = [f if f.endswith(".csv") else f + ".csv" for f in req.files]
+        query = query.where(LogFile.filename.in_(names))
+    entries = session.exec(query).all()
+    files = {}
+    for e in entries:
+        # Skip whole files whose time range cannot overlap the requested window
+        if req.since and e.ended_at and e.ended_at < req.since:
+            continue
+        if req.until and (e.started_at or e.created_at) > req.until:
+            continue
+        files[e.filename] = os.path.join(LOG_DIR, e.stored_name)
+
+    log_filter = LogFilter(
+        cycle_min=req.cycle_min, cycle_max=req.cycle_max, phases=req.phases,
+        force_min=req.force_min, force_max=req.force_max,
+        time_from=req.time_from, time_to=req.time_to,
+    )
+    return query_logs(files, log_filter, mode=req.mode, limit=max(1, min(req.limit, 100000)))
+
+# --- 4.4.1 Cross-run Analytics ---
+class CompareRunsRequest(BaseModel):
+    history_ids: Optional[List[int]] = None  # Explicit runs, or...
+    pattern_id: Optional[int] = None         # ...the latest runs of one pattern
+    limit: int = 200
+    include_cycles: bool = False             # Per-cycle series for every run
+
+@app.post("/api/analytics/compare")
+def compare_run_history(req: CompareRunsRequest, session: Session = Depends(get_session)):
+    """Per-run force aggregates and trend series across many runs"""
+    try:
+        from run_analytics import compare_runs  # numpy is only needed here
+    except ImportError:
+        raise HTTPException(status_code=503, detail="Analytics requires numpy (pip install numpy)")
+
+    query = select(RunHistory).order_by(RunHistory.created_at.desc())
+    if req.history_ids:
+        query = query.where(RunHistory.id.in_(req.history_ids))
+    if req.pattern_id is not None:
+        query = query.where(RunHistory.pattern_id == req.pattern_id)
+    history = session.exec(query.limit(max(1, req.limit))).all()
+
+    logs = {
+        l.filename: l
+        for l in session.exec(select(LogFile).where(LogFile.filename.in_([h.filename for h in history]))).all()
+    }
+    runs, missing = [], []
+    for h in reversed(history):  # Chronological for the trend series
+        entry = logs.get(h.filename)
+        path = os.path.join(LOG_DIR, entry.stored_name) if entry else None
+        if not path or not os.path.exists(path):
+            missing.append(h.id)  # Deleted or expired log: nothing to aggregate
+            continue
+        # Closed logs are immutable (checksum); open ones are keyed by their current size
+        version = entry.checksum if entry.status == "closed" and entry.checksum else f"size:{os.path.getsize(path)}"
+        runs.append({"id": h.id, "filename": h.filename, "created_at": h.created_at, "path": path, "version": version})
+    return {**compare_runs(runs, include_cycles=req.include_cycles), "missing": missing}
+
+@app.get("/api/analytics/tool-path/{filename}")
+def log_tool_path(filename: str, max_points: int = 2000, session: Session = Depends(get_session)):
+    """Tool-tip path of a logged run (forward kinematics over the whole log) and waypoint repeatability"""
+    try:
+        from run_analytics import load_tool_path, tool_path_summary  # numpy is only needed here
+    except ImportError:
+        raise HTTPException(status_code=503, detail="Analytics requires numpy (pip install numpy)")
+    filename = filename if filename.endswith(".csv") else filename + ".csv"
+    entry = session.exec(select(LogFile).where(LogFile.filename == filename)).first()
+    path = os.path.join(LOG_DIR, entry.stored_name) if entry else None
+    if not path or not os.path.exists(path):
         raise HTTPException(status_code=404, detail="File not found")
+    run = load_tool_path(path)
+    return {"filename": filename, **tool_path_summary(run, max(1, min(max_points, 100000)))}
+
+class ClassifyRunsRequest(BaseModel):
+    history_ids: Optional[List[int]] = None
+    pattern_id: Optional[int] = None
+    limit: int = 50
+
+@app.post("/api/analytics/classify")
+def classify_run_history(req: ClassifyRunsRequest, session: Session = Depends(get_session)):
+    """Batch material inference over historical logs (one prediction per cycle)"""
+    query = select(RunHistory).order_by(RunHistory.created_at.desc())
+    if req.history_ids:
+        query = query.where(RunHistory.id.in_(req.history_ids))
+    if req.pattern_id is not None:
+        query = query.where(RunHistory.pattern_id == req.pattern_id)
+    history = session.exec(query.limit(max(1, req.limit))).all()
+    logs = {
+        l.filename: l
+        for l in session.exec(select(LogFile).where(LogFile.filename.in_([h.filename for h in history]))).all()
+    }
+
+    model = get_material_model()
+    results = []
+    for h in history:
+        entry = logs.get(h.filename)
+        if not entry:
+            continue
+        cycles = model.classify_log_rows(scan_log(os.path.join(LOG_DIR, entry.stored_name), LogFilter()))
+        summary = {}
+        for c in cycles:
+            summary[c["material"]] = summary.get(c["material"], 0) + 1
+        results.append({"id": h.id, "filename": h.filename, "summary": summary, "cycles": cycles})
+    return {"runs": results, "count": len(results)}
 
 # --- 4.5 Auto Run History ---
 @app.get("/api/history")
 def get_run_history(session: Session = Depends(get_session)):
     """Get list of past auto runs"""
     history = session.exec(select(RunHistory).order_by(RunHistory.created_at.desc())).all()
+    logs = {l.filename: l for l in session.exec(select(LogFile)).all()}
+    # The active run's cycle count is written to the DB behind the run; take the live one
+    live = current_state.snapshot()
+    live_cycles = {live["run_history_id"]: live["run_cycle"]} if live["run_history_id"] else {}
     # Explicitly convert to list of dicts to ensure id is included
     return [
         {
@@ -808,10 +1996,14 @@ def get_run_history(session: Session = Depends(get_session)):
             "pattern_id": h.pattern_id,
             "pattern_name": h.pattern_name,
             "cycle_target": h.cycle_target,
-            "cycle_completed": h.cycle_completed,
+            "cycle_completed": max(h.cycle_completed, live_cycles.get(h.id, 0)),
             "max_force": h.max_force,
             "status": h.status,
-            "created_at": h.created_at.isoformat()
+            "created_at": h.created_at.isoformat(),
+            "log_available": h.filename in logs,
+            "log_expired": h.log_expired,
+            "log_size_bytes": logs[h.filename].size_bytes if h.filename in logs else None,
+            "log_rows": logs[h.filename].row_count if h.filename in logs else None,
         }
         for h in history
     ]
@@ -823,348 +2015,133 @@ def delete_run_history(history_id: int, session: Session = Depends(get_session))
         raise HTTPException(status_code=404, detail="History not found")
     
     # Try to delete the actual file
-    file_path = os.path.join(LOG_DIR, history.filename)
-    if os.path.exists(file_path):
+    entry = session.exec(select(LogFile).where(LogFile.filename == history.filename)).first()
+    if entry:
+        file_path = os.path.join(LOG_DIR, entry.stored_name)
         try:
-            os.remove(file_path)
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            drop_compressed_log(entry.checksum)
+            session.delete(entry)
         except Exception as e:
             print(f"Error deleting file {file_path}: {e}")
+    run_checkpoint.discard(checkpoint_path(history_id))  # An interrupted run can no longer resume
             
     session.delete(history)
     session.commit()
     return {"message": "Deleted"}
 
+# --- 4.5.1 Diagnostics (request timings, sampling profiler) ---
+class ProfileRequest(BaseModel):
+    seconds: float = 10.0
+    interval_ms: float = 5.0
+    threads: List[str] = list(DEFAULT_PROFILE_THREADS)  # Thread name prefixes, "*" = all threads
+
+@app.get("/api/admin/timings")
+def get_request_timings(reset: bool = False):
+    """Per-route request timings of this worker (each uvicorn worker keeps its own)"""
+    routes = request_timings.snapshot()
+    if reset:
+        request_timings.reset()
+    return {"pid": os.getpid(), "routes": routes}
+
+@app.post("/api/admin/profile")
+@control.command
+def start_profile(req: ProfileRequest):
+    """Sample the control threads for a fixed time; poll the status, then fetch /collapsed"""
+    if not 0 < req.seconds <= MAX_PROFILE_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be in (0, {MAX_PROFILE_SECONDS}]")
+    if not profiler.start(req.seconds, req.interval_ms, req.threads):
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    print(f"🔬 Profiling {', '.join(req.threads)} for {req.seconds:g} s")
+    return profiler.status()
+
+@app.get("/api/admin/profile")
+@control.command
+def profile_status():
+    return profiler.status()
+
+@app.get("/api/admin/profile/result")
+@control.command
+def profile_result():
+    """Collapsed stacks of the last profile as JSON (runs in the control owner, where the profiler is)"""
+    if profiler.started_at is None:
+        raise HTTPException(status_code=404, detail="No profile has been run")
+    if profiler.running:
+        raise HTTPException(status_code=409, detail="Profile still running")
+    return {"collapsed": profiler.collapsed()}
+
+@app.get("/api/admin/profile/collapsed")
+def profile_collapsed():
+    """Collapsed stacks of the last profile (flamegraph.pl / speedscope input)"""
+    return PlainTextResponse(profile_result()["collapsed"],
+                             headers={"Content-Disposition": 'attachment; filename="profile.folded"'})
+
+# --- 4.5.2 Event Journal (audit trail) ---
+@app.get("/api/journal/events")
+def journal_events(start: Optional[datetime] = None, end: Optional[datetime] = None,
+                   kind: Optional[List[str]] = Query(None), limit: int = 1000):
+    """Journaled events between two times (ISO 8601), oldest first; kind = command, step, state, snapshot, event"""
+    unknown = set(kind or ()) - set(JOURNAL_KINDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown kind(s): {', '.join(sorted(unknown))}")
+    return journal.events(start.timestamp() if start else None, end.timestamp() if end else None,
+                          kind, max(1, min(limit, 10000)))
+
+@app.get("/api/journal/state")
+def journal_state(at: datetime):
+    """Robot state at a past time, from the last snapshot before it plus the changes since"""
+    result = journal.state_at(at.timestamp())
+    if result is None:
+        raise HTTPException(status_code=404, detail="No journal data for that time")
+    return result
+
+@app.get("/api/journal/stats")
+@control.command
+def journal_stats():
+    return journal.stats()
+
 # --- 4.6 Web Simulation UI (Optional) ---
+# The control panel lives in static/ and is compressed once, then served from memory
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+STATIC_TYPES = {
+    ".html": "text/html; charset=utf-8",
+    ".css": "text/css; charset=utf-8",
+    ".js": "application/javascript; charset=utf-8",
+}
+
+@lru_cache(maxsize=32)
+def load_static_asset(name: str):
+    """Read and gzip a UI asset once: (raw, gzipped, etag), or None if missing"""
+    path = os.path.join(STATIC_DIR, name)
+    if os.path.basename(name) != name or not os.path.isfile(path):
+        return None
+    with open(path, "rb") as f:
+        raw = f.read()
+    return raw, gzip.compress(raw, 9), '"%s"' % hashlib.sha256(raw).hexdigest()[:16]
+
+def static_response(name: str, request: Request, cache_control: str) -> Response:
+    asset = load_static_asset(name)
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    raw, packed, etag = asset
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    media_type = STATIC_TYPES.get(os.path.splitext(name)[1], "application/octet-stream")
+    # Only a gzip copy is kept; honours q-values (gzip;q=0 means identity)
+    if negotiate(request.headers.get("accept-encoding", ""), ["gzip"]) == "gzip":
+        return Response(packed, media_type=media_type, headers={**headers, "Content-Encoding": "gzip"})
+    return Response(raw, media_type=media_type, headers=headers)
+
 @app.get("/", response_class=HTMLResponse)
-def ui():
-    return """
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>Robot Control Panel</title>
-        <style>
-            body {
-                font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-                background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-                padding: 20px;
-                margin: 0;
-            }
-            .container {
-                max-width: 800px;
-                margin: 0 auto;
-                background: white;
-                border-radius: 20px;
-                padding: 30px;
-                box-shadow: 0 20px 60px rgba(0,0,0,0.3);
-            }
-            h1 {
-                color: #667eea;
-                text-align: center;
-                margin-top: 0;
-            }
-            .status {
-                background: #f0f4f8;
-                padding: 15px;
-                border-radius: 10px;
-                margin-bottom: 20px;
-                font-family: monospace;
-                font-size: 12px;
-            }
-            .joint-control {
-                margin: 20px 0;
-                padding: 15px;
-                background: #f8f9fa;
-                border-radius: 10px;
-                display: grid;
-                grid-template-columns: 2fr 1fr;
-                gap: 20px;
-                align-items: center;
-            }
-            .joint-slider-section {
-                display: flex;
-                flex-direction: column;
-            }
-            .joint-label {
-                font-weight: 600;
-                color: #333;
-                margin-bottom: 8px;
-                font-size: 14px;
-            }
-            .joint-display-section {
-                display: flex;
-                flex-direction: column;
-                align-items: center;
-                justify-content: center;
-            }
-            .joint-display {
-                background: #667eea;
-                color: white;
-                padding: 12px 24px;
-                border-radius: 8px;
-                text-align: center;
-                font-weight: bold;
-                font-size: 24px;
-                box-shadow: 0 2px 8px rgba(102, 126, 234, 0.3);
-                min-width: 100px;
-            }
-            .display-label {
-                font-size: 11px;
-                color: #888;
-                margin-bottom: 6px;
-                text-transform: uppercase;
-                letter-spacing: 1px;
-            }
-            .slider-label {
-                font-size: 12px;
-                color: #666;
-                margin-top: 4px;
-            }
-            input[type="range"] {
-                width: 100%;
-                height: 8px;
-                border-radius: 5px;
-                background: #d3d3d3;
-                outline: none;
-                -webkit-appearance: none;
-            }
-            input[type="range"]::-webkit-slider-thumb {
-                -webkit-appearance: none;
-                appearance: none;
-                width: 20px;
-                height: 20px;
-                border-radius: 50%;
-                background: #667eea;
-                cursor: pointer;
-            }
-            input[type="range"]::-moz-range-thumb {
-                width: 20px;
-                height: 20px;
-                border-radius: 50%;
-                background: #667eea;
-                cursor: pointer;
-            }
-            .gripper-control {
-                background: linear-gradient(135deg, #f093fb 0%, #f5576c 100%);
-                color: white;
-                padding: 20px;
-                border-radius: 10px;
-                margin-top: 20px;
-            }
-            .btn {
-                background: #00c853;
-                color: white;
-                border: none;
-                padding: 12px 30px;
-                border-radius: 8px;
-                cursor: pointer;
-                font-size: 16px;
-                font-weight: bold;
-                margin: 10px 5px;
-            }
-            .btn:hover {
-                background: #00e676;
-            }
-            .btn-danger {
-                background: #ff5252;
-            }
-            .btn-danger:hover {
-                background: #ff6e6e;
-            }
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <h1>🤖 Robot Gripper Control Panel</h1>
-            
-            <div class="status" id="status">Loading...</div>
-            
-            <h3>Joint Controls</h3>
-            
-            <div class="joint-control">
-                <div class="joint-slider-section">
-                    <div class="joint-label">Joint 1 (Base Rotation)</div>
-                    <div class="slider-label">Manual Control:</div>
-                    <input type="range" id="j1" min="-180" max="180" value="0" step="1">
-                    <div style="text-align: right; font-size: 12px; color: #999; margin-top: 4px;">
-                        <span id="j1-slider-val">0°</span>
-                    </div>
-                </div>
-                <div class="joint-display-section">
-                    <div class="display-label">Position</div>
-                    <div class="joint-display" id="j1-display">0°</div>
-                </div>
-            </div>
-            
-            <div class="joint-control">
-                <div class="joint-slider-section">
-                    <div class="joint-label">Joint 2 (Shoulder)</div>
-                    <div class="slider-label">Manual Control:</div>
-                    <input type="range" id="j2" min="-90" max="90" value="0" step="1">
-                    <div style="text-align: right; font-size: 12px; color: #999; margin-top: 4px;">
-                        <span id="j2-slider-val">0°</span>
-                    </div>
-                </div>
-                <div class="joint-display-section">
-                    <div class="display-label">Position</div>
-                    <div class="joint-display" id="j2-display">0°</div>
-                </div>
-            </div>
-            
-            <div class="joint-control">
-                <div class="joint-slider-section">
-                    <div class="joint-label">Joint 3 (Elbow)</div>
-                    <div class="slider-label">Manual Control:</div>
-                    <input type="range" id="j3" min="-90" max="90" value="0" step="1">
-                    <div style="text-align: right; font-size: 12px; color: #999; margin-top: 4px;">
-                        <span id="j3-slider-val">0°</span>
-                    </div>
-                </div>
-                <div class="joint-display-section">
-                    <div class="display-label">Position</div>
-                    <div class="joint-display" id="j3-display">0°</div>
-                </div>
-            </div>
-            
-            <div class="joint-control">
-                <div class="joint-slider-section">
-                    <div class="joint-label">Joint 4 (Wrist Roll)</div>
-                    <div class="slider-label">Manual Control:</div>
-                    <input type="range" id="j4" min="-180" max="180" value="0" step="1">
-                    <div style="text-align: right; font-size: 12px; color: #999; margin-top: 4px;">
-                        <span id="j4-slider-val">0°</span>
-                    </div>
-                </div>
-                <div class="joint-display-section">
-                    <div class="display-label">Position</div>
-                    <div class="joint-display" id="j4-display">0°</div>
-                </div>
-            </div>
-            
-            <div class="joint-control">
-                <div class="joint-slider-section">
-                    <div class="joint-label">Joint 5 (Wrist Pitch)</div>
-                    <div class="slider-label">Manual Control:</div>
-                    <input type="range" id="j5" min="-90" max="90" value="0" step="1">
-                    <div style="text-align: right; font-size: 12px; color: #999; margin-top: 4px;">
-                        <span id="j5-slider-val">0°</span>
-                    </div>
-                </div>
-                <div class="joint-display-section">
-                    <div class="display-label">Position</div>
-                    <div class="joint-display" id="j5-display">0°</div>
-                </div>
-            </div>
-            
-            <div class="joint-control">
-                <div class="joint-slider-section">
-                    <div class="joint-label">Joint 6 (Wrist Yaw)</div>
-                    <div class="slider-label">Manual Control:</div>
-                    <input type="range" id="j6" min="-180" max="180" value="0" step="1">
-                    <div style="text-align: right; font-size: 12px; color: #999; margin-top: 4px;">
-                        <span id="j6-slider-val">0°</span>
-                    </div>
-                </div>
-                <div class="joint-display-section">
-                    <div class="display-label">Position</div>
-                    <div class="joint-display" id="j6-display">0°</div>
-                </div>
-            </div>
-            
-            <div style="text-align: center; margin-top: 20px;">
-                <button class="btn" onclick="sendAll()">📤 Send Joints</button>
-                <button class="btn btn-danger" onclick="resetAll()">🔄 Reset All</button>
-            </div>
-        </div>
-        
-        <script>
-            let sendTimeout = null;
-            
-            // Update slider values when sliders move
-            ['j1', 'j2', 'j3', 'j4', 'j5', 'j6'].forEach(id => {
-                const slider = document.getElementById(id);
-                const sliderVal = document.getElementById(id + '-slider-val');
-                slider.addEventListener('input', (e) => {
-                    sliderVal.textContent = e.target.value + '°';
-                    
-                    // Auto-send after 300ms of no changes (debounce)
-                    clearTimeout(sendTimeout);
-                    sendTimeout = setTimeout(() => {
-                        sendAll(true); // true = silent mode (no alert)
-                    }, 300);
-                });
-            });
-            
-            // Send all joints to backend
-            async function sendAll(silent = false) {
-                const data = {
-                    j1: parseFloat(document.getElementById('j1').value),
-                    j2: parseFloat(document.getElementById('j2').value),
-                    j3: parseFloat(document.getElementById('j3').value),
-                    j4: parseFloat(document.getElementById('j4').value),
-                    j5: parseFloat(document.getElementById('j5').value),
-                    j6: parseFloat(document.getElementById('j6').value)
-                };
-                
-                try {
-                    const res = await fetch('/api/robot/manual-move', {
-                        method: 'POST',
-                        headers: { 'Content-Type': 'application/json' },
-                        body: JSON.stringify(data)
-                    });
-                    if (res.ok && !silent) {
-                        alert('✅ Joints updated!');
-                    }
-                } catch (e) {
-                    if (!silent) {
-                        alert('❌ Error: ' + e.message);
-                    }
-                }
-            }
-            
-            // Reset all to zero
-            function resetAll() {
-                ['j1', 'j2', 'j3', 'j4', 'j5', 'j6'].forEach(id => {
-                    document.getElementById(id).value = 0;
-                    document.getElementById(id + '-slider-val').textContent = '0°';
-                });
-            }
-            
-            // Status and Joint update - synced with backend
-            setInterval(async() => {
-                try {
-                    const res = await fetch('/data');
-                    const data = await res.json();
-                    
-                    // Update status display
-                    document.getElementById('status').innerHTML = 
-                        `<strong>Force:</strong> ${data.force} N | ` +
-                        `<strong>Material:</strong> ${data.material} (${data.confidence}%) | ` +
-                        `<strong>Gripper:</strong> ${data.gripper_angle}° | ` +
-                        `<strong>Mode:</strong> ${data.mode}`;
-                    
-                    // Always update joint displays from backend
-                    updateJointDisplay('j1', data.j1);
-                    updateJointDisplay('j2', data.j2);
-                    updateJointDisplay('j3', data.j3);
-                    updateJointDisplay('j4', data.j4);
-                    updateJointDisplay('j5', data.j5);
-                    updateJointDisplay('j6', data.j6);
-                } catch (e) {
-                    document.getElementById('status').textContent = 'Connection Error';
-                }
-            }, 300); // Faster polling for smooth animation during sequence playback
-            
-            // Helper to update joint display (real robot position from backend)
-            function updateJointDisplay(jointId, value) {
-                const display = document.getElementById(jointId + '-display');
-                if (display) {
-                    display.textContent = Math.round(value) + '°';
-                }
-            }
-        </script>
-    </body>
-    </html>
-    """
+def ui(request: Request):
+    # Always revalidate the page itself (cheap 304 via ETag)
+    return static_response("index.html", request, "no-cache")
+
+@app.get("/static/{name}")
+def static_asset(name: str, request: Request):
+    return static_response(name, request, "public, max-age=3600")
 
 # Custom logging filter to suppress /data endpoint logs
 class EndpointFilter(logging.Filter):
@@ -1176,7 +2153,15 @@ class EndpointFilter(logging.Filter):
 logging.getLogger("uvicorn.access").addFilter(EndpointFilter())
 
 if __name__ == "__main__":
+    import uvicorn  # Not needed when served by an external uvicorn/gunicorn
     print("🚀 Starting Robot Gripper Backend Server...")
     print("📡 Polling endpoints: /data (suppressed in logs)")
     print("🌐 Web UI: http://localhost:8000")
+    workers = int(os.environ.get("ROBOT_WORKERS", 1))
+    if workers > 1:
+        # Reads are served by every worker; one of them owns the control loop.
+        # Re-exec through the uvicorn CLI: spawned workers would otherwise import
+        # this file twice (as __mp_main__ and as simulation).
+        os.execv(sys.executable, [sys.executable, "-m", "uvicorn", "simulation:app",
+                                  "--host", "0.0.0.0", "--port", "8000", "--workers", str(workers)])
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,84 @@
+let sendTimeout = null;
+
+// Update slider values when sliders move
+['j1', 'j2', 'j3', 'j4', 'j5', 'j6'].forEach(id => {
+    const slider = document.getElementById(id);
+    const sliderVal = document.getElementById(id + '-slider-val');
+    slider.addEventListener('input', (e) => {
+        sliderVal.textContent = e.target.value + '°';
+
+        // Auto-send after 300ms of no changes (debounce)
+        clearTimeout(sendTimeout);
+        sendTimeout = setTimeout(() => {
+            sendAll(true); // true = silent mode (no alert)
+        }, 300);
+    });
+});
+
+// Send all joints to backend
+async function sendAll(silent = false) {
+    const data = {
+        j1: parseFloat(document.getElementById('j1').value),
+        j2: parseFloat(document.getElementById('j2').value),
+        j3: parseFloat(document.getElementById('j3').value),
+        j4: parseFloat(document.getElementById('j4').value),
+        j5: parseFloat(document.getElementById('j5').value),
+        j6: parseFloat(document.getElementById('j6').value)
+    };
+
+    try {
+        const res = await fetch('/api/robot/manual-move', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(data)
+        });
+        if (res.ok && !silent) {
+            alert('✅ Joints updated!');
+        }
+    } catch (e) {
+        if (!silent) {
+            alert('❌ Error: ' + e.message);
+        }
+    }
+}
+
+// Reset all to zero
+function resetAll() {
+    ['j1', 'j2', 'j3', 'j4', 'j5', 'j6'].forEach(id => {
+        document.getElementById(id).value = 0;
+        document.getElementById(id + '-slider-val').textContent = '0°';
+    });
+}
+
+// Status and Joint update - synced with backend
+setInterval(async() => {
+    try {
+        const res = await fetch('/data');
+        const data = await res.json();
+
+        // Update status display
+        document.getElementById('status').innerHTML = 
+            `<strong>Force:</strong> ${data.force} N | ` +
+            `<strong>Material:</strong> ${data.material} (${data.confidence}%) | ` +
+            `<strong>Gripper:</strong> ${data.gripper_angle}° | ` +
+            `<strong>Mode:</strong> ${data.mode}`;
+
+        // Always update joint displays from backend
+        updateJointDisplay('j1', data.j1);
+        updateJointDisplay('j2', data.j2);
+        updateJointDisplay('j3', data.j3);
+        updateJointDisplay('j4', data.j4);
+        updateJointDisplay('j5', data.j5);
+        updateJointDisplay('j6', data.j6);
+    } catch (e) {
+        document.getElementById('status').textContent = 'Connection Error';
+    }
+}, 300); // Faster polling for smooth animation during sequence playback
+
+// Helper to update joint display (real robot position from backend)
+function updateJointDisplay(jointId, value) {
+    const display = document.getElementById(jointId + '-display');
+    if (display) {
+        display.textContent = Math.round(value) + '°';
+    }
+}
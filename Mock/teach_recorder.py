@@ -0,0 +1,188 @@
+"""
+Teach-by-demonstration: record the arm while an operator jogs it, then turn
+the dense recording into a compact pattern.
+
+The recorder samples joints and gripper angle at a fixed rate into compact
+arrays. build_steps() keeps the gripper open/close events as grip/release
+steps and simplifies the motion between them with Ramer-Douglas-Peucker in
+joint space, so a few thousand samples become a handful of move_joints
+waypoints that stay within about `tolerance` degrees of the demonstrated path.
+"""
+
+import math
+import threading
+import time
+from array import array
+from typing import Callable, Dict, List, Optional, Sequence
+
+from motion import JOINT_NAMES
+
+RECORD_RATE_HZ = 50.0
+MAX_RECORD_SECONDS = 900          # Recording stops by itself after this long
+DEFAULT_TOLERANCE = 1.0           # Max joint-space deviation (degrees) of the simplified path
+GRIPPER_CLOSED_BELOW = 179        # Same threshold as manual gripper control
+
+
+def _farthest_from_segment(points: Sequence[Sequence[float]], first: int, last: int):
+    """(index, distance) of the point between first and last farthest from segment first-last.
+
+    Distance to the segment, not the line through it: jogging often doubles back.
+    """
+    a = points[first]
+    d = [bi - ai for ai, bi in zip(a, points[last])]
+    length2 = sum(x * x for x in d)
+    worst, worst_i = -1.0, -1
+    for i in range(first + 1, last):
+        rel = [pi - ai for pi, ai in zip(points[i], a)]
+        t = sum(r * di for r, di in zip(rel, d)) / length2 if length2 else 0.0
+        if t < 0.0:
+            t = 0.0
+        elif t > 1.0:
+            t = 1.0
+        dist2 = sum((r - t * di) ** 2 for r, di in zip(rel, d))
+        if dist2 > worst:
+            worst, worst_i = dist2, i
+    return worst_i, math.sqrt(worst) if worst > 0 else 0.0
+
+
+def simplify_path(points: Sequence[Sequence[float]], tolerance: float) -> List[int]:
+    """
+    Ramer-Douglas-Peucker: indices of the points to keep (first and last always
+    kept). A radial-distance pass first drops samples within tolerance/2 of the
+    previous kept one, which removes most of a slow jog in O(n).
+    """
+    n = len(points)
+    if n <= 2:
+        return list(range(n))
+    radius2 = (tolerance / 2) ** 2
+    candidates = [0]
+    for i in range(1, n - 1):
+        prev = points[candidates[-1]]
+        if sum((p - q) ** 2 for p, q in zip(points[i], prev)) > radius2:
+            candidates.append(i)
+    candidates.append(n - 1)
+
+    reduced = [points[i] for i in candidates]
+    m = len(reduced)
+    keep = [False] * m
+    keep[0] = keep[-1] = True
+    stack = [(0, m - 1)]  # Iterative, so long recordings cannot hit the recursion limit
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        worst_i, worst = _farthest_from_segment(reduced, first, last)
+        if worst > tolerance:
+            keep[worst_i] = True
+            stack.append((first, worst_i))
+            stack.append((worst_i, last))
+    return [candidates[i] for i, k in enumerate(keep) if k]
+
+
+def build_steps(times: Sequence[float], joints: Sequence[Sequence[float]], gripper: Sequence[int],
+                tolerance: float = DEFAULT_TOLERANCE, keep_timing: bool = False) -> List[Dict]:
+    """
+    Turn a recording into pattern steps (dicts with action_type, j1..j6,
+    gripper_angle, wait_time). With keep_timing, each move keeps the time the
+    operator took (the planner only ever stretches a move); otherwise moves
+    run at the joint velocity limits (wait_time 0).
+    """
+    n = len(times)
+    if n == 0:
+        return []
+
+    # Split at gripper open/close transitions; each span is simplified separately
+    closed = [g < GRIPPER_CLOSED_BELOW for g in gripper]
+    transitions = [i for i in range(1, n) if closed[i] != closed[i - 1]]
+    bounds = [0] + transitions + [n - 1]
+
+    steps: List[Dict] = []
+    last_time = times[0]
+
+    def add_move(i: int):
+        nonlocal last_time
+        step = {"action_type": "move_joints", "gripper_angle": int(gripper[i]),
+                "wait_time": round(times[i] - last_time, 3) if keep_timing and steps else 0.0}
+        step.update({name: round(joints[i][k], 3) for k, name in enumerate(JOINT_NAMES)})
+        steps.append(step)
+        last_time = times[i]
+
+    add_move(0)  # Start pose, so playback begins where the demonstration did
+    for k, (span_start, span_end) in enumerate(zip(bounds, bounds[1:])):
+        kept = simplify_path(joints[span_start:span_end + 1], tolerance)
+        for i in kept[1:]:
+            add_move(span_start + i)
+        if k < len(transitions):
+            # span_end is the first sample after the gripper opened or closed
+            pose = {name: steps[-1][name] for name in JOINT_NAMES}
+            if closed[span_end]:
+                # Grip with the tightest angle reached while closed
+                end = next((j for j in range(span_end, n) if not closed[j]), n)
+                steps.append({"action_type": "grip", "gripper_angle": int(min(gripper[span_end:end])),
+                              "wait_time": 0.0, **pose})
+            else:
+                steps.append({"action_type": "release", "gripper_angle": 180, "wait_time": 0.0, **pose})
+
+    # Drop consecutive duplicate waypoints (e.g. a span boundary that RDP kept too)
+    compact: List[Dict] = []
+    for step in steps:
+        if (compact and step["action_type"] == "move_joints" and compact[-1]["action_type"] == "move_joints"
+                and all(step[name] == compact[-1][name] for name in JOINT_NAMES)):
+            continue
+        compact.append(step)
+    return compact
+
+
+class TeachRecorder:
+    """Samples `read_sample()` -> (joints, gripper_angle) at `rate_hz` in a background thread"""
+
+    def __init__(self, read_sample: Callable[[], tuple], rate_hz: float = RECORD_RATE_HZ,
+                 max_seconds: float = MAX_RECORD_SECONDS):
+        self.read_sample = read_sample
+        self.interval = 1.0 / rate_hz
+        self.max_samples = int(max_seconds * rate_hz)
+        self.times = array("d")
+        self.joints = [array("d") for _ in JOINT_NAMES]
+        self.gripper = array("h")
+        self.started_at: Optional[float] = None
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def recording(self) -> bool:
+        return self._running
+
+    @property
+    def samples(self) -> int:
+        return len(self.times)
+
+    def start(self):
+        self.started_at = time.monotonic()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="teach-recorder", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join(timeout=1)
+
+    def _run(self):
+        next_tick = time.monotonic()
+        while self._running and len(self.times) < self.max_samples:
+            joints, gripper_angle = self.read_sample()
+            self.times.append(time.monotonic() - self.started_at)
+            for column, value in zip(self.joints, joints):
+                column.append(value)
+            self.gripper.append(int(gripper_angle))
+            next_tick += self.interval
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_tick = time.monotonic()
+        self._running = False
+
+    def build_steps(self, tolerance: float = DEFAULT_TOLERANCE, keep_timing: bool = False) -> List[Dict]:
+        points = list(zip(*self.joints))
+        return build_steps(self.times, points, self.gripper, tolerance, keep_timing)
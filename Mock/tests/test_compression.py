@@ -0,0 +1,78 @@
+"""
+Accept-Encoding negotiation and the compression middleware.
+
+Run from Mock/: python -m pytest -q tests
+"""
+
+import os
+import sys
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, Response
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from compression import CompressionMiddleware, compress, negotiate  # noqa: E402
+
+
+def test_negotiate_prefers_server_order_among_equal_q():
+    assert negotiate("gzip, br, zstd", ["zstd", "br", "gzip"]) == "zstd"
+    assert negotiate("gzip", ["zstd", "br", "gzip"]) == "gzip"
+
+
+def test_negotiate_honours_q_values():
+    assert negotiate("zstd;q=0.5, gzip", ["zstd", "gzip"]) == "gzip"
+    assert negotiate("gzip;q=0", ["gzip"]) is None
+    assert negotiate("gzip;q=bogus", ["gzip"]) is None
+
+
+def test_negotiate_wildcard_and_identity():
+    assert negotiate("*", ["br", "gzip"]) == "br"
+    assert negotiate("*;q=0, gzip", ["br", "gzip"]) == "gzip"
+    assert negotiate("", ["gzip"]) is None
+    assert negotiate("identity", ["gzip"]) is None
+
+
+BODY = "robot " * 1000
+
+
+def client() -> TestClient:
+    app = FastAPI()
+
+    @app.get("/text")
+    def text():
+        return PlainTextResponse(BODY, headers={"Vary": "Origin"})
+
+    @app.get("/small")
+    def small():
+        return PlainTextResponse("ok")
+
+    @app.get("/packed")
+    def packed():
+        return Response(compress(BODY.encode(), "gzip"), media_type="text/plain",
+                        headers={"Content-Encoding": "gzip", "Vary": "Accept-Encoding"})
+
+    app.add_middleware(CompressionMiddleware)
+    return TestClient(app)
+
+
+def test_compressed_response_has_one_merged_vary():
+    r = client().get("/text", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert r.text == BODY
+    assert r.headers.get_list("vary") == ["Origin, Accept-Encoding"]
+
+
+def test_small_and_identity_responses_are_untouched():
+    c = client()
+    assert "content-encoding" not in c.get("/small", headers={"Accept-Encoding": "gzip"}).headers
+    r = c.get("/text", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in r.headers and r.text == BODY
+
+
+def test_precompressed_response_passes_through():
+    r = client().get("/packed", headers={"Accept-Encoding": "gzip, br"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert r.headers.get_list("vary") == ["Accept-Encoding"]
+    assert r.text == BODY  # Decoded once: not compressed twice
@@ -0,0 +1,88 @@
+"""
+Forward/inverse kinematics and the per-pose collision checker.
+
+Run from Mock/: python -m pytest -q tests
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+np = pytest.importorskip("numpy")
+
+from inverse_kinematics import (IKError, ORIENTATION_TOLERANCE, POSITION_TOLERANCE,  # noqa: E402
+                                resolve_cartesian, solve, solve_cached)
+from kinematics import tool_pose  # noqa: E402
+from motion import JOINT_LIMITS, JOINT_NAMES  # noqa: E402
+from trajectory_check import check_poses  # noqa: E402
+
+
+def angle_error(a, b):
+    return abs((a - b + 180.0) % 360.0 - 180.0)
+
+
+def reachable_poses(count, seed=3):
+    """Tool poses of random joint sets away from the limits and the wrist singularity"""
+    rng = np.random.default_rng(seed)
+    lo, hi = np.asarray(JOINT_LIMITS).T * 0.8
+    joints = rng.uniform(lo, hi, (count, 6))
+    joints[:, 4] = np.where(np.abs(joints[:, 4]) < 10, 30.0, joints[:, 4])
+    return joints, tool_pose(joints)
+
+
+def test_ik_round_trip_full_pose():
+    joints, poses = reachable_poses(20)
+    for start, pose in zip(joints, poses):
+        seed = np.clip(start + 5.0, *np.asarray(JOINT_LIMITS).T)  # Near, not at, the answer
+        solved = tool_pose(np.asarray([solve(pose, seed)]))[0]
+        assert np.max(np.abs(solved[:3] - pose[:3])) <= POSITION_TOLERANCE
+        assert max(angle_error(a, b) for a, b in zip(solved[3:], pose[3:])) <= ORIENTATION_TOLERANCE
+
+
+def test_ik_position_only_ignores_orientation():
+    _, poses = reachable_poses(10, seed=5)
+    for pose in poses:
+        solved = tool_pose(np.asarray([solve([*pose[:3], None, None, None], [0, 0, 0, 0, 30, 0])]))[0]
+        assert np.max(np.abs(solved[:3] - pose[:3])) <= POSITION_TOLERANCE
+
+
+def test_ik_out_of_reach():
+    with pytest.raises(IKError):
+        solve([1000.0, 0.0, 0.0], [0] * 6)
+    with pytest.raises(IKError):
+        solve_cached([1000.0, 0.0, 0.0], [0] * 6)
+
+
+def test_resolve_cartesian_fills_joints_and_reports_unreachable():
+    _, poses = reachable_poses(1, seed=11)
+    x, y, z = (float(v) for v in poses[0][:3])
+    steps = [
+        {"action_type": "move_cartesian", "x": x, "y": y, "z": z},
+        {"action_type": "grip"},
+        {"action_type": "move_cartesian", "x": 1000.0, "y": 0.0, "z": 0.0},
+        {"action_type": "move_cartesian", "x": 100.0},
+    ]
+    resolved, issues = resolve_cartesian(steps, [0] * 6)
+    reached = tool_pose(np.asarray([[resolved[0][name] for name in JOINT_NAMES]]))[0]
+    assert np.max(np.abs(reached[:3] - (x, y, z))) <= POSITION_TOLERANCE
+    assert [i["step"] for i in issues] == [2, 3]
+    assert all(i["severity"] == "error" for i in issues)
+    # Unreachable steps keep the previous joint target
+    assert [resolved[2][name] for name in JOINT_NAMES] == [resolved[0][name] for name in JOINT_NAMES]
+
+
+def test_check_poses():
+    result = check_poses(np.array([
+        [0, 0, 0, 0, 0, 0],      # Upright: clear
+        [0, 90, 90, 0, 0, 0],    # Folded down through the mount
+        [0, 90, 90, 0, 90, 0],   # Gripper folded back into the base
+        [0, 120, 0, 0, 0, 0],    # J2 past its limit
+    ], dtype=float))
+    assert (result["clearance"][0] > 0).all() and result["floor"][0] > 0
+    assert result["floor"][1] < 0
+    assert (result["clearance"][2] < 0).any()
+    assert result["limits"][3].tolist() == [False, True, False, False, False, False]
+    assert not result["limits"][:3].any()
@@ -0,0 +1,83 @@
+"""
+Material classification from grip force curves: features, the built-in
+model, training and batch inference over run logs.
+
+Run from Mock/: python -m pytest -q tests
+"""
+
+import math
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from material_classifier import MaterialClassifier, extract_features  # noqa: E402
+from what_if import MATERIALS, calculate_realistic_force  # noqa: E402
+
+RAMP = [int(180 - 180 * (i + 1) / 20) for i in range(20)]  # Gripper angles of the auto-run grip ramp
+
+
+def grip_curve(material, max_force, rng):
+    return [(angle, calculate_realistic_force(angle, max_force, material, rng)) for angle in RAMP]
+
+
+def test_features_of_a_power_curve():
+    curve = [(angle, 10.0 * ((180 - angle) / 180) ** 2) for angle in range(170, -1, -10)]
+    features = extract_features(curve)
+    assert features["exponent"] == pytest.approx(2.0, abs=1e-6)
+    assert features["plateau"] == pytest.approx(10.0, rel=0.05)
+    assert features["stiffness"] > 0
+
+
+def test_features_without_angles_or_samples():
+    assert extract_features([]) == {}
+    assert set(extract_features([(None, 3.0), (None, 4.0)])) == {"plateau"}
+
+
+def test_no_contact_is_unknown():
+    model = MaterialClassifier.load(None)
+    assert model.predict({}) == ("Unknown", 0.0)
+    assert model.classify_curve([(angle, 0.0) for angle in RAMP]) == ("Unknown", 0.0)
+
+
+def test_default_model_matches_force_limit_prior():
+    model = MaterialClassifier.load(None)
+    assert model.predict({"plateau": 9.0})[0] == "Metal"
+    assert model.predict({"plateau": 6.0})[0] == "Wood"
+    assert model.predict({"plateau": 2.0})[0] == "Sponge/Soft"
+    _, confidence = model.predict({"plateau": 9.0})
+    assert 0 < confidence <= 100
+
+
+def test_trained_model_separates_materials_across_force_limits(tmp_path):
+    rng = random.Random(2)
+    rows = [(extract_features(grip_curve(m, rng.uniform(4, 12), rng)), m) for m in MATERIALS for _ in range(60)]
+    model = MaterialClassifier.fit(rows)
+    assert sum(c["prior"] for c in model.classes.values()) == pytest.approx(1.0)
+
+    path = str(tmp_path / "model.json")
+    model.save(path)
+    loaded = MaterialClassifier.load(path)
+    assert loaded.params == model.params
+
+    tests = [(m, grip_curve(m, rng.uniform(4, 12), rng)) for m in MATERIALS for _ in range(50)]
+    correct = sum(loaded.classify_curve(curve)[0] == m for m, curve in tests)
+    assert correct / len(tests) >= 0.9
+
+
+def test_classify_log_rows_one_prediction_per_cycle():
+    rng = random.Random(4)
+    rows = [{"Cycle": "1", "Phase": "Moving", "Force_N": "0", "Gripper": "180"}]
+    for cycle, material in ((1, "Metal"), (2, "Sponge/Soft")):
+        rows += [{"Cycle": str(cycle), "Phase": "Gripping", "Force_N": str(force), "Gripper": str(angle)}
+                 for angle, force in grip_curve(material, 9.0, rng)]
+    rows.append({"Cycle": "2", "Phase": "Gripping", "Force_N": "n/a", "Gripper": "0"})  # Damaged row
+    rows.append({"Cycle": "3", "Phase": "Gripping (Hold)", "Force_N": "0", "Gripper": ""})
+
+    results = MaterialClassifier.load(None).classify_log_rows(rows)
+    assert [(r["cycle"], r["samples"]) for r in results] == [(1, 20), (2, 20), (3, 1)]
+    assert results[2]["material"] == "Unknown"
+    assert all(not math.isnan(r["confidence"]) for r in results)
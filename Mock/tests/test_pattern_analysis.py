@@ -0,0 +1,62 @@
+"""
+Pre-flight analysis: which patterns may run.
+
+Patterns that passed the waypoint checks before the trajectory check existed
+must stay runnable on the built-in (uncalibrated) arm geometry; geometric
+findings only block runs once the geometry is calibrated.
+
+Run from Mock/: python -m pytest -q tests
+"""
+
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip("numpy")
+
+import trajectory_check  # noqa: E402
+from motion import JOINT_LIMITS, JOINT_NAMES  # noqa: E402
+from pattern_analysis import analyze_steps, validate_steps  # noqa: E402
+
+
+def move(*joints, duration=1.0):
+    return {"action_type": "move_joints", **dict(zip(JOINT_NAMES, joints)), "wait_time": duration}
+
+
+GRIP = {"action_type": "grip", "wait_time": 0.0}
+RELEASE = {"action_type": "release", "wait_time": 0.0}
+
+# Within limits at every waypoint, but the placeholder geometry puts the tool below the mount
+BELOW_FLOOR = [move(0, 90, 90, 0, 0, 0), GRIP, move(0, 0, 0, 0, 0, 0), RELEASE]
+
+
+def test_baseline_valid_pattern_stays_runnable():
+    assert not [i for i in validate_steps(BELOW_FLOOR) if i["severity"] == "error"]
+    analysis = analyze_steps(BELOW_FLOOR)
+    assert analysis["valid"]
+    floor = [i for i in analysis["issues"] if "mounting surface" in i["message"]]
+    assert floor and all(i["severity"] == "warning" for i in floor)
+
+
+def test_random_baseline_valid_patterns_stay_runnable():
+    rng = random.Random(7)
+    for _ in range(200):
+        steps = [move(*(rng.uniform(lo, hi) for lo, hi in JOINT_LIMITS)) for _ in range(rng.randint(1, 5))]
+        assert not [i for i in validate_steps(steps) if i["severity"] == "error"]
+        assert analyze_steps(steps)["valid"], analyze_steps(steps)["issues"]
+
+
+def test_calibrated_geometry_blocks_floor_hits(monkeypatch):
+    monkeypatch.setattr(trajectory_check, "GEOMETRY_CALIBRATED", True)
+    analysis = analyze_steps(BELOW_FLOOR)
+    assert not analysis["valid"]
+    assert any(i["severity"] == "error" and "mounting surface" in i["message"] for i in analysis["issues"])
+
+
+def test_joint_limits_are_still_errors():
+    analysis = analyze_steps([move(0, 120, 0, 0, 0, 0)])
+    assert not analysis["valid"]
@@ -0,0 +1,120 @@
+"""
+ProtocolDriver against the loopback controller: losing the controller in the
+middle of a run, getting it back, and a controller too slow to answer.
+
+Run from Mock/: python -m pytest -q tests
+"""
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from robot_driver import DriverError, LoopbackController, ProtocolDriver, RobotDriver  # noqa: E402
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture
+def controller():
+    controller = LoopbackController().start()
+    yield controller
+    controller.stop()
+
+
+def test_controller_killed_mid_run(controller):
+    lost = []
+    driver = ProtocolDriver(controller.url, tick=0.01, on_disconnect=lost.append)
+    driver.start()
+    try:
+        # A "run" streaming setpoints until the driver refuses them
+        running = threading.Event()
+        running.set()
+        failures = []
+
+        def run():
+            angle = 0.0
+            while running.is_set():
+                try:
+                    driver.set_joints([angle, 0, 0, 0, 0, 0])
+                except DriverError as e:
+                    failures.append(e)
+                    return
+                angle += 0.1
+                time.sleep(0.005)
+
+        runner = threading.Thread(target=run)
+        runner.start()
+        assert wait_for(lambda: controller.joints[0] > 0)
+
+        controller.stop()  # Power cut mid-run
+        assert wait_for(lambda: lost)
+        runner.join(timeout=2)
+        running.clear()
+
+        assert isinstance(lost[0], DriverError)
+        assert failures and failures[0] is driver.error
+        assert not runner.is_alive()
+        assert driver.describe()["connected"] is False
+        assert driver.counters["disconnects"] == 1
+        with pytest.raises(DriverError):
+            driver.set_gripper(90, 5.0)
+        with pytest.raises(DriverError):
+            driver.request("PING")
+        assert driver._thread.is_alive()  # The driver thread survives, waiting to reconnect
+    finally:
+        driver.stop()
+
+
+def test_reconnects_when_controller_returns(controller):
+    driver = ProtocolDriver(controller.url, tick=0.01)
+    driver.start()
+    try:
+        assert wait_for(lambda: controller.lines > 0)  # The controller has picked up the connection
+        controller.disconnect()  # Controller reset: drops the link, keeps listening
+        assert wait_for(lambda: driver.error is not None)
+        assert wait_for(lambda: driver.error is None)
+        assert driver.counters["reconnects"] == 1
+
+        driver.set_joints([12, 0, 0, 0, 0, 0])
+        assert wait_for(lambda: controller.joints[0] == 12.0)
+        assert driver.request("PING") == "OK"
+    finally:
+        driver.stop()
+
+
+def test_slow_controller_raises_driver_error():
+    controller = LoopbackController(latency=0.5).start()
+    driver = ProtocolDriver(controller.url, tick=0.01, timeout=0.1)
+    driver.start()
+    try:
+        with pytest.raises(DriverError):
+            driver.request("PING")
+        with pytest.raises(DriverError):
+            driver.pipeline([("PING",)] * 3)
+        assert wait_for(lambda: all(isinstance(w, tuple) for w in list(driver._pending.values())))  # No leaked waiters
+    finally:
+        driver.stop()
+        controller.stop()
+
+
+def test_driver_interface_is_abstract():
+    class Partial(RobotDriver):
+        def set_joints(self, joints):
+            pass
+
+    with pytest.raises(TypeError):
+        RobotDriver()
+    with pytest.raises(TypeError):
+        Partial()
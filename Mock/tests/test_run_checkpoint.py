@@ -0,0 +1,66 @@
+"""
+Auto-run checkpoints: what a resumed run reads back after a crash.
+
+Run from Mock/: python -m pytest -q tests
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import run_checkpoint  # noqa: E402
+from run_checkpoint import RunCheckpoint  # noqa: E402
+
+RUN = {"history_id": 7, "pattern_id": 3, "revision": 2, "cycles": 5, "max_force": 5.0,
+       "blend_radius": None, "filename": "run.csv"}
+
+
+def test_latest_position_is_read_back(tmp_path):
+    path = str(tmp_path / "checkpoints" / "run_7.ckpt")
+    checkpoint = RunCheckpoint(path, RUN)
+    checkpoint.save(0, 1, 100, gripper_angle=90)
+    checkpoint.save(2, 0, 4096)
+    # No close(): a crashed process never gets that far
+    assert run_checkpoint.load(path) == {**RUN, "cycle": 2, "group": 0, "log_offset": 4096}
+    checkpoint.close()
+
+
+def test_shorter_record_replaces_longer_one(tmp_path):
+    path = str(tmp_path / "run.ckpt")
+    checkpoint = RunCheckpoint(path, RUN)
+    checkpoint.save(9, 9, 123456789, note="x" * 200)
+    checkpoint.save(0, 0, 0)
+    checkpoint.close()
+    assert run_checkpoint.load(path)["log_offset"] == 0
+    assert "note" not in run_checkpoint.load(path)
+    assert os.path.getsize(path) == run_checkpoint.RECORD_SIZE
+
+
+def test_missing_or_torn_record_is_no_checkpoint(tmp_path):
+    path = tmp_path / "run.ckpt"
+    assert run_checkpoint.load(str(path)) is None
+    path.write_bytes(b'{"history_id":7,"cyc' + b"\0" * 100)  # Power loss mid-write
+    assert run_checkpoint.load(str(path)) is None
+
+
+def test_oversized_record_is_refused(tmp_path):
+    checkpoint = RunCheckpoint(str(tmp_path / "run.ckpt"), RUN)
+    with pytest.raises(ValueError):
+        checkpoint.save(0, 0, 0, note="x" * run_checkpoint.RECORD_SIZE)
+    checkpoint.close()
+
+
+def test_close_keeps_and_remove_discards(tmp_path):
+    path = str(tmp_path / "run.ckpt")
+    checkpoint = RunCheckpoint(path, RUN)
+    checkpoint.save(1, 0, 10)
+    checkpoint.close()
+    checkpoint.save(4, 0, 99)  # Ignored once closed
+    assert run_checkpoint.load(path)["cycle"] == 1
+
+    checkpoint.remove()
+    assert not os.path.exists(path)
+    run_checkpoint.discard(path)  # Already gone: no error
@@ -0,0 +1,132 @@
+"""
+Batch pre-check of planned trajectories: joint limits and self-collision.
+
+The planned path (the same BlendedPath the run engine follows) is expanded
+into every control-tick setpoint at once and checked as arrays: joint limits
+per tick, then the distances between the arm's links modelled as capsules
+(a segment between two frame origins plus a radius). Waypoints can be fine
+on their own while the motion between them is not, and checking here costs
+nothing per tick in the control loop.
+
+Joint limits are always errors. Collision and floor findings are only errors
+when the arm geometry is calibrated (ROBOT_DH_PARAMS); on the built-in
+placeholder geometry they are warnings, so they never block a run.
+Requires numpy (optional dependency of the backend).
+"""
+
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from kinematics import GEOMETRY_CALIBRATED, frame_origins
+from motion import JOINT_LIMITS, JOINT_NAMES, BlendedPath
+
+# (name, from frame, to frame, radius [m]); frames as in kinematics.frames()
+CAPSULES: Tuple[Tuple[str, int, int, float], ...] = (
+    ("base", 0, 1, 0.045),
+    ("upper arm", 1, 2, 0.030),
+    ("forearm", 3, 4, 0.028),
+    ("gripper", 5, 6, 0.035),
+)
+# Links that do not share a joint (neighbours always touch at the joint)
+COLLISION_PAIRS: Tuple[Tuple[int, int], ...] = ((0, 2), (0, 3), (1, 3))
+FLOOR_LINKS = (2, 3)   # Links that can reach the mounting surface (z = 0)
+LIMIT_TOLERANCE = 1e-6
+
+
+def sample_path(path: BlendedPath) -> np.ndarray:
+    """Setpoints for ticks 1..total_ticks, shape (ticks, 6) (BlendedPath.setpoint for every tick)"""
+    ticks = np.arange(1, path.total_ticks + 1, dtype=float)
+    pos = np.tile(np.asarray(path.start, dtype=float), (len(ticks), 1))
+    for seg in path.segments:
+        u = np.clip((ticks - seg.start_tick) / seg.ticks, 0.0, 1.0)
+        f = seg.accel_fraction
+        v = 1.0 / (1.0 - f)
+        r = 1.0 - u
+        p = np.where(u < f, v * u * u / (2 * f),
+                     np.where(u > 1 - f, 1.0 - v * r * r / (2 * f), v * (u - f / 2)))
+        pos += np.outer(p, seg.delta)
+    return pos
+
+
+def _segment_distances(p1: np.ndarray, q1: np.ndarray, p2: np.ndarray, q2: np.ndarray) -> np.ndarray:
+    """Closest distance between segments p1-q1 and p2-q2, row by row (arrays of shape (N, 3))"""
+    d1, d2, r = q1 - p1, q2 - p2, p1 - p2
+    a = np.einsum("ij,ij->i", d1, d1)
+    e = np.einsum("ij,ij->i", d2, d2)
+    f = np.einsum("ij,ij->i", d2, r)
+    c = np.einsum("ij,ij->i", d1, r)
+    b = np.einsum("ij,ij->i", d1, d2)
+    denom = a * e - b * b
+    with np.errstate(divide="ignore", invalid="ignore"):
+        s = np.where(denom > 1e-12, np.clip((b * f - c * e) / denom, 0.0, 1.0), 0.0)
+        t = np.where(e > 1e-12, (b * s + f) / e, 0.0)
+        # Clamp t to the segment and recompute s for the clamped t
+        s = np.where(t < 0.0, np.where(a > 1e-12, np.clip(-c / a, 0.0, 1.0), 0.0), s)
+        s = np.where(t > 1.0, np.where(a > 1e-12, np.clip((b - c) / a, 0.0, 1.0), 0.0), s)
+    t = np.clip(t, 0.0, 1.0)
+    closest1 = p1 + d1 * s[:, None]
+    closest2 = p2 + d2 * t[:, None]
+    return np.linalg.norm(closest1 - closest2, axis=1)
+
+
+def check_poses(poses: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Per-pose results for an (N, 6) array of joint angles:
+    "limits"    (N, 6) bool, joint outside JOINT_LIMITS
+    "clearance" (N, len(COLLISION_PAIRS)) metres between capsule surfaces (< 0 = collision)
+    "floor"     (N,) metres from the lowest checked link surface to the mount (< 0 = below it)
+    """
+    lo, hi = np.asarray(JOINT_LIMITS).T
+    limits = (poses < lo - LIMIT_TOLERANCE) | (poses > hi + LIMIT_TOLERANCE)
+
+    origins = frame_origins(poses)
+    clearance = np.empty((len(poses), len(COLLISION_PAIRS)))
+    for k, (i, j) in enumerate(COLLISION_PAIRS):
+        _, a0, a1, ra = CAPSULES[i]
+        _, b0, b1, rb = CAPSULES[j]
+        dist = _segment_distances(origins[:, a0], origins[:, a1], origins[:, b0], origins[:, b1])
+        clearance[:, k] = dist - ra - rb
+
+    floor = np.min([np.minimum(origins[:, CAPSULES[i][1], 2], origins[:, CAPSULES[i][2], 2]) - CAPSULES[i][3]
+                    for i in FLOOR_LINKS], axis=0)
+    return {"limits": limits, "clearance": clearance, "floor": floor}
+
+
+def check_path(path: BlendedPath, step_indices: Sequence[int]) -> List[Dict]:
+    """
+    Issues for one planned move run. `step_indices` maps path waypoints to
+    pattern steps; each problem is reported once per step, with the value at
+    the first tick where it occurs.
+    """
+    poses = sample_path(path)
+    if not len(poses):
+        return []
+    result = check_poses(poses)
+    # Tick t belongs to the first waypoint whose move has not finished by then
+    end_ticks = np.array([seg.end_tick for seg in path.segments])
+    owner = np.minimum(np.searchsorted(end_ticks, np.arange(1, len(poses) + 1)), len(end_ticks) - 1)
+
+    issues: List[Dict] = []
+
+    geometry = "error" if GEOMETRY_CALIBRATED else "warning"
+
+    def report(mask: np.ndarray, message, severity: str = "error"):
+        seen = set()
+        for tick in np.flatnonzero(mask):
+            step = step_indices[owner[tick]]
+            if step in seen:
+                continue
+            seen.add(step)
+            issues.append({"severity": severity, "step": step, "message": message(tick)})
+
+    for j, (name, (lo, hi)) in enumerate(zip(JOINT_NAMES, JOINT_LIMITS)):
+        report(result["limits"][:, j], lambda tick, j=j, name=name, lo=lo, hi=hi: (
+            f"{name.upper()}={poses[tick, j]:.1f}° on the way, outside limits [{lo:.0f}, {hi:.0f}]"))
+    for k, (i, j) in enumerate(COLLISION_PAIRS):
+        report(result["clearance"][:, k] < 0, lambda tick, k=k, i=i, j=j: (
+            f"Self-collision: {CAPSULES[i][0]} and {CAPSULES[j][0]} overlap by "
+            f"{-result['clearance'][tick, k] * 1000:.0f} mm"), geometry)
+    report(result["floor"] < 0, lambda tick: (
+        f"Arm goes {-result['floor'][tick] * 1000:.0f} mm below the mounting surface"), geometry)
+    return issues
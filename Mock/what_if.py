@@ -0,0 +1,306 @@
+"""
+What-if simulation of a pattern over a grid of run parameters (force limit,
+speed scaling, material), as a dry run instead of trial and error on the rig.
+
+Each combination runs the compiled pattern with the auto-run engine's step
+semantics (blended move runs, grip ramp, release dwell, waits) on a virtual
+clock: time advances by the planned ticks instead of sleeping. Grip force
+comes from the contact model the simulator uses for manual gripping, sampled
+once per control tick while a part is held. Every run keeps only running
+statistics (RunningStats), so memory does not grow with cycles or samples.
+
+The grid is split into batches that a process pool simulates in parallel,
+with a bounded number of batches in flight; WhatIfJob reports progress while
+it runs. Workers are not forked from the server, whose control loop, driver
+and journal threads may hold locks at that moment; they come from a
+forkserver (spawn where there is none), a fresh single-threaded process that
+imports this module and the main module once. Under uvicorn the main module
+is uvicorn's entry point; with `python simulation.py` it is the server
+module, whose import starts nothing.
+"""
+
+import math
+import multiprocessing
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from material_classifier import OPEN_ANGLE
+from motion import JOINT_NAMES, TICK_INTERVAL, plan_moves, split_move_runs
+from pattern_analysis import GRIP_RAMP_INTERVAL, GRIP_RAMP_STEPS, HOME_POSE, MOVE_ACTIONS, RELEASE_DWELL
+
+MATERIALS = ("Metal", "Wood", "Sponge/Soft")
+MAX_COMBINATIONS = 5000
+MAX_CYCLES = 1000
+MIN_SPEED, MAX_SPEED = 0.05, 1.0   # Fraction of the joint velocity limits (1.0 = as fast as allowed)
+BATCH_SIZE = 16                    # Combinations per pool task (move plans are shared within a batch)
+BATCHES_PER_WORKER = 2             # In flight per worker; the rest of the grid waits unsubmitted
+WORKERS = int(os.environ.get("ROBOT_WHAT_IF_WORKERS", max(1, (os.cpu_count() or 2) - 1)))
+WORKER_NICE = 10                   # Keep the control loop ahead of the simulations
+START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def contact_force(angle: int, max_force_setting: float, material_type: str) -> float:
+    """Noise-free grip force (N) at a gripper angle for a force limit and material"""
+    contact_ratio = 1.0 - (angle / 180.0)
+    if "Metal" in material_type:
+        stiffness, nonlinearity = 1.2, 2.5
+    elif "Wood" in material_type:
+        stiffness, nonlinearity = 1.0, 1.8
+    elif "Sponge" in material_type or "Soft" in material_type:
+        stiffness, nonlinearity = 0.7, 1.2
+    else:
+        stiffness, nonlinearity = 0.9, 1.5
+
+    if angle > 135: angle_efficiency = 0.3
+    elif angle > 90: angle_efficiency = 0.8
+    elif angle > 45: angle_efficiency = 1.0
+    else: angle_efficiency = 0.9
+
+    base_force = max_force_setting * (contact_ratio ** nonlinearity)
+    return base_force * stiffness * angle_efficiency
+
+
+def measured_force(force: float, max_force_setting: float, rng: random.Random = random) -> float:
+    """Force as the sensor reports it: noise, clamped to the limit overshoot, dead band below 0.2 N"""
+    force += rng.uniform(-0.15, 0.15)
+    force = max(0.0, min(force, max_force_setting * 1.1))
+    if force < 0.2: force = 0.0
+    return round(force, 2)
+
+
+def calculate_realistic_force(angle: int, max_force_setting: float, material_type: str,
+                              rng: random.Random = random) -> float:
+    return measured_force(contact_force(angle, max_force_setting, material_type), max_force_setting, rng)
+
+
+class RunningStats:
+    """Count, mean, standard deviation, min and max in constant memory (Welford)"""
+
+    __slots__ = ("count", "mean", "_m2", "min", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self._m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def summary(self, digits: int = 3) -> Optional[Dict]:
+        if not self.count:
+            return None
+        return {"mean": round(self.mean, digits), "std": round(self.std, digits),
+                "min": round(self.min, digits), "max": round(self.max, digits), "samples": self.count}
+
+
+def simulate_run(steps: Sequence[Dict], cycles: int, max_force: float, speed: float, material: str,
+                 blend_radius: Optional[float] = None, seed: int = 0,
+                 plans: Optional[Dict[Tuple, Tuple[int, Tuple[float, ...]]]] = None) -> Dict:
+    """
+    One dry run of compiled steps (move_cartesian already resolved) from the
+    home pose. `plans` caches (ticks, end pose) per (move run, start pose); it
+    can be shared between runs of the same steps and blend radius.
+    """
+    rng = random.Random(seed)
+    plans = {} if plans is None else plans
+    groups = split_move_runs(steps, lambda s: s["action_type"] in MOVE_ACTIONS)
+    clock = 0.0
+    pose = tuple(HOME_POSE)
+    angle, gripping = int(OPEN_ANGLE), False
+    hold = RunningStats()  # Force while a part is held, one sample per control tick
+    peak, over_limit, first_cycle_s = 0.0, 0, 0.0
+
+    def sample_hold(ticks: int):
+        nonlocal peak, over_limit
+        if not gripping:
+            return
+        held = contact_force(angle, max_force, material)  # Only the noise changes from tick to tick
+        for _ in range(ticks):
+            force = measured_force(held, max_force, rng)
+            hold.add(force)
+            peak = max(peak, force)
+            over_limit += force > max_force
+
+    for cycle in range(cycles):
+        for index, (is_move, group) in enumerate(groups):
+            if is_move:
+                key = (index, pose)
+                if key not in plans:
+                    plan = plan_moves(pose, [{**{n: s[n] for n in JOINT_NAMES}, "duration": s["wait_time"]}
+                                             for s in group], blend_radius)
+                    plans[key] = (plan.total_ticks, plan.waypoints[-1])
+                ticks, pose = plans[key]
+                # Slower motion stretches the whole time-scaled profile
+                ticks = math.ceil(ticks / speed - 1e-9)
+                clock += ticks * TICK_INTERVAL
+                sample_hold(ticks)
+                continue
+
+            step = group[0]
+            action = step["action_type"]
+            if action == "grip":
+                gripping = True
+                start_angle = angle
+                for i in range(GRIP_RAMP_STEPS):
+                    progress = (i + 1) / GRIP_RAMP_STEPS
+                    angle = int(start_angle - start_angle * progress)
+                    # The force limit ramps up with the jaws; the part pushes back per its stiffness
+                    force = min(round(max_force * progress, 2),
+                                calculate_realistic_force(angle, max_force, material, rng))
+                    peak = max(peak, force)
+                    clock += GRIP_RAMP_INTERVAL
+            elif action == "release":
+                gripping = False
+                angle = int(OPEN_ANGLE)
+                clock += RELEASE_DWELL
+            elif action == "wait":
+                duration = max(0.0, float(step["wait_time"] or 0.0))
+                clock += duration
+                sample_hold(math.ceil(duration / TICK_INTERVAL - 1e-9))
+        if cycle == 0:
+            first_cycle_s = clock
+
+    return {
+        "max_force": max_force,
+        "speed": speed,
+        "material": material,
+        "first_cycle_s": round(first_cycle_s, 3),
+        # Later cycles start where the previous one ended (same as pre-flight analysis)
+        "cycle_s": round((clock - first_cycle_s) / (cycles - 1) if cycles > 1 else first_cycle_s, 3),
+        "total_s": round(clock, 1),
+        "peak_force": round(peak, 2),
+        "hold_force": hold.summary(2),
+        "over_limit_pct": round(100.0 * over_limit / hold.count, 1) if hold.count else 0.0,
+    }
+
+
+def simulate_batch(steps: Sequence[Dict], cycles: int, blend_radius: Optional[float],
+                   combos: Sequence[Tuple[int, float, float, str, int]]) -> List[Tuple[int, Dict]]:
+    """Pool task: [(grid index, result)] for (index, max_force, speed, material, seed) combinations"""
+    plans: Dict[Tuple, Tuple[int, Tuple[float, ...]]] = {}
+    return [(index, simulate_run(steps, cycles, max_force, speed, material, blend_radius, seed, plans))
+            for index, max_force, speed, material, seed in combos]
+
+
+def expand_grid(max_forces: Sequence[float], speeds: Sequence[float], materials: Sequence[str],
+                seed: int = 0) -> List[Tuple[int, float, float, str, int]]:
+    """Every combination in a fixed order, each with its own noise seed (reproducible results)"""
+    grid = [(f, s, m) for s in speeds for m in materials for f in max_forces]
+    return [(i, f, s, m, seed + i) for i, (f, s, m) in enumerate(grid)]
+
+
+_context = None
+
+
+def _pool_context():
+    global _context
+    if _context is None:
+        _context = multiprocessing.get_context(START_METHOD)
+        if START_METHOD == "forkserver":
+            _context.set_forkserver_preload(["__main__", __name__])
+    return _context
+
+
+def _lower_priority():
+    try:
+        os.nice(WORKER_NICE)
+    except OSError:
+        pass
+
+
+class WhatIfJob:
+    """A grid simulated in the background; status() can be polled while it runs"""
+
+    def __init__(self, job_id: str, pattern: Dict, steps: Sequence[Dict], combos: Sequence[Tuple],
+                 cycles: int, blend_radius: Optional[float] = None, workers: int = WORKERS):
+        self.id = job_id
+        self.pattern = pattern
+        self.steps = list(steps)
+        self.combos = list(combos)
+        self.cycles = cycles
+        self.blend_radius = blend_radius
+        self.workers = max(1, min(workers, math.ceil(len(self.combos) / BATCH_SIZE)))
+        self.results: List[Optional[Dict]] = [None] * len(self.combos)
+        self.done = 0
+        self.state = "pending"
+        self.error: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._cancel = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        self.state, self.started_at = "running", time.time()
+        self._thread = threading.Thread(target=self._run, name="what-if", daemon=True)
+        self._thread.start()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def _run(self):
+        batches = iter([self.combos[i:i + BATCH_SIZE] for i in range(0, len(self.combos), BATCH_SIZE)])
+        try:
+            with ProcessPoolExecutor(self.workers, mp_context=_pool_context(),
+                                     initializer=_lower_priority) as pool:
+                pending = set()
+                while True:
+                    while len(pending) < self.workers * BATCHES_PER_WORKER and not self._cancel.is_set():
+                        batch = next(batches, None)
+                        if batch is None:
+                            break
+                        pending.add(pool.submit(simulate_batch, self.steps, self.cycles, self.blend_radius, batch))
+                    if not pending:
+                        break
+                    finished, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        for index, result in future.result():
+                            self.results[index] = result
+                            self.done += 1
+                    if self._cancel.is_set():
+                        for future in pending:
+                            future.cancel()
+            self.state = "cancelled" if self._cancel.is_set() else "done"
+        except Exception as e:
+            self.state, self.error = "failed", str(e)
+            print(f"⚠️ What-if simulation failed: {e}")
+        finally:
+            self.finished_at = time.time()
+
+    def status(self) -> Dict:
+        elapsed = (self.finished_at or time.time()) - self.started_at if self.started_at else 0.0
+        eta = elapsed / self.done * (len(self.combos) - self.done) if self.done and self.state == "running" else None
+        return {
+            "id": self.id,
+            "pattern": self.pattern,
+            "status": self.state,
+            "done": self.done,
+            "total": len(self.combos),
+            "cycles": self.cycles,
+            "workers": self.workers,
+            "elapsed_s": round(elapsed, 2),
+            "eta_s": round(eta, 1) if eta is not None else None,
+            "error": self.error,
+        }
+
+    def result(self) -> Dict:
+        """Status plus the finished combinations, in grid order"""
+        return {**self.status(), "results": [r for r in self.results if r is not None]}